@@ -1,17 +1,42 @@
 import os
+import queue
 import re
-from youtube_transcript_api import YouTubeTranscriptApi
-from googleapiclient.discovery import build
+import threading
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
 from googleapiclient.errors import HttpError
-from openai import OpenAI
 
 from prompts import DEFAULT_SUBTITLE_PROMPT, DEFAULT_COMMENTS_PROMPT
 from cache_utils import (
     cached_get_video_info,
-    cached_get_comment_threads,
-    extract_video_id,
-    format_comments
+    open_comments,
+    cached_get_transcript,
+    prefetch_video_info,
+    resolve_video_ids,
+    estimate_comment_quota,
+    iter_comment_blocks,
+    format_comments_header,
+    CommentSource
 )
+from concurrency import configure_limits
+from quota import QUOTA_RESERVE, QuotaExceeded, configure_quota, get_quota_ledger, method_cost
+from llm import DEFAULT_MODEL, create_client, format_llm_cache_stats, UsageLedger
+from summarize import map_reduce_summarize, pack_units
+from dedup import find_duplicates, iter_representatives
+from sampling import sample_comments, format_coverage
+from comment_stats import CommentStatsCollector, format_comment_stats, format_stats_for_prompt
+from batch_runner import run_in_parallel, DEFAULT_MAX_PARALLEL_VIDEOS
+from channels import get_uploads_playlist_id, iter_upload_pages
+from jobs import get_job_manifest, is_video_complete
+from archive import RESULTS_DIR, get_archive, prompt_hash, render_markdown
+from search import get_search_index
+from transcript_cleanup import clean_transcript, format_cleanup_stats
+
+# 评论获取不完整（部分请求重试后仍失败）时加在评论内容开头的提示
+INCOMPLETE_COMMENTS_NOTICE = "⚠️ 评论获取不完整：部分请求多次重试后仍失败，以下仅为已获取的部分。\n\n"
+
+# 字幕总结的请求模板：字幕按段落带上时间戳，提示模型在总结中引用
+SUBTITLE_INSTRUCTION = "请总结以下视频内容（每段开头方括号内为该段在视频中的时间戳，提到具体内容时可注明时间点）：\n\n{content}"
 
 def analyze_single_video_with_progress(
     youtube_api_key,
@@ -19,7 +44,12 @@ def analyze_single_video_with_progress(
     deepseek_api_key,
     subtitle_prompt,
     comments_prompt,
-    comments_option
+    comments_option,
+    refresh_cache=False,
+    usage_ledger=None,
+    on_stage=None,
+    write_markdown=True,
+    saved_outputs=None
 ):
     """
     以生成器方式返回多次输出(6个)：
@@ -29,7 +59,21 @@ def analyze_single_video_with_progress(
     - "不获取评论": 跳过评论的获取与总结
     - "只获取前100条": 获取并总结前100条评论
     - "获取全部评论": 获取并总结所有评论
+    - "按预算抽样评论": 获取所有评论，按 token 预算分层抽样后总结，并报告抽样覆盖率
+
+    refresh_cache=True 时忽略已缓存的摘要，重新调用 DeepSeek 生成
+    usage_ledger: 可选的 llm.UsageLedger，累计本视频 DeepSeek 调用的用量
+    on_stage: 可选回调 on_stage(stage, detail=None)，每完成一个阶段调用一次（阶段名见 jobs.STAGES；
+              摘要失败、评论不完整时不算完成）。detail 为该阶段的产出：metadata 为视频信息条目，
+              comments 为 {count, text, stats_md}，两个摘要阶段为摘要文本；file 阶段表示结果已存档，
+              detail 为写出的 MD 路径（未写出时为 None）
+    write_markdown: 除存档外是否在 analysis_results 下写出 MD 文件
+    saved_outputs: 续跑时上次运行已完成阶段的产出 {阶段: detail}（见 on_stage），
+                   这些阶段直接沿用，不再请求 YouTube 或 DeepSeek
     """
+    if on_stage is None:
+        on_stage = lambda stage, detail=None: None
+    saved_outputs = saved_outputs or {}
 
     # 若用户未填自定义字幕总结提示词，就用内置默认值
     if not subtitle_prompt:
@@ -41,7 +85,10 @@ def analyze_single_video_with_progress(
 
     # 1) 正在获取视频信息
     yield ("正在获取视频信息...", "", "", "", "", "")
-    video_response = cached_get_video_info(youtube_api_key, video_id)
+    if "metadata" in saved_outputs:
+        video_response = {"items": [saved_outputs["metadata"]]}
+    else:
+        video_response = cached_get_video_info(youtube_api_key, video_id)
     if not video_response.get("items"):
         yield ("未找到视频信息", "", "", "", "", "")
         return
@@ -51,84 +98,226 @@ def analyze_single_video_with_progress(
     view_count = video_info["statistics"].get("viewCount", "0")
     like_count = video_info["statistics"].get("likeCount", "0")
     comment_count = video_info["statistics"].get("commentCount", "0")
-
-    # 2) 正在获取字幕
-    yield ("正在获取字幕...", "", "", "", "", "")
-    try:
-        transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
-        transcript = None
+    on_stage("metadata", video_info)
+
+    # 2) 字幕与评论两条支线并行：
+    #    字幕获取 -> 字幕总结；评论获取 -> 评论总结
+    #    确认有字幕后才开始抓取评论（没有字幕的视频不消耗评论配额与 DeepSeek 调用）；
+    #    字幕一到就开始总结，不必等评论抓完；两次 DeepSeek 调用也同时进行
+    client = create_client(deepseek_api_key)
+    fetch_comments = comments_option != "不获取评论"
+    events = queue.Queue()
+    # 本视频已中止（没有字幕、出错或调用方不再读取结果）时置位，尚未开始的抓取与总结不再进行
+    cancelled = threading.Event()
+
+    def emit(kind):
+        """
+        流式输出与进度回调：视频已中止时抛出 _Cancelled，停止继续生成（不再消耗 token）
+        """
+        def callback(value):
+            if cancelled.is_set():
+                raise _Cancelled()
+            events.put((kind, value))
+        return callback
+
+    def subtitle_branch():
+        transcript = cached_get_transcript(video_id)
+        if transcript is None:
+            cancelled.set()
+            events.put(("abort", f"未找到字幕（ID={video_id}）"))
+            return
+        events.put(("transcript", transcript))
+        if "subtitle_summary" in saved_outputs:
+            events.put(("subtitle_summary", _resumed_summary(saved_outputs["subtitle_summary"])))
+            return
+        if cancelled.is_set():
+            return
+        # 发送前清理自动字幕（去重叠、去标记与语气词、合并成句），界面与存档仍保留原始字幕；
+        # 人工字幕本身没有滚动重叠与识别噪声，原样发送
+        if transcript.is_generated:
+            cleaned, cleanup_stats = clean_transcript(transcript)
+            cleanup_md = format_cleanup_stats(cleanup_stats)
+            print(f"字幕清理（ID={video_id}）：{cleanup_md}")
+            events.put(("subtitle_progress", f"已清理，{cleanup_md}，正在生成摘要..."))
+        else:
+            cleaned = transcript
         try:
-            transcript = transcript_list.find_generated_transcript(["zh-Hans", "zh-CN", "en"])
-        except:
-            try:
-                transcript = transcript_list.find_manually_created_transcript(["zh-Hans", "zh-CN", "en"])
-            except:
-                yield (f"未找到字幕（ID={video_id}）", "", "", "", "", "")
-                return
-        transcript_text = " ".join([item["text"] for item in transcript.fetch()])
-    except Exception as e:
-        yield (f"获取字幕出错: {str(e)} (ID={video_id})", "", "", "", "", "")
-        return
-
-    # 初始化变量
-    comments_text = ""
-    comments_summary_md = ""
+            # 按时间切成带时间戳的段落，摘要可直接引用时间点
+            result = _summarize(
+                client,
+                subtitle_prompt,
+                cleaned.timed_units(),
+                SUBTITLE_INSTRUCTION,
+                on_delta=emit("subtitle_delta"),
+                on_progress=emit("subtitle_progress"),
+                refresh=refresh_cache,
+                ledger=usage_ledger
+            )
+        except _Cancelled:
+            return
+        except Exception as e:
+            # 重试后仍失败：保留字幕内容，只把这一部分标记为失败，不中断整个视频
+            result = _failed_summary("字幕", e)
+        events.put(("subtitle_summary", result))
 
-    # 如果用户选择获取评论
-    if comments_option != "不获取评论":
-        # 3) 正在获取评论
-        yield ("正在获取评论...", "", "", "", "", "")
+    def comments_branch():
+        if cancelled.is_set():
+            return
+        if "comments" in saved_outputs and "comments_summary" in saved_outputs:
+            saved = saved_outputs["comments"]
+            events.put(("comments", (saved["count"], saved["text"], saved["stats_md"], True)))
+            events.put(("comments_summary", _resumed_summary(saved_outputs["comments_summary"])))
+            return
         try:
             max_results = 100 if comments_option == "只获取前100条" else None
-            comments = cached_get_comment_threads(youtube_api_key, video_id, max_results=max_results)
-            if not comments:
-                comments = ["无法获取评论"]
-            yield (f"已获取 {len(comments)} 条评论...", "", "", "", "", "")
+            count, comments, complete = open_comments(youtube_api_key, video_id, max_results=max_results)
+            # 第一遍：评论流经时记录本地统计（基于全部评论，不受合并与抽样影响），并找出重复/近似重复的评论；
+            # 第二遍：重新逐条读取，只保留各组代表，逐条格式化并直接装箱成分段（评论不会全部驻留内存）；
+            # 抽样时各组代表同样以可重复迭代的来源逐条流过，只保留各层的候选
+            collector = CommentStatsCollector()
+            duplicates = find_duplicates(collector.observe(comments))
+            stats = collector.compute()
+            header = format_comments_header(count, duplicates.groups)
+            source = comments
+            comments = CommentSource(lambda: iter_representatives(source, duplicates))
+            if not complete:
+                header = INCOMPLETE_COMMENTS_NOTICE + header
+            if comments_option == "按预算抽样评论":
+                # 在 token 预算内分层抽样，总结成本不随评论量增长
+                comments, coverage = sample_comments(comments)
+                header += format_coverage(coverage)
+            units = pack_units(chain([header], iter_comment_blocks(comments)))
         except Exception as e:
             print(f"获取评论失败: {e}")
-            comments = ["无法获取评论"]
-        comments_text = format_comments(comments)
-
-    # 4) 调用 DeepSeek 生成摘要
-    yield ("正在调用DeepSeek生成摘要...", "", "", "", "", "")
-    client = OpenAI(api_key=deepseek_api_key, base_url="https://api.deepseek.com")
-
-    # ---- 字幕总结 ----
-    subtitle_summary_response = client.chat.completions.create(
-        model="deepseek-chat",
-        messages=[
-            {
-                "role": "system",
-                "content": subtitle_prompt
-            },
-            {
-                "role": "user",
-                "content": f"请总结以下视频内容：\n\n{transcript_text}"
-            }
-        ]
-    )
-    subtitle_summary = subtitle_summary_response.choices[0].message.content
-
-    # ---- 如果选择获取评论，则做评论总结 ----
-    if comments_option != "不获取评论":
-        comments_summary_response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[
-                {
-                    "role": "system",
-                    "content": comments_prompt
-                },
-                {
-                    "role": "user",
-                    "content": f"请总结以下全部评论内容：\n\n{comments_text}"
-                }
-            ]
+            count, units, stats, complete = 0, [], None, False
+        if not count:
+            units = ["无法获取评论"]
+        text = "".join(units)
+        events.put(("comments", (count, text, format_comment_stats(stats), complete)))
+        if cancelled.is_set():
+            return
+        try:
+            result = _summarize(
+                client,
+                comments_prompt,
+                units,
+                "请总结以下全部评论内容：\n\n{content}",
+                on_delta=emit("comments_delta"),
+                on_progress=emit("comments_progress"),
+                refresh=refresh_cache,
+                ledger=usage_ledger,
+                context=format_stats_for_prompt(stats)
+            )
+        except _Cancelled:
+            return
+        except Exception as e:
+            result = _failed_summary("评论", e)
+        events.put(("comments_summary", result))
+
+    def run_branch(name, fn):
+        try:
+            fn()
+        except Exception as e:
+            events.put(("error", (name, e)))
+        finally:
+            events.put(("done", name))
+
+    transcript = None
+    transcript_text = ""
+    subtitle_summary = None
+    comments_text = ""
+    comments_stats_md = ""
+    comments_summary = None
+    subtitle_state = "正在获取字幕..."
+    comments_state = "等待字幕..." if fetch_comments else ""
+
+    def progress():
+        if comments_state:
+            return f"{subtitle_state}  |  {comments_state}"
+        return subtitle_state
+
+    def snapshot():
+        return (
+            progress(),
+            "",
+            f"## 字幕总结\n\n{subtitle_summary}\n" if subtitle_summary is not None else "",
+            (f"## 评论总结\n\n{comments_summary}\n\n" if comments_summary is not None else "")
+            + comments_stats_md,
+            transcript_text,
+            comments_text
         )
-        comments_summary = comments_summary_response.choices[0].message.content
+
+    executor = ThreadPoolExecutor(max_workers=2)
+    running = 0
+    try:
+        executor.submit(run_branch, "subtitle", subtitle_branch)
+        running = 1
+        yield snapshot()
+
+        while running:
+            kind, payload = events.get()
+            if kind == "done":
+                running -= 1
+                continue
+            if kind == "abort":
+                yield (payload, "", "", "", "", "")
+                return
+            if kind == "error":
+                name, err = payload
+                if name == "subtitle" and not transcript_text:
+                    yield (f"获取字幕出错: {str(err)} (ID={video_id})", "", "", "", "", "")
+                    return
+                # DeepSeek 调用失败时与之前一样向上抛出
+                raise err
+            if kind == "transcript":
+                transcript = payload
+                transcript_text = transcript.text
+                on_stage("transcript")
+                if fetch_comments:
+                    executor.submit(run_branch, "comments", comments_branch)
+                    running += 1
+                    comments_state = "正在获取评论..."
+                subtitle_state = "正在调用DeepSeek生成字幕摘要..."
+            elif kind == "subtitle_progress":
+                subtitle_state = f"字幕：{payload}"
+            elif kind == "comments_progress":
+                comments_state = f"评论：{payload}"
+            elif kind == "subtitle_delta":
+                subtitle_summary = payload
+                subtitle_state = "字幕摘要生成中..."
+            elif kind == "subtitle_summary":
+                subtitle_summary = payload["content"]
+                if not payload.get("failed"):
+                    on_stage("subtitle_summary", subtitle_summary)
+                subtitle_state = _summary_state("字幕", payload)
+            elif kind == "comments":
+                count, comments_text, comments_stats_md, complete = payload
+                if complete:
+                    on_stage("comments", {"count": count, "text": comments_text, "stats_md": comments_stats_md})
+                marker = "" if complete else "（不完整）"
+                comments_state = f"已获取 {count} 条评论{marker}，正在调用DeepSeek生成评论摘要..."
+            elif kind == "comments_delta":
+                comments_summary = payload
+                comments_state = "评论摘要生成中..."
+            elif kind == "comments_summary":
+                comments_summary = payload["content"]
+                if not payload.get("failed"):
+                    on_stage("comments_summary", comments_summary)
+                comments_state = _summary_state("评论", payload)
+            yield snapshot()
+    finally:
+        if running:
+            cancelled.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    if fetch_comments:
+        # 本地评论统计紧跟在评论总结之后
         comments_summary_md = f"""## 评论总结
 
 {comments_summary}
 """
+        if comments_stats_md:
+            comments_summary_md += f"\n{comments_stats_md}"
     else:
         comments_summary_md = ""
 
@@ -146,35 +335,57 @@ def analyze_single_video_with_progress(
 {subtitle_summary}
 """
 
-    md_content = (
-        f"# {video_title}\n\n"
-        f"{video_info_md}\n"
-        f"{subtitle_summary_md}\n"
-    )
-
-    if comments_option != "不获取评论":
-        md_content += (
-            f"{comments_summary_md}\n"
-            f"## 评论内容\n\n{comments_text}\n"
-        )
-
-    # 加入字幕内容
-    md_content += f"## 字幕内容\n\n{transcript_text}\n"
-
-    # 确保 analysis_results 文件夹存在
-    analysis_results_dir = os.path.join(os.path.dirname(__file__), "analysis_results")
-    os.makedirs(analysis_results_dir, exist_ok=True)
-
-    safe_title = re.sub(r'[\\/*?:"<>|]', '_', video_title)
-    md_filename = os.path.join(analysis_results_dir, f"{safe_title}.md")
-
-    # 6) 写文件
+    # 6) 存档：按视频 ID 与本次运行（提示词哈希、模型、时间）保存，标题相同的视频不会互相覆盖；
+    #    write_markdown=True 时另写一份 MD 文件（文件名带视频 ID）
+    run = {
+        "video_id": video_id,
+        "title": video_title,
+        "comments_option": comments_option,
+        "video_info_md": video_info_md,
+        "subtitle_summary": subtitle_summary,
+        "comments_summary": comments_summary if fetch_comments else "",
+        "comments_stats_md": comments_stats_md,
+        "transcript": transcript_text,
+        "comments_text": comments_text,
+        "timeline": transcript
+    }
+    md_filename = None
+    if write_markdown:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        safe_title = re.sub(r'[\\/*?:"<>|]', '_', video_title)
+        md_filename = os.path.join(RESULTS_DIR, f"{safe_title}-{video_id}.md")
+        try:
+            with open(md_filename, "w", encoding="utf-8") as f:
+                f.write(render_markdown(run))
+        except Exception as err:
+            yield (f"写入 {md_filename} 文件时出错: {err}", "", "", "", "", "")
+            return
     try:
-        with open(md_filename, "w", encoding="utf-8") as f:
-            f.write(md_content)
+        run_id = get_archive().save_run(
+            video_id,
+            video_info,
+            DEFAULT_MODEL,
+            prompt_hash(subtitle_prompt, comments_prompt, comments_option),
+            comments_option,
+            run,
+            md_filename
+        )
     except Exception as err:
-        yield (f"写入 {md_filename} 文件时出错: {err}", "", "", "", "", "")
+        yield (f"保存分析结果时出错: {err}", "", "", "", "", "")
         return
+    on_stage("file", md_filename)
+    try:
+        get_search_index().index_video(
+            video_id,
+            video_title,
+            run_id=run_id,
+            transcript=transcript,
+            subtitle_summary=subtitle_summary,
+            comments_summary=run["comments_summary"]
+        )
+    except Exception as err:
+        # 索引失败不影响本次分析结果，之后可用 python cli.py reindex 重建
+        print(f"建立全文索引失败: {err}")
 
     # 最终输出
     # 注：如果选择不获取评论，则 comments_summary_md 与 comments_text 会为空
@@ -188,33 +399,165 @@ def analyze_single_video_with_progress(
     )
 
 
+class _Cancelled(Exception):
+    """
+    视频分析已中止，由流式回调抛出以停止正在进行的摘要
+    """
+
+
+def _summarize(
+    client,
+    system_prompt,
+    units,
+    instruction,
+    on_delta=None,
+    on_progress=None,
+    refresh=False,
+    ledger=None,
+    context=None
+):
+    """
+    调用 DeepSeek 生成摘要：内容超出上下文预算时自动分段总结再合并，
+    最终结果流式输出；context 为附加在最终总结请求中的资料。
+    返回 map_reduce_summarize 的结果字典
+    """
+    result = map_reduce_summarize(
+        client,
+        system_prompt,
+        units,
+        instruction,
+        on_delta=on_delta,
+        on_progress=on_progress,
+        refresh=refresh,
+        ledger=ledger,
+        context=context
+    )
+    if result["ttft"] is not None:
+        print(f"DeepSeek 首字延迟 {result['ttft']:.2f}s，总耗时 {result['elapsed']:.2f}s，共 {result['chunks']} 段")
+    return result
+
+
+def _failed_summary(label, error):
+    """
+    摘要在重试后仍失败时的占位结果（failed=True），报告中保留原始内容，稍后可重新生成
+    """
+    print(f"{label}摘要生成失败: {error}")
+    return {
+        "content": f"（{label}摘要生成失败：{error}。原始内容已保留在下方，可稍后重新分析生成摘要）",
+        "ttft": None,
+        "elapsed": 0.0,
+        "failed": True
+    }
+
+
+def _resumed_summary(content):
+    """
+    续跑时沿用上次运行已生成的摘要（resumed=True）
+    """
+    return {"content": content, "ttft": None, "elapsed": 0.0, "resumed": True}
+
+
+def _summary_state(label, result):
+    if result.get("failed"):
+        return f"{label}摘要生成失败（已重试）"
+    return f"{label}摘要已生成{_format_timing(result)}"
+
+
+def _format_timing(result):
+    """
+    将首字延迟与总耗时格式化为进度提示
+    """
+    if result.get("resumed"):
+        return "（沿用上次运行的结果）"
+    if result.get("cached"):
+        return "（命中缓存）"
+    if result["ttft"] is None:
+        return ""
+    return f"（首字 {result['ttft']:.1f}s，共 {result['elapsed']:.1f}s）"
+
+
 def process_youtube_content(
     youtube_api_key,
     video_url,
     deepseek_api_key,
     subtitle_prompt,
     comments_prompt,
-    comments_option
+    comments_option,
+    refresh_cache=False,
+    write_markdown=True
 ):
     """
     生成器函数，多次yield以实时显示进度
     前端需要 6 个输出，因此每次都返回 6 元组：
     (progress, video_info_md, subtitle_summary_md, comments_summary_md, transcript_text, comments_text)
 
-    comments_option: "不获取评论", "只获取前100条", "获取全部评论"
+    comments_option: "不获取评论", "只获取前100条", "获取全部评论", "按预算抽样评论"
+    write_markdown: 除存档外是否同时写出 MD 文件
+
+    video_url 可以是多个视频 URL（换行/逗号分隔）或播放列表 URL，
+    此时依次分析每个视频，最终把各视频的结果拼接后输出。
     """
-    video_id = extract_video_id(video_url)
-    if not video_id:
+    try:
+        video_ids = resolve_video_ids(youtube_api_key, video_url)
+    except Exception as e:
+        yield (f"解析播放列表出错: {str(e)}", "", "", "", "", "")
+        return
+    if not video_ids:
         yield ("无效的YouTube视频URL", "", "", "", "", "")
         return
 
-    yield from analyze_single_video_with_progress(
-        youtube_api_key,
-        video_id,
-        deepseek_api_key,
-        subtitle_prompt,
-        comments_prompt,
-        comments_option
+    if len(video_ids) == 1:
+        yield from analyze_single_video_with_progress(
+            youtube_api_key,
+            video_ids[0],
+            deepseek_api_key,
+            subtitle_prompt,
+            comments_prompt,
+            comments_option,
+            refresh_cache,
+            write_markdown=write_markdown
+        )
+        return
+
+    # 多个视频：先批量获取全部视频信息，之后逐个分析时直接命中缓存
+    yield (f"正在批量获取 {len(video_ids)} 个视频的信息...", "", "", "", "", "")
+    try:
+        prefetch_video_info(youtube_api_key, video_ids)
+    except Exception as e:
+        print(f"批量获取视频信息失败: {e}")
+
+    results = []
+    for i, video_id in enumerate(video_ids, 1):
+        final = None
+        for partial in analyze_single_video_with_progress(
+            youtube_api_key,
+            video_id,
+            deepseek_api_key,
+            subtitle_prompt,
+            comments_prompt,
+            comments_option,
+            refresh_cache,
+            write_markdown=write_markdown
+        ):
+            if partial[0] == "":
+                final = partial
+            else:
+                yield (f"[{i}/{len(video_ids)}] {partial[0]}", "", "", "", "", "")
+        if final is not None:
+            results.append(final)
+
+    if not results:
+        yield ("所有视频均分析失败", "", "", "", "", "")
+        return
+
+    separator = "\n---\n\n"
+    yield (
+        "",
+        separator.join(r[1] for r in results),
+        separator.join(r[2] for r in results),
+        separator.join(r[3] for r in results if r[3]),
+        "\n\n".join(r[4] for r in results),
+        "\n\n".join(r[5] for r in results if r[5])
     )
 
 
@@ -225,57 +568,361 @@ def batch_process_callback(
     ds_api,
     subtitle_prompt,
     comments_prompt,
-    comments_option
+    comments_option,
+    max_parallel_videos=DEFAULT_MAX_PARALLEL_VIDEOS,
+    youtube_concurrency=None,
+    llm_concurrency=None,
+    refresh_cache=False,
+    youtube_daily_quota=None,
+    published_after="",
+    published_before="",
+    only_new=False,
+    write_markdown=True,
+    resume_job_id=""
 ):
     """
     生成器函数：
-      1) 搜索频道最新视频
-      2) 逐个调用 analyze_single_video_with_progress
-      3) 实时输出进度
+      1) 解析频道的上传播放列表，建立批量任务清单（见 jobs.JobManifest）
+      2) 调用 run_batch_job 边翻页枚举视频边并行分析，实时输出进度
+    resume_job_id 非空时不再枚举频道，而是续跑该任务（沿用其保存的参数），跳过已完成的视频
     前端需要 3 个输出 => 每次yield都返回 (progress_str, batch_md, batch_result)
 
-    comments_option: "不获取评论", "只获取前100条", "获取全部评论"
+    comments_option: "不获取评论", "只获取前100条", "获取全部评论", "按预算抽样评论"
+    youtube_concurrency / llm_concurrency: YouTube 请求与 DeepSeek 调用的全局并发上限
+    refresh_cache: 为 True 时忽略已缓存的摘要重新生成
+    youtube_daily_quota: YouTube API 每日配额上限（单位），默认 10000
+    max_videos: 最多处理的视频数，0 表示频道全部视频
+    published_after / published_before: 只处理该发布日期范围（YYYY-MM-DD，含当天）内的视频
+    only_new: 只处理该频道上次运行之后发布的视频
+    write_markdown: 除存档外是否同时写出 MD 文件
     """
     try:
-        yield ("正在搜索频道最新视频...", "", "")
-        youtube = build("youtube", "v3", developerKey=youtube_api)
-        search_response = youtube.search().list(
-            part="id",
-            channelId=channel_id,
-            maxResults=int(max_videos),
-            order="date",
-            type="video"
-        ).execute()
-        items = search_response.get("items", [])
-        if not items:
-            yield (f"未在频道 {channel_id} 中找到视频", "", "")
-            return
+        configure_limits(youtube=youtube_concurrency, llm=llm_concurrency)
+        configure_quota(youtube_daily_quota)
 
-        summary_lines = []
-        for i, item in enumerate(items, 1):
-            vid_id = item["id"]["videoId"]
-            yield (f"正在分析第 {i} 个视频 (ID={vid_id})...", "", "")
-            # 调用 analyze_single_video_with_progress
-            for partial in analyze_single_video_with_progress(
+        job_id = (resume_job_id or "").strip()
+        if not job_id:
+            job_id = None
+            for progress, job_id in create_channel_job(
                 youtube_api,
-                vid_id,
-                ds_api,
+                channel_id,
+                max_videos,
                 subtitle_prompt,
                 comments_prompt,
-                comments_option
+                comments_option,
+                refresh_cache,
+                published_after,
+                published_before,
+                only_new,
+                write_markdown
             ):
-                progress_msg = partial[0]
-                yield (f"[第 {i} 个视频] {progress_msg}", "", "")
-                # 当 progress_msg 为空串时，表示已完成该视频的分析和文件写入
-                if progress_msg == "":
-                    info_str = f"第 {i} 个视频(ID={vid_id}) 已生成MD。"
-                    summary_lines.append(info_str)
-                    break
-
-        final_info = "批量生成完成："
-        final_result = "\n".join(summary_lines)
-        yield ("", final_info, final_result)
+                if job_id is None:
+                    yield (progress, "", "")
+            if job_id is None:
+                return
+
+        yield from run_batch_job(job_id, youtube_api, ds_api, max_parallel_videos)
 
     except Exception as e:
         error_message = f"处理频道视频时出错: {str(e)}"
-        yield (error_message, "", "")
\ No newline at end of file
+        yield (error_message, "", "")
+
+
+def create_channel_job(
+    youtube_api,
+    channel_id,
+    max_videos,
+    subtitle_prompt,
+    comments_prompt,
+    comments_option,
+    refresh_cache=False,
+    published_after="",
+    published_before="",
+    only_new=False,
+    write_markdown=True
+):
+    """
+    解析频道的上传播放列表并建立批量任务清单（参数一并保存，续跑时沿用）。
+    视频不在这里枚举，而是在 run_batch_job 中边翻页边分析。
+    max_videos 为最多处理的视频数（0 表示不限）；published_after / published_before 为
+    "YYYY-MM-DD" 格式的发布日期范围（含当天，可留空）；only_new=True 时只处理该频道
+    上次运行之后发布的视频。
+    生成器：逐条产出 (progress_str, None)，成功时最后产出 ("", job_id)
+    """
+    channel_id = (channel_id or "").strip()
+    published_after = (published_after or "").strip()
+    published_before = (published_before or "").strip()
+    for value in (published_after, published_before):
+        if value and not re.fullmatch(r"\d{4}-\d{2}-\d{2}", value):
+            yield (f"日期格式应为 YYYY-MM-DD：{value}", None)
+            return
+
+    quota = get_quota_ledger()
+    if quota.remaining(youtube_api) < method_cost("youtube.channels.list") + method_cost("youtube.playlistItems.list"):
+        yield (f"YouTube 今日配额不足，无法读取频道视频列表。{quota.format(youtube_api)}", None)
+        return
+
+    yield ("正在解析频道的上传视频列表...", None)
+    uploads_playlist = get_uploads_playlist_id(youtube_api, channel_id)
+    if not uploads_playlist:
+        yield (f"未找到频道 {channel_id}", None)
+        return
+
+    manifest = get_job_manifest()
+    since, backlog = manifest.get_channel_cursor(channel_id) if only_new else (None, None)
+    params = {
+        "subtitle_prompt": subtitle_prompt or "",
+        "comments_prompt": comments_prompt or "",
+        "comments_option": comments_option,
+        "refresh_cache": bool(refresh_cache),
+        "write_markdown": bool(write_markdown),
+        "channel_id": channel_id,
+        "uploads_playlist": uploads_playlist,
+        "max_videos": int(max_videos or 0),
+        "published_after": published_after,
+        "published_before": published_before,
+        # 建任务时就固定游标，续跑时不受之后游标推进的影响
+        "since": since,
+        "backlog": backlog,
+        "enumerated": False
+    }
+    job_id = manifest.create_job(f"channel:{channel_id}", params)
+    yield ("", job_id)
+
+
+def run_batch_job(job_id, youtube_api, ds_api, max_parallel_videos=DEFAULT_MAX_PARALLEL_VIDEOS, on_state=None):
+    """
+    运行（或续跑）批量任务：
+      1) 读取任务清单，跳过已完成全部阶段且 MD 文件仍在的视频
+      2) 频道任务尚未枚举完时，边翻上传播放列表边把新视频加入清单并立即开始分析
+      3) 估算各视频所需的 YouTube 配额
+      4) 并行调用 analyze_single_video_with_progress（同时最多 max_parallel_videos 个），
+         每完成一个阶段就把完成情况与产出写入清单；续跑的视频中已完成的阶段直接沿用清单中保存的产出
+         （视频信息、评论、摘要），字幕命中缓存
+      5) 实时输出各视频进度，完成顺序可能与视频顺序不同
+    剩余配额不足以完成某个视频时，该视频推迟到配额重置后再处理，而不是中途失败
+    每次yield都返回 (progress_str, batch_md, batch_result)；
+    on_state(index, video_id, state) 为可选回调，在某个视频的状态变化时调用（命令行使用）
+    """
+    manifest = get_job_manifest()
+    job = manifest.get_job(job_id)
+    if job is None:
+        yield (f"未找到批量任务 {job_id}", "", "")
+        return
+    params = job["params"]
+    comments_option = params["comments_option"]
+    quota = get_quota_ledger()
+    batch_usage = UsageLedger()
+
+    videos = manifest.videos(job_id)
+    video_ids = [video["video_id"] for video in videos]
+    position = {vid_id: i for i, vid_id in enumerate(video_ids)}
+    states = ["等待中"] * len(videos)
+    finished = [False] * len(videos)
+    succeeded = [False] * len(videos)
+    pending = []
+    for i, video in enumerate(videos):
+        if is_video_complete(video, comments_option):
+            states[i] = "已生成MD（上次运行）"
+            finished[i] = succeeded[i] = True
+        else:
+            pending.append(video_ids[i])
+    stages_by_id = {video["video_id"]: video["stages"] for video in videos}
+    costs = {}
+
+    def set_state(index, state):
+        states[index] = state
+        if on_state is not None:
+            on_state(index, video_ids[index], state)
+
+    def estimate(vid_ids):
+        # 批量获取视频信息（每50个一次请求），逐个分析时直接命中缓存；
+        # 再估算各视频评论部分需要的配额，剩余配额不足时推迟尚未开始的视频。
+        # 获取视频信息时配额已用尽：这些视频的配额记为未知（None），轮到时直接推迟
+        try:
+            video_infos = prefetch_video_info(youtube_api, vid_ids)
+        except QuotaExceeded as e:
+            print(f"批量获取视频信息时配额不足: {e}")
+            for vid_id in vid_ids:
+                costs[vid_id] = None
+            return
+        for vid_id in vid_ids:
+            costs[vid_id] = estimate_comment_quota(
+                vid_id,
+                _video_comment_count(video_infos.get(vid_id)),
+                comments_option
+            )
+
+    if pending:
+        yield (f"正在批量获取 {len(pending)} 个视频的信息...", "", "")
+        estimate(pending)
+
+    enumerate_errors = []
+
+    def enumerate_channel():
+        """
+        翻页枚举频道上传列表：每取到一页就把新视频加入清单并交给并行分析。
+        枚举完毕后标记任务并更新频道游标（因数量上限提前结束时，未枚举到的部分记为 backlog，之后的运行补上）；
+        中途出错时保持未枚举状态，续跑时重新翻页（已在清单中的视频跳过）
+        """
+        newest = None
+        oldest = None
+        outcome = {}
+        try:
+            for page in iter_upload_pages(
+                youtube_api,
+                params["uploads_playlist"],
+                max_videos=params["max_videos"],
+                published_after=params["published_after"],
+                published_before=params["published_before"],
+                since=params["since"],
+                backlog=params.get("backlog"),
+                result=outcome
+            ):
+                published = [published_at for _, published_at in page]
+                newest = max(newest or "", *published)
+                oldest = min(oldest or published[0], *published)
+                added = manifest.add_videos(job_id, [vid_id for vid_id, _ in page])
+                estimate(added)
+                for vid_id in added:
+                    position[vid_id] = len(video_ids)
+                    video_ids.append(vid_id)
+                    stages_by_id[vid_id] = {}
+                    states.append("等待中")
+                    finished.append(False)
+                    succeeded.append(False)
+                yield from added
+        except Exception as e:
+            print(f"枚举频道视频出错: {e}")
+            enumerate_errors.append(str(e))
+            return
+        manifest.update_params(job_id, enumerated=True)
+        # 只按发布日期上限回溯的任务没有从列表顶部开始枚举，不影响游标
+        if not params["published_before"]:
+            lower = oldest if outcome["limited"] else (params["published_after"] or None)
+            manifest.record_channel_enumeration(params["channel_id"], newest, lower)
+
+    tasks = pending
+    if params.get("uploads_playlist") and not params.get("enumerated"):
+        tasks = chain(pending, enumerate_channel())
+
+    deferred = set()
+
+    def make_generator(vid_id):
+        # 不需要 Data API 配额的视频（如不获取评论）即使剩余配额低于预留也照常处理
+        cost = costs[vid_id]
+        if cost is None or (cost and quota.remaining(youtube_api) - QUOTA_RESERVE < cost):
+            deferred.add(vid_id)
+            return iter([("配额不足，已推迟",)])
+        manifest.set_status(job_id, vid_id, "running")
+        stages = stages_by_id[vid_id]
+        return analyze_single_video_with_progress(
+            youtube_api,
+            vid_id,
+            ds_api,
+            params["subtitle_prompt"],
+            params["comments_prompt"],
+            comments_option,
+            # 续跑时已生成的摘要不再重新生成
+            params["refresh_cache"] and not any(
+                stage in stages for stage in ("subtitle_summary", "comments_summary")
+            ),
+            batch_usage,
+            on_stage=lambda stage, detail=None: manifest.mark_stage(job_id, vid_id, stage, detail),
+            write_markdown=params.get("write_markdown", True),
+            # 已完成阶段的产出保存在任务清单中，续跑时直接沿用（不受缓存有效期影响）
+            saved_outputs=manifest.stage_outputs(job_id, vid_id)
+        )
+
+    def estimate_md():
+        needed = sum(cost or 0 for cost in costs.values())
+        line = f"任务 {job_id}：预计还需约 {needed} 单位 YouTube 配额；{quota.format(youtube_api)}"
+        if needed and needed > quota.remaining(youtube_api) - QUOTA_RESERVE:
+            line += "。剩余配额可能不够，配额不足时尚未开始的视频将推迟"
+        return line
+
+    for _, vid_id, partial in run_in_parallel(
+        tasks,
+        make_generator,
+        max_parallel_videos or DEFAULT_MAX_PARALLEL_VIDEOS
+    ):
+        index = position[vid_id]
+        if partial is None:
+            finished[index] = True
+            if vid_id in deferred:
+                manifest.set_status(job_id, vid_id, "deferred")
+                set_state(index, "已推迟（YouTube 配额不足）")
+            elif not succeeded[index]:
+                manifest.set_status(job_id, vid_id, "failed", states[index])
+                set_state(index, f"失败：{states[index]}")
+            else:
+                video = next(v for v in manifest.videos(job_id) if v["video_id"] == vid_id)
+                if is_video_complete(dict(video, status="done"), comments_option):
+                    manifest.set_status(job_id, vid_id, "done")
+                else:
+                    manifest.set_status(job_id, vid_id, "partial", "部分阶段失败")
+                    set_state(index, "已生成MD（部分阶段失败，续跑时重试）")
+        # 当 progress_msg 为空串时，表示已完成该视频的分析和文件写入
+        elif partial[0] == "":
+            succeeded[index] = True
+            set_state(index, "已生成MD")
+        else:
+            set_state(index, partial[0])
+        yield (f"{estimate_md()}\n\n{_render_batch_progress(video_ids, states, finished)}", "", "")
+
+    job_status = manifest.finish_job(job_id, complete=not enumerate_errors)
+
+    summary_lines = []
+    if not video_ids:
+        summary_lines.append("没有符合条件的视频（频道没有视频，或没有在日期范围内/上次运行之后发布的视频）。")
+    for i, vid_id in enumerate(video_ids, 1):
+        if succeeded[i - 1]:
+            summary_lines.append(f"第 {i} 个视频(ID={vid_id}) {states[i - 1]}。")
+        else:
+            summary_lines.append(f"第 {i} 个视频(ID={vid_id}) {states[i - 1]}")
+
+    if deferred:
+        summary_lines.append(
+            f"{len(deferred)} 个视频因 YouTube 配额不足已推迟，配额在太平洋时间午夜重置后续跑即可"
+            "（已完成的视频会直接跳过）。"
+        )
+    if enumerate_errors:
+        summary_lines.append(f"枚举频道视频时出错（{enumerate_errors[0]}），续跑时会继续枚举。")
+    if job_status != "done":
+        summary_lines.append(
+            f"任务 {job_id} 尚未全部完成，可运行 `python cli.py resume {job_id}` "
+            "或在「续跑任务 ID」中填入该 ID 继续。"
+        )
+    summary_lines.append(quota.format(youtube_api))
+
+    final_info = "批量生成完成："
+    batch_usage_md = batch_usage.format("本批次 DeepSeek 用量")
+    if batch_usage_md:
+        summary_lines.append(batch_usage_md)
+    cache_stats = format_llm_cache_stats()
+    if cache_stats:
+        summary_lines.append(cache_stats)
+    final_result = "\n".join(summary_lines)
+    yield ("", final_info, final_result)
+
+
+def _video_comment_count(response):
+    if not response or not response.get("items"):
+        return 0
+    return int(response["items"][0]["statistics"].get("commentCount", 0))
+
+
+def _render_batch_progress(video_ids, states, finished):
+    """
+    将各视频当前状态渲染为 Markdown 表格
+    """
+    lines = [
+        f"已完成 {sum(finished)}/{len(video_ids)} 个视频",
+        "",
+        "| # | 视频ID | 状态 |",
+        "| --- | --- | --- |"
+    ]
+    for i, (vid_id, state) in enumerate(zip(video_ids, states), 1):
+        state = state.replace("|", "\\|").replace("\n", " ")
+        lines.append(f"| {i} | {vid_id} | {state} |")
+    return "\n".join(lines)
@@ -9,7 +9,11 @@ from prompts import (
     DEFAULT_SYSTEM_PROMPT
 )
 from analysis import process_youtube_content, batch_process_callback
+from archive import lookup_history, open_archived_run
+from search import search_archive
 from chat import user_input
+from cache_utils import extract_video_id
+from llm import format_llm_cache_stats
 from store import save_prompts, load_prompts
 
 # 使用文件系统来存储 API keys
@@ -51,6 +55,8 @@ with gr.Blocks(theme=gr.themes.Soft()) as iface:
 
     stored_subtitles = gr.State()
     stored_api_key = gr.State()
+    stored_video_id = gr.State()
+    stored_chat_usage = gr.State()
     stored_youtube_api_key = gr.State("")
     stored_deepseek_api_key = gr.State("")
 
@@ -65,7 +71,9 @@ with gr.Blocks(theme=gr.themes.Soft()) as iface:
             with gr.Row():
                 video_url = gr.Textbox(
                     label="YouTube 视频 URL", 
-                    placeholder="输入要分析的 YouTube 视频链接",
+                    placeholder="输入要分析的 YouTube 视频链接（多个链接可换行分隔，也可输入播放列表链接）",
+                    lines=1,
+                    max_lines=10,
                     scale=2
                 )
             with gr.Row():
@@ -89,12 +97,21 @@ with gr.Blocks(theme=gr.themes.Soft()) as iface:
             # 评论获取方式
             comments_option_single = gr.Dropdown(
                 label="评论获取方式",
-                choices=["不获取评论", "只获取前100条", "获取全部评论"],
+                choices=["不获取评论", "只获取前100条", "获取全部评论", "按预算抽样评论"],
                 value="不获取评论",
                 interactive=True
             )
+            refresh_cache_single = gr.Checkbox(
+                label="忽略缓存，重新生成摘要",
+                value=False
+            )
+            write_markdown_single = gr.Checkbox(
+                label="同时保存为 Markdown 文件",
+                value=True
+            )
 
             single_progress = gr.Markdown(label="进度提醒")
+            single_cache_stats = gr.Markdown()
             single_video_info = gr.Markdown(label="视频信息")
             
             with gr.Accordion("字幕总结", open=True):
@@ -108,8 +125,11 @@ with gr.Blocks(theme=gr.themes.Soft()) as iface:
 
             submit_btn = gr.Button("分析视频", variant="primary")
 
-            def store_data(info, summary1, summary2, subtitles_text, comments_text, api_key):
-                return subtitles_text, api_key
+            def store_data(info, summary1, summary2, subtitles_text, comments_text, api_key, url_text):
+                # 只分析了单个视频时记录其ID，供字幕对话检索带时间轴的字幕片段
+                urls = (url_text or "").split()
+                video_id = extract_video_id(urls[0]) if len(urls) == 1 else None
+                return subtitles_text, api_key, video_id
 
             submit_btn.click(
                 fn=process_youtube_content,
@@ -119,7 +139,9 @@ with gr.Blocks(theme=gr.themes.Soft()) as iface:
                     deepseek_api,
                     stored_subtitle_prompt,
                     stored_comments_prompt,
-                    comments_option_single
+                    comments_option_single,
+                    refresh_cache_single,
+                    write_markdown_single
                 ],
                 outputs=[
                     single_progress,
@@ -137,9 +159,14 @@ with gr.Blocks(theme=gr.themes.Soft()) as iface:
                     comments_summary_box,
                     subtitles,
                     comments,
-                    deepseek_api
+                    deepseek_api,
+                    video_url
                 ],
-                outputs=[stored_subtitles, stored_api_key]
+                outputs=[stored_subtitles, stored_api_key, stored_video_id]
+            ).then(
+                fn=format_llm_cache_stats,
+                inputs=None,
+                outputs=[single_cache_stats]
             ).then(
                 fn=store_apis_from_single,
                 inputs=[youtube_api, deepseek_api],
@@ -168,16 +195,17 @@ with gr.Blocks(theme=gr.themes.Soft()) as iface:
                     scale=4
                 )
                 submit_chat = gr.Button("发送", scale=1)
+            chat_token_stats = gr.Markdown()
 
             msg.submit(
                 user_input, 
-                [msg, chatbot, stored_subtitles, stored_api_key, stored_system_prompt], 
-                chatbot
+                [msg, chatbot, stored_subtitles, stored_api_key, stored_system_prompt, stored_video_id, stored_chat_usage], 
+                [chatbot, chat_token_stats, stored_chat_usage]
             )
             submit_chat.click(
                 user_input, 
-                [msg, chatbot, stored_subtitles, stored_api_key, stored_system_prompt], 
-                chatbot
+                [msg, chatbot, stored_subtitles, stored_api_key, stored_system_prompt, stored_video_id, stored_chat_usage], 
+                [chatbot, chat_token_stats, stored_chat_usage]
             )
             msg.submit(lambda: "", None, [msg])
             submit_chat.click(lambda: "", None, [msg])
@@ -187,17 +215,37 @@ with gr.Blocks(theme=gr.themes.Soft()) as iface:
             with gr.Row():
                 channel_id = gr.Textbox(
                     label="频道ID",
-                    placeholder="输入频道ID，如 UCxxxxxxx",
+                    placeholder="输入频道ID（如 UCxxxxxxx）或 @handle",
                     lines=1,
                     scale=2
                 )
             with gr.Row():
                 max_videos = gr.Number(
-                    label="获取最近视频数量",
+                    label="获取最近视频数量（0 表示全部）",
                     value=5,
                     precision=0,
                     interactive=True
                 )
+                published_after = gr.Textbox(
+                    label="发布日期起（可选）",
+                    placeholder="YYYY-MM-DD",
+                    lines=1
+                )
+                published_before = gr.Textbox(
+                    label="发布日期止（可选）",
+                    placeholder="YYYY-MM-DD",
+                    lines=1
+                )
+                only_new = gr.Checkbox(
+                    label="只分析上次运行之后的新视频",
+                    value=False
+                )
+            with gr.Row():
+                resume_job_id = gr.Textbox(
+                    label="续跑任务 ID（可选）",
+                    placeholder="填入之前未完成的任务 ID，跳过已完成的视频继续处理",
+                    lines=1
+                )
             with gr.Row():
                 with gr.Column(scale=1):
                     youtube_api_batch = gr.Textbox(
@@ -217,10 +265,45 @@ with gr.Blocks(theme=gr.themes.Soft()) as iface:
             # 评论获取方式（批量）
             comments_option_batch = gr.Dropdown(
                 label="评论获取方式（批量）",
-                choices=["不获取评论", "只获取前100条", "获取全部评论"],
+                choices=["不获取评论", "只获取前100条", "获取全部评论", "按预算抽样评论"],
                 value="不获取评论",
                 interactive=True
             )
+            refresh_cache_batch = gr.Checkbox(
+                label="忽略缓存，重新生成摘要（批量）",
+                value=False
+            )
+            write_markdown_batch = gr.Checkbox(
+                label="同时保存为 Markdown 文件（批量）",
+                value=True
+            )
+
+            # 并发设置（批量）
+            with gr.Row():
+                max_parallel_videos = gr.Number(
+                    label="同时分析视频数",
+                    value=3,
+                    precision=0,
+                    interactive=True
+                )
+                youtube_concurrency = gr.Number(
+                    label="YouTube 并发请求数",
+                    value=8,
+                    precision=0,
+                    interactive=True
+                )
+                llm_concurrency = gr.Number(
+                    label="DeepSeek 并发调用数",
+                    value=4,
+                    precision=0,
+                    interactive=True
+                )
+                youtube_daily_quota = gr.Number(
+                    label="YouTube 每日配额（单位）",
+                    value=10000,
+                    precision=0,
+                    interactive=True
+                )
 
             batch_progress = gr.Markdown(label="批量进度提醒")
             batch_md = gr.Markdown()
@@ -237,7 +320,17 @@ with gr.Blocks(theme=gr.themes.Soft()) as iface:
                     deepseek_api_batch,
                     stored_subtitle_prompt,
                     stored_comments_prompt,
-                    comments_option_batch
+                    comments_option_batch,
+                    max_parallel_videos,
+                    youtube_concurrency,
+                    llm_concurrency,
+                    refresh_cache_batch,
+                    youtube_daily_quota,
+                    published_after,
+                    published_before,
+                    only_new,
+                    write_markdown_batch,
+                    resume_job_id
                 ],
                 outputs=[batch_progress, batch_md, batch_result]
             ).then(
@@ -251,6 +344,64 @@ with gr.Blocks(theme=gr.themes.Soft()) as iface:
                 ]
             )
 
+        with gr.TabItem("历史记录"):
+            gr.Markdown("### 查看以往的分析结果（按视频或频道查询存档）")
+            with gr.Row():
+                history_query = gr.Textbox(
+                    label="视频链接 / 视频ID / 频道ID",
+                    placeholder="留空则列出最近的分析记录",
+                    lines=1,
+                    scale=3
+                )
+                history_btn = gr.Button("查询", scale=1)
+            history_list = gr.Markdown()
+            with gr.Row():
+                history_run_id = gr.Number(
+                    label="记录编号",
+                    precision=0,
+                    interactive=True,
+                    scale=3
+                )
+                history_open_btn = gr.Button("打开", scale=1)
+            history_video_info = gr.Markdown()
+            with gr.Accordion("字幕总结", open=True):
+                history_subtitle_summary = gr.Markdown(show_copy_button=True)
+            with gr.Accordion("评论总结", open=True):
+                history_comments_summary = gr.Markdown(show_copy_button=True)
+            with gr.Accordion("字幕内容", open=False):
+                history_subtitles = gr.Textbox(label="字幕", lines=10, show_copy_button=True)
+            with gr.Accordion("评论内容", open=False):
+                history_comments = gr.Textbox(label="评论", lines=10, show_copy_button=True)
+
+            history_btn.click(fn=lookup_history, inputs=[history_query], outputs=[history_list])
+            history_query.submit(fn=lookup_history, inputs=[history_query], outputs=[history_list])
+            history_open_btn.click(
+                fn=open_archived_run,
+                inputs=[history_run_id],
+                outputs=[
+                    history_video_info,
+                    history_subtitle_summary,
+                    history_comments_summary,
+                    history_subtitles,
+                    history_comments
+                ]
+            )
+
+        with gr.TabItem("全文搜索"):
+            gr.Markdown("### 在全部已分析视频的字幕与总结中搜索（中文可直接输入词语，多个词用空格分隔）")
+            with gr.Row():
+                search_query = gr.Textbox(
+                    label="搜索内容",
+                    placeholder="例如：大模型 开源",
+                    lines=1,
+                    scale=3
+                )
+                search_btn = gr.Button("搜索", variant="primary", scale=1)
+            search_results = gr.Markdown()
+
+            search_btn.click(fn=search_archive, inputs=[search_query], outputs=[search_results])
+            search_query.submit(fn=search_archive, inputs=[search_query], outputs=[search_results])
+
         with gr.TabItem("提示词管理"):
             gr.Markdown("#### 在这里可自定义【字幕总结】、【评论总结】、以及【字幕对话】的提示词。")
 
@@ -0,0 +1,299 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+from cache_utils import extract_video_id
+from text_utils import format_timestamp
+from transcript import load_transcript
+
+# 取得当前脚本所在文件夹的绝对路径
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BASE_DIR, "analysis_results")
+ARCHIVE_FILE = os.path.join(RESULTS_DIR, "archive.sqlite3")
+
+# 每次分析保存的正文内容（压缩后单独存放，列表与查询只读元数据）
+CONTENT_FIELDS = (
+    "video_info_md",
+    "subtitle_summary",
+    "comments_summary",
+    "comments_stats_md",
+    "transcript",
+    "comments_text"
+)
+# 带时间轴的字幕（transcript.Transcript 的二进制序列化）在 run_content 中的字段名
+TIMELINE_FIELD = "timeline"
+# 导出的字幕内容按约这么多 token 分段，每段前标注可跳转的时间戳
+EXPORT_PARAGRAPH_TOKENS = 300
+
+
+def prompt_hash(subtitle_prompt, comments_prompt, comments_option):
+    """
+    一次分析所用提示词与评论获取方式的哈希（前 16 位），用于区分同一视频的不同分析配置
+    """
+    payload = json.dumps([subtitle_prompt, comments_prompt, comments_option], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class AnalysisArchive:
+    """
+    分析结果存档：每个视频的每次分析（运行）一行，按视频 ID 与运行（提示词哈希、模型、时间）区分，
+    不会因标题相同而互相覆盖
+    - runs 表：元数据（视频、频道、标题、统计数、模型、提示词哈希、时间、MD 路径），
+      按视频和频道建索引，查某个视频或频道的历史只需一次索引查询
+    - run_content 表：各部分正文（摘要、字幕、评论等）及带时间轴的字幕，zlib 压缩
+    """
+
+    def __init__(self, path=ARCHIVE_FILE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                video_id TEXT NOT NULL,
+                channel_id TEXT,
+                channel_title TEXT,
+                title TEXT NOT NULL,
+                published_at TEXT,
+                view_count INTEGER,
+                like_count INTEGER,
+                comment_count INTEGER,
+                model TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                comments_option TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                md_path TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_runs_video ON runs (video_id, created_at);
+            CREATE INDEX IF NOT EXISTS idx_runs_channel ON runs (channel_id, created_at);
+            CREATE TABLE IF NOT EXISTS run_content (
+                run_id INTEGER NOT NULL,
+                field TEXT NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (run_id, field)
+            );
+            """
+        )
+        self._conn.commit()
+
+    def save_run(self, video_id, video_info, model, prompt_hash, comments_option, content, md_path=None):
+        """
+        保存一次分析：video_info 为 videos().list 返回的单个条目，content 为 {CONTENT_FIELDS 中的字段: 文本}，
+        另可含 timeline（带时间轴的字幕 Transcript，保存后字幕纯文本由它还原，不再重复存一份）。返回 run_id
+        """
+        snippet = video_info.get("snippet", {})
+        statistics = video_info.get("statistics", {})
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO runs (video_id, channel_id, channel_title, title, published_at, "
+                "view_count, like_count, comment_count, model, prompt_hash, comments_option, created_at, md_path) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    video_id,
+                    snippet.get("channelId"),
+                    snippet.get("channelTitle"),
+                    snippet.get("title", ""),
+                    snippet.get("publishedAt"),
+                    int(statistics.get("viewCount", 0)),
+                    int(statistics.get("likeCount", 0)),
+                    int(statistics.get("commentCount", 0)),
+                    model,
+                    prompt_hash,
+                    comments_option,
+                    time.time(),
+                    md_path
+                )
+            )
+            run_id = cursor.lastrowid
+            timeline = content.get(TIMELINE_FIELD)
+            rows = [
+                (run_id, field, zlib.compress(content[field].encode("utf-8"), 6))
+                for field in CONTENT_FIELDS
+                if content.get(field) and not (field == "transcript" and timeline and timeline.text == content[field])
+            ]
+            if timeline:
+                rows.append((run_id, TIMELINE_FIELD, zlib.compress(timeline.to_bytes(), 6)))
+            self._conn.executemany(
+                "INSERT INTO run_content (run_id, field, data) VALUES (?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+        return run_id
+
+    def list_runs(self, video_id=None, channel_id=None, limit=50):
+        """
+        按时间从新到旧列出某个视频或某个频道的分析记录（只含元数据）
+        """
+        if video_id:
+            where, value = "video_id = ?", video_id
+        elif channel_id:
+            where, value = "channel_id = ?", channel_id
+        else:
+            where, value = "1 = ?", 1
+        with self._lock:
+            cursor = self._conn.execute(
+                f"SELECT * FROM runs WHERE {where} ORDER BY created_at DESC LIMIT ?",
+                (value, limit)
+            )
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def get_run(self, run_id):
+        """
+        读取一次分析的元数据与全部正文；timeline 为带时间轴的字幕（较早的存档没有，为 None）。
+        不存在时返回 None
+        """
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            run = dict(zip([column[0] for column in cursor.description], row))
+            content = self._conn.execute(
+                "SELECT field, data FROM run_content WHERE run_id = ?", (run_id,)
+            ).fetchall()
+        for field in CONTENT_FIELDS:
+            run[field] = ""
+        run[TIMELINE_FIELD] = None
+        for field, data in content:
+            if field == TIMELINE_FIELD:
+                run[field] = load_transcript(zlib.decompress(data))
+            else:
+                run[field] = zlib.decompress(data).decode("utf-8")
+        if run[TIMELINE_FIELD] and not run["transcript"]:
+            run["transcript"] = run[TIMELINE_FIELD].text
+        return run
+
+    def list_video_ids(self):
+        """
+        存档中出现过的全部视频 ID
+        """
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT video_id FROM runs")]
+
+    def latest_run(self, video_id, prompt_hash=None, model=None):
+        """
+        某个视频最近一次分析（可按提示词哈希与模型筛选）；没有时返回 None
+        """
+        sql = "SELECT run_id FROM runs WHERE video_id = ?"
+        args = [video_id]
+        if prompt_hash:
+            sql += " AND prompt_hash = ?"
+            args.append(prompt_hash)
+        if model:
+            sql += " AND model = ?"
+            args.append(model)
+        with self._lock:
+            row = self._conn.execute(sql + " ORDER BY created_at DESC LIMIT 1", args).fetchone()
+        return self.get_run(row[0]) if row else None
+
+
+def render_transcript(run):
+    """
+    报告中的字幕内容：有时间轴时按段落排列，每段前是跳转到该时间点的链接；否则为纯文本
+    """
+    timeline = run.get(TIMELINE_FIELD)
+    if not timeline or not run.get("video_id"):
+        return run["transcript"]
+    url = f"https://www.youtube.com/watch?v={run['video_id']}"
+    return "\n\n".join(
+        f"[{format_timestamp(start)}]({url}&t={int(start)}s) {text}"
+        for start, _, text in timeline.paragraphs(EXPORT_PARAGRAPH_TOKENS)
+    )
+
+
+def render_markdown(run):
+    """
+    把一次分析渲染为完整的 Markdown 报告（与写出的 MD 文件格式相同）
+    """
+    md_content = (
+        f"# {run['title']}\n\n"
+        f"{run['video_info_md']}\n"
+        f"## 字幕总结\n\n{run['subtitle_summary']}\n\n"
+    )
+    if run["comments_option"] != "不获取评论":
+        md_content += f"## 评论总结\n\n{run['comments_summary']}\n\n"
+        if run["comments_stats_md"]:
+            md_content += f"{run['comments_stats_md']}\n"
+        md_content += f"## 评论内容\n\n{run['comments_text']}\n"
+    md_content += f"## 字幕内容\n\n{render_transcript(run)}\n"
+    return md_content
+
+
+def format_run_list(runs):
+    """
+    将分析记录列表渲染为 Markdown 表格
+    """
+    if not runs:
+        return "没有找到分析记录"
+    lines = [
+        "| 记录编号 | 分析时间 | 视频 | 标题 | 评论获取方式 | 模型 | 提示词 |",
+        "| --- | --- | --- | --- | --- | --- | --- |"
+    ]
+    for run in runs:
+        created = time.strftime("%Y-%m-%d %H:%M", time.localtime(run["created_at"]))
+        title = run["title"].replace("|", "\\|")
+        lines.append(
+            f"| {run['run_id']} | {created} | {run['video_id']} | {title} | "
+            f"{run['comments_option']} | {run['model']} | {run['prompt_hash'][:8]} |"
+        )
+    return "\n".join(lines)
+
+
+def lookup_history(query):
+    """
+    按视频链接/视频ID或频道ID查询分析记录，留空时列出最近的记录；返回 Markdown 表格
+    """
+    query = (query or "").strip()
+    archive = get_archive()
+    if not query:
+        return format_run_list(archive.list_runs())
+    if re.fullmatch(r"UC[\w-]{22}", query):
+        return format_run_list(archive.list_runs(channel_id=query))
+    video_id = extract_video_id(query) or query
+    return format_run_list(archive.list_runs(video_id=video_id))
+
+
+def open_archived_run(run_id):
+    """
+    打开一次以往的分析，返回与视频分析页相同的 5 个部分：
+    (video_info_md, subtitle_summary_md, comments_summary_md, transcript_text, comments_text)
+    """
+    run = get_archive().get_run(int(run_id)) if run_id else None
+    if run is None:
+        return (f"未找到记录 {run_id}", "", "", "", "")
+    comments_summary_md = ""
+    if run["comments_option"] != "不获取评论":
+        comments_summary_md = f"## 评论总结\n\n{run['comments_summary']}\n"
+        if run["comments_stats_md"]:
+            comments_summary_md += f"\n{run['comments_stats_md']}"
+    return (
+        run["video_info_md"],
+        f"## 字幕总结\n\n{run['subtitle_summary']}\n",
+        comments_summary_md,
+        run["transcript"],
+        run["comments_text"]
+    )
+
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def get_archive():
+    """
+    获取全局共享的分析存档（首次调用时创建）
+    """
+    global _archive
+    if _archive is None:
+        with _archive_lock:
+            if _archive is None:
+                _archive = AnalysisArchive()
+    return _archive
@@ -0,0 +1,68 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 批量模式下默认同时分析的视频数
+DEFAULT_MAX_PARALLEL_VIDEOS = 3
+
+_DONE = object()
+_FED = object()
+
+
+def run_in_parallel(tasks, make_generator, max_parallel=DEFAULT_MAX_PARALLEL_VIDEOS):
+    """
+    并行运行多个进度生成器，按产生顺序逐条转发它们的输出。
+
+    tasks: 任务参数的可迭代对象（可以是边翻页边产出的生成器，在单独的线程中逐个读取，
+           读到一个就提交一个）；make_generator(task) 返回该任务的进度生成器
+    产出 (index, task, partial)；某个任务结束时产出 (index, task, None)。
+    调用方提前停止迭代时（例如前端取消），尚未开始的任务不再执行，
+    进行中的任务在产出下一条进度时退出。
+    """
+    events = queue.Queue()
+    stop = threading.Event()
+
+    def worker(index, task):
+        try:
+            if stop.is_set():
+                return
+            for partial in make_generator(task):
+                if stop.is_set():
+                    return
+                events.put((index, task, partial))
+        except Exception as e:
+            events.put((index, task, (f"出错: {str(e)}",)))
+        finally:
+            events.put((index, task, _DONE))
+
+    executor = ThreadPoolExecutor(max_workers=max(1, int(max_parallel)))
+
+    def feeder():
+        submitted = 0
+        try:
+            for index, task in enumerate(tasks):
+                if stop.is_set():
+                    break
+                executor.submit(worker, index, task)
+                submitted += 1
+        except Exception as e:
+            print(f"读取任务列表出错: {e}")
+        finally:
+            events.put((None, submitted, _FED))
+
+    threading.Thread(target=feeder, daemon=True).start()
+    try:
+        total = None
+        finished = 0
+        while total is None or finished < total:
+            index, task, partial = events.get()
+            if partial is _FED:
+                total = task
+            elif partial is _DONE:
+                finished += 1
+                yield (index, task, None)
+            else:
+                yield (index, task, partial)
+    finally:
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
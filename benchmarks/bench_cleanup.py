@@ -0,0 +1,63 @@
+"""
+用合成的滚动式自动字幕（相邻片段首尾重叠，夹杂 [Music] 标记与语气词，没有标点）测试字幕清理：
+不同时长下 clean_transcript 的耗时（应随片段数线性增长）与清理前后的 token 数
+
+用法: python benchmarks/bench_cleanup.py [最长小时数]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from transcript import Transcript
+from transcript_cleanup import clean_transcript, format_cleanup_stats
+
+# 自动字幕大约每 1.5 秒一个片段，每个片段重复上一片段末尾的几个词
+SEGMENT_SECONDS = 1.5
+OVERLAP_WORDS = 3
+NEW_WORDS = 5
+
+WORDS = (
+    "the", "model", "we", "are", "going", "to", "talk", "about", "data", "training", "and", "then",
+    "so", "this", "is", "really", "important", "because", "you", "can", "see", "that"
+)
+FILLERS = ("um", "uh")
+
+
+def synthetic_transcript(rng, hours):
+    transcript = Transcript()
+    previous = []
+    start = 0.0
+    for i in range(int(hours * 3600 / SEGMENT_SECONDS)):
+        words = previous[-OVERLAP_WORDS:] + [rng.choice(WORDS) for _ in range(NEW_WORDS)]
+        text = " ".join(words)
+        if rng.random() < 0.1:
+            text = rng.choice(FILLERS) + " " + text
+        if i % 60 == 0:
+            text = "[Music] " + text
+        transcript.append(text, start, SEGMENT_SECONDS * 2)
+        previous = words
+        start += SEGMENT_SECONDS
+    return transcript
+
+
+def main():
+    max_hours = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    rng = random.Random(42)
+    hours = 1
+    while hours <= max_hours:
+        transcript = synthetic_transcript(rng, hours)
+        start = time.perf_counter()
+        _, stats = clean_transcript(transcript)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{hours:>2} 小时  耗时 {elapsed:6.2f}s（每千片段 {elapsed / len(transcript) * 1000 * 1000:.1f}ms）  "
+            f"{format_cleanup_stats(stats)}"
+        )
+        hours *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+用合成的 20 万条评论对比评论处理的内存峰值与耗时：
+- 旧做法：全部评论以字典列表驻留内存，并用 += 逐条拼接报告
+- 新做法：评论逐页落盘到本地评论库，以 __slots__ 的 Comment 逐行读出；第一遍记录本地统计并找出重复评论，
+  第二遍重新读出、只保留各组代表，逐条格式化并直接装箱成分段，再由分段一次 join 出报告
+  （与 analysis 中的评论分支一致）
+- 抽样：新做法的基础上按 token 预算分层抽样（「按预算抽样评论」），代表评论同样逐条流过，只保留各层候选
+
+用法: python benchmarks/bench_comment_memory.py [评论数]
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from itertools import chain
+
+from cache_utils import CommentSource, format_comments_header, iter_comment_blocks
+from comment_stats import CommentStatsCollector
+from comment_store import CommentStore
+from dedup import find_duplicates, iter_representatives
+from sampling import sample_comments
+from summarize import pack_units
+
+THREADS_PER_PAGE = 100
+
+
+def synthetic_threads(total):
+    """
+    生成约 total 条评论（顶层评论 + 回复）的线程，按页产出
+    """
+    rng = random.Random(42)
+    produced = 0
+    page = []
+    index = 0
+    while produced < total:
+        reply_count = min(rng.choice([0, 0, 0, 1, 2, 5]), total - produced - 1)
+        replies = [
+            {
+                "text": f"回复 {index}-{j} " + "内容" * rng.randint(5, 40),
+                "publishedAt": f"2024-02-{j % 28 + 1:02d}T00:00:00Z",
+                "likes": rng.randint(0, 50)
+            }
+            for j in range(reply_count)
+        ]
+        page.append({
+            "thread_id": f"t{index}",
+            "top": {
+                "text": f"评论 {index} " + "内容" * rng.randint(5, 80),
+                "publishedAt": f"2024-01-{index % 28 + 1:02d}T{index % 24:02d}:00:00Z",
+                "likes": rng.randint(0, 5000)
+            },
+            "reply_count": reply_count,
+            "replies": replies
+        })
+        produced += 1 + reply_count
+        index += 1
+        if len(page) == THREADS_PER_PAGE:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+def old_pipeline(total):
+    comments = []
+    for page in synthetic_threads(total):
+        for thread in page:
+            comments.append(dict(thread["top"]))
+            comments.extend(dict(reply) for reply in thread["replies"])
+    formatted_text = f"共获取到 {len(comments)} 条评论：\n\n"
+    for idx, comment in enumerate(comments, 1):
+        formatted_text += (
+            f"评论 {idx}:\n{comment['text']}\n"
+            f"发布时间: {comment['publishedAt']}\n"
+            f"点赞数: {comment['likes']}\n\n"
+        )
+    return len(formatted_text)
+
+
+def new_pipeline(total, store, sample=False):
+    for page in synthetic_threads(total):
+        store.upsert_threads("bench", page)
+    store.finish_crawl("bench", full_scan=True)
+    count = store.count_comments("bench")
+    comments = CommentSource(lambda: store.iter_comments("bench"))
+    collector = CommentStatsCollector()
+    duplicates = find_duplicates(collector.observe(comments))
+    collector.compute()
+    header = format_comments_header(count, duplicates.groups)
+    representatives = CommentSource(lambda: iter_representatives(comments, duplicates))
+    if sample:
+        representatives, _ = sample_comments(representatives)
+    chunks = pack_units(chain([header], iter_comment_blocks(representatives)))
+    return len("".join(chunks))
+
+
+def measure(name, fn, make_args):
+    """
+    耗时与内存峰值分两次测量：tracemalloc 本身会显著拖慢执行
+    """
+    start = time.perf_counter()
+    size = fn(*make_args())
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn(*make_args())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<8} 报告 {size / 1e6:7.1f}M 字符  耗时 {elapsed:6.2f}s  内存峰值 {peak / 1e6:8.1f}MB")
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    print(f"合成评论数: {total}")
+    measure("旧做法", old_pipeline, lambda: (total,))
+    tmp_dir = tempfile.mkdtemp()
+    runs = []
+
+    def new_args():
+        store = CommentStore(os.path.join(tmp_dir, f"comments{len(runs)}.sqlite3"))
+        runs.append(store)
+        return total, store
+
+    try:
+        measure("新做法", new_pipeline, new_args)
+        measure("抽样", lambda total, store: new_pipeline(total, store, sample=True), new_args)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
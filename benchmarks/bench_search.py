@@ -0,0 +1,112 @@
+"""
+用合成的 1 万个视频字幕（中英混合，带时间轴）测试全文索引：
+- 建索引：逐个视频调用 SearchIndex.index_video（与分析完成后增量索引的方式一致）的总耗时与索引文件大小
+- 查询：常见词、罕见词、中文单字、英文单词、多词组合、无结果等查询的延迟（中位数 / P95 / 最大值）
+
+用法: python benchmarks/bench_search.py [视频数]
+"""
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search import SearchIndex
+from transcript import Transcript
+
+SEGMENTS_PER_VIDEO = 60
+QUERY_REPEATS = 50
+
+CJK_WORDS = (
+    "大模型", "开源", "训练", "数据", "推理", "芯片", "算力", "视频", "教程", "产品", "发布会", "评测",
+    "手机", "相机", "电池", "价格", "性能", "游戏", "显卡", "编程", "创业", "投资", "市场", "用户",
+    "体验", "设计", "功能", "更新", "版本", "问题"
+)
+EN_WORDS = (
+    "model", "open", "source", "python", "benchmark", "camera", "battery", "price", "review",
+    "update", "release", "gpu", "chip", "startup", "market", "design"
+)
+FILLERS = ("我们", "今天", "然后", "这个", "就是", "其实", "所以", "大家", "可以", "看到")
+# 只在少数视频中出现的罕见词
+RARE_WORDS = ("量子纠缠", "zeppelin")
+
+QUERIES = (
+    ("常见中文词", "大模型"),
+    ("罕见中文词", "量子纠缠"),
+    ("中文单字", "芯"),
+    ("英文单词", "python"),
+    ("罕见英文词", "zeppelin"),
+    ("多词组合", "开源 训练 gpu"),
+    ("无结果", "不存在的词语")
+)
+
+
+def synthetic_transcript(rng, video_index):
+    transcript = Transcript()
+    start = 0.0
+    for i in range(SEGMENTS_PER_VIDEO):
+        words = [rng.choice(FILLERS)]
+        words += rng.sample(CJK_WORDS, 3)
+        if rng.random() < 0.3:
+            words.append(rng.choice(EN_WORDS))
+        if video_index % 500 == 0 and i == SEGMENTS_PER_VIDEO // 2:
+            words.append(RARE_WORDS[video_index // 500 % len(RARE_WORDS)])
+        rng.shuffle(words)
+        duration = rng.uniform(2, 6)
+        transcript.append("".join(words), start, duration)
+        start += duration
+    return transcript
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    rng = random.Random(42)
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp_dir, "archive.sqlite3")
+        index = SearchIndex(path)
+
+        start = time.perf_counter()
+        for i in range(total):
+            index.index_video(
+                f"video{i:05d}",
+                f"合成视频 {i}",
+                run_id=i + 1,
+                transcript=synthetic_transcript(rng, i),
+                subtitle_summary="本视频介绍了" + "、".join(rng.sample(CJK_WORDS, 5))
+            )
+        elapsed = time.perf_counter() - start
+        size = sum(
+            os.path.getsize(os.path.join(tmp_dir, name)) for name in os.listdir(tmp_dir)
+        )
+        print(
+            f"视频数 {total}，检索单元 {index.count_documents()}，建索引耗时 {elapsed:.1f}s"
+            f"（每个视频 {elapsed / total * 1000:.2f}ms），索引文件 {size / 1e6:.1f}MB"
+        )
+
+        run_queries(index)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def run_queries(index):
+    for label, query in QUERIES:
+        index.search(query)
+        timings = []
+        for _ in range(QUERY_REPEATS):
+            start = time.perf_counter()
+            hits = index.search(query)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        print(
+            f"{label:<8} {query:<12} 命中 {len(hits):>3}  中位数 {statistics.median(timings):7.2f}ms  "
+            f"P95 {timings[int(len(timings) * 0.95) - 1]:7.2f}ms  最大 {timings[-1]:7.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
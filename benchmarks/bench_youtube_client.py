@@ -0,0 +1,62 @@
+"""
+对比每次调用都 build() 与使用共享客户端池时，每个线程构造请求的开销。
+只构造请求、不发送网络请求，因此不需要真实的 API Key。
+
+用法: python benchmarks/bench_youtube_client.py [线程数] [每线程调用次数]
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from googleapiclient.discovery import build
+
+from youtube_client import get_youtube_client, _thread_http
+
+API_KEY = "benchmark-key"
+
+
+def per_call_build(calls):
+    # 旧做法：每次调用都解析 discovery 文档并创建新的 HTTP 传输
+    start = time.perf_counter()
+    for i in range(calls):
+        youtube = build("youtube", "v3", developerKey=API_KEY)
+        youtube.comments().list(part="snippet", parentId=f"c{i}", maxResults=100)
+    return time.perf_counter() - start
+
+
+def pooled_client(calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        youtube = get_youtube_client(API_KEY)
+        youtube.comments().list(part="snippet", parentId=f"c{i}", maxResults=100)
+        _thread_http()
+    return time.perf_counter() - start
+
+
+def run(fn, threads, calls):
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        wall_start = time.perf_counter()
+        per_thread = list(executor.map(fn, [calls] * threads))
+        wall = time.perf_counter() - wall_start
+    avg = sum(per_thread) / len(per_thread)
+    return wall, avg / calls * 1000
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    calls = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    # 预热：首次构建会导入并缓存模块
+    get_youtube_client(API_KEY)
+
+    print(f"线程数={threads}, 每线程调用次数={calls}")
+    for name, fn in (("每次 build()", per_call_build), ("共享客户端池", pooled_client)):
+        wall, per_call_ms = run(fn, threads, calls)
+        print(f"{name:<12} 总耗时 {wall:7.3f}s  单次调用开销 {per_call_ms:8.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,157 @@
+import math
 import re
-from functools import lru_cache
-from googleapiclient.discovery import build
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from youtube_transcript_api import YouTubeTranscriptApi
+
+from disk_cache import get_cache, make_key
+from comment_store import Comment, get_comment_store
+from concurrency import youtube_slot
+from youtube_client import get_youtube_client, execute_request
+from transcript import Transcript, load_transcript
+
+# 字幕语言优先级
+TRANSCRIPT_LANGUAGES = ("zh-Hans", "zh-CN", "en")
+
+# 并发拉取评论回复的默认线程数，可按配额情况调整
+REPLY_FETCH_WORKERS = 8
+
+# 距上次同步不足该时长（秒）时直接使用本地评论库，不再请求新评论
+COMMENT_REFRESH_INTERVAL = 3600
+
+# 增量抓取评论时，距上次全量扫描超过该时长（秒）则重新翻完全部线程页检查回复变化
+FULL_SCAN_INTERVAL = 7 * 24 * 3600
+
+# videos().list / playlistItems().list 单次最多接受的数量
+VIDEOS_PER_REQUEST = 50
+
+# 估算配额时假设的「带回复的线程」占评论数的比例（每个这样的线程至少一次 comments().list）
+REPLY_THREAD_SHARE = 0.2
 
-@lru_cache(maxsize=10)
 def cached_get_video_info(api_key, video_id):
-    youtube = build("youtube", "v3", developerKey=api_key)
+    cache = get_cache()
+    cache_key = make_key(video_id)
+    response = cache.get("video_info", cache_key)
+    if response is not None:
+        return response
+
+    youtube = get_youtube_client(api_key)
     request = youtube.videos().list(part="snippet,statistics", id=video_id)
-    response = request.execute()
+    response = execute_request(request)
+    # 只缓存有效结果，避免把临时查不到的视频长期记住
+    if response.get("items"):
+        cache.set("video_info", cache_key, response)
     return response
 
+def prefetch_video_info(api_key, video_ids):
+    """
+    批量获取多个视频的信息：未命中缓存的 ID 每 50 个合并为一次 videos().list，
+    结果按单个视频写入缓存，之后 cached_get_video_info 直接命中。
+    返回 {video_id: response}，查不到的视频不在结果中。
+    """
+    cache = get_cache()
+    results = {}
+    missing = []
+    for video_id in dict.fromkeys(video_ids):
+        response = cache.get("video_info", make_key(video_id))
+        if response is not None:
+            results[video_id] = response
+        else:
+            missing.append(video_id)
+
+    youtube = get_youtube_client(api_key)
+    for i in range(0, len(missing), VIDEOS_PER_REQUEST):
+        chunk = missing[i:i + VIDEOS_PER_REQUEST]
+        request = youtube.videos().list(
+            part="snippet,statistics",
+            id=",".join(chunk)
+        )
+        response = execute_request(request)
+        for item in response.get("items", []):
+            single = {"items": [item]}
+            cache.set("video_info", make_key(item["id"]), single)
+            results[item["id"]] = single
+    return results
+
+def estimate_comment_quota(video_id, comment_count, comments_option):
+    """
+    粗略估算获取某视频评论要消耗的 YouTube 配额单位（字幕不走 Data API，不计配额）：
+    线程页每页 100 条、每次 1 单位；带回复的线程按 REPLY_THREAD_SHARE 估算，每个 1 单位。
+    获取全部评论时，本地评论库中已有的评论只需增量抓取
+    """
+    if comments_option == "不获取评论":
+        return 0
+    if comments_option == "只获取前100条":
+        count = min(int(comment_count), 100)
+    else:
+        store = get_comment_store()
+        if _store_is_fresh(store.get_state(video_id)):
+            return 0
+        count = max(0, int(comment_count) - store.count_comments(video_id))
+    return max(1, math.ceil(count / 100)) + math.ceil(count * REPLY_THREAD_SHARE)
+
+def get_playlist_video_ids(api_key, playlist_id, max_results=None):
+    """
+    分页获取播放列表中的全部视频ID（每页最多50个）
+    """
+    youtube = get_youtube_client(api_key)
+    video_ids = []
+    next_page_token = None
+    while True:
+        request = youtube.playlistItems().list(
+            part="contentDetails",
+            playlistId=playlist_id,
+            maxResults=VIDEOS_PER_REQUEST,
+            pageToken=next_page_token
+        )
+        response = execute_request(request)
+        for item in response.get("items", []):
+            video_ids.append(item["contentDetails"]["videoId"])
+            if max_results and len(video_ids) >= max_results:
+                return video_ids
+        next_page_token = response.get("nextPageToken")
+        if not next_page_token:
+            break
+    return video_ids
+
+def cached_get_transcript(video_id, languages=TRANSCRIPT_LANGUAGES):
+    """
+    获取视频带时间轴的字幕（transcript.Transcript），缓存中以紧凑的二进制格式保存
+    优先自动生成字幕，其次人工字幕（is_generated 标明来源）；两者都没有时返回 None
+    """
+    cache = get_cache()
+    cache_key = make_key(video_id, list(languages))
+    cached = cache.get("transcript", cache_key)
+    if cached is not None:
+        cached = load_transcript(cached)
+        # 旧版缓存未记录字幕来源：重新获取一次
+        if cached.is_generated is not None:
+            return cached
+
+    with youtube_slot():
+        transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
+        try:
+            transcript = transcript_list.find_generated_transcript(list(languages))
+            is_generated = True
+        except Exception:
+            try:
+                transcript = transcript_list.find_manually_created_transcript(list(languages))
+                is_generated = False
+            except Exception:
+                return None
+
+        result = Transcript.from_segments(transcript.fetch(), is_generated)
+    cache.set("transcript", cache_key, result.to_bytes())
+    return result
+
 def _get_all_replies(api_key, parent_comment_id, max_results=None):
     """
-    获取某个顶层评论的所有回复，通过 comments().list 进行分页
+    获取某个顶层评论的所有回复，通过 comments().list 进行分页。
+    单页请求失败会在 execute_request 中带原 pageToken 重试；重试仍失败时返回已取得的部分。
+    返回 (回复列表, 是否完整)
     """
-    youtube = build("youtube", "v3", developerKey=api_key)
+    youtube = get_youtube_client(api_key)
     replies = []
     next_page_token = None
 
@@ -26,7 +164,7 @@ def _get_all_replies(api_key, parent_comment_id, max_results=None):
                 pageToken=next_page_token,
                 textFormat="plainText"
             )
-            response = request.execute()
+            response = execute_request(request)
 
             for item in response.get("items", []):
                 snippet = item["snippet"]
@@ -38,74 +176,304 @@ def _get_all_replies(api_key, parent_comment_id, max_results=None):
 
                 # 如果指定了最大获取数且已到达则停止
                 if max_results and len(replies) >= max_results:
-                    return replies
+                    return replies, True
 
             next_page_token = response.get("nextPageToken")
             if not next_page_token:
                 break
         except Exception as e:
-            print(f"获取回复失败: {e}")
-            break
+            print(f"获取回复失败（已取得 {len(replies)} 条，结果不完整）: {e}")
+            return replies, False
+
+    return replies, True
+
+def cached_get_comment_threads(api_key, video_id, max_results=None, reply_workers=None):
+    """
+    获取视频全部评论（包括顶层评论和所有回复），返回 Comment 列表。
+    如果 max_results=None，则获取所有评论：以增量方式只抓取上次之后的新评论并与已存评论合并。
+    reply_workers 为并发拉取回复的线程数，默认 REPLY_FETCH_WORKERS。
+    """
+    return list(iter_comments(api_key, video_id, max_results, reply_workers))
+
+def iter_comments(api_key, video_id, max_results=None, reply_workers=None):
+    """
+    以生成器方式逐条产出 Comment：
+    - max_results=None：先增量同步到本地评论库（翻页时逐页落盘），再从库中逐行读出，
+      全部评论不会同时以字典形式驻留内存，也不会再整体放入缓存
+    - 指定 max_results：抓取前 max_results 条，结果写入缓存
+    """
+    yield from open_comments(api_key, video_id, max_results, reply_workers)[1]
+
+def _store_is_fresh(state):
+    """
+    本地评论库完整抓取过且距上次同步不足 COMMENT_REFRESH_INTERVAL 时可直接使用
+    """
+    return (
+        state is not None
+        and state["last_full_scan"] is not None
+        and time.time() - state["updated_at"] < COMMENT_REFRESH_INTERVAL
+    )
+
+class CommentSource:
+    """
+    可重复迭代的评论来源：每次迭代都重新逐条读取（本地评论库逐行读出，或由缓存的字典重新构造 Comment），
+    需要多遍扫描（如先找重复再输出代表）时不必把全部评论留在内存中
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+
+    def __iter__(self):
+        return iter(self._factory())
+
+
+def open_comments(api_key, video_id, max_results=None, reply_workers=None):
+    """
+    与 iter_comments 相同，但先返回评论总数：(count, CommentSource, 是否完整)，
+    便于在不把全部评论载入内存的情况下写出带总数的报告；评论来源可重复迭代，不会重新请求。
+    部分请求重试后仍失败时「是否完整」为 False，评论只包含已取得的部分
+    """
+    if max_results is None:
+        store = get_comment_store()
+        complete = True
+        if not _store_is_fresh(store.get_state(video_id)):
+            complete = refresh_comment_store(api_key, video_id, reply_workers=reply_workers)["complete"]
+        return store.count_comments(video_id), CommentSource(lambda: store.iter_comments(video_id)), complete
 
-    return replies
+    cache = get_cache()
+    cache_key = make_key(video_id, max_results)
+    comments = cache.get("comments", cache_key)
+    complete = True
+    if comments is None:
+        comments, complete = _fetch_comment_threads(api_key, video_id, max_results, reply_workers)
+        # 不完整的结果不缓存，下次重新获取
+        if comments and complete:
+            cache.set("comments", cache_key, comments)
+    return len(comments), CommentSource(lambda: (Comment.from_dict(comment) for comment in comments)), complete
 
-@lru_cache(maxsize=10)
-def cached_get_comment_threads(api_key, video_id, max_results=None):
+def _fetch_comment_threads(api_key, video_id, max_results=None, reply_workers=None):
     """
-    获取视频全部评论（包括顶层评论和所有回复）。
-    如果 max_results=None，则获取所有评论。
+    逐页获取顶层评论；每条带回复的评论把回复分页任务提交到线程池，
+    翻页不等待回复返回。按原顺序(顶层评论后紧跟其回复)合并结果。
+    返回 (评论列表, 是否完整)：某页或某条回复重试后仍失败时为不完整
     """
-    youtube = build("youtube", "v3", developerKey=api_key)
+    youtube = get_youtube_client(api_key)
     comments = []
+    complete = True
+    # 待合并的 (顶层评论, 回复任务或None)，保持页面顺序
+    pending = deque()
     next_page_token = None
+    workers = max(1, int(reply_workers or REPLY_FETCH_WORKERS))
 
-    while True:
-        try:
-            # 构建请求，获取顶层评论
-            request = youtube.commentThreads().list(
-                part="snippet",
-                videoId=video_id,
-                maxResults=100,  # 单次最多100条
-                pageToken=next_page_token,
-                textFormat="plainText",
-                order="time"  # 需要时可改为"relevance"
-            )
-            response = request.execute()
+    def drain(block):
+        """
+        按顺序把已完成的条目合并进 comments；block=True 时等待全部完成。
+        达到 max_results 时返回 True
+        """
+        nonlocal complete
+        while pending:
+            top, future = pending[0]
+            if future is not None and not block and not future.done():
+                return False
+            pending.popleft()
+            comments.append(top)
+            if future is not None:
+                replies, replies_complete = future.result()
+                complete = complete and replies_complete
+                # 回复记录所属线程，保留评论的楼层结构
+                comments.extend(
+                    dict(reply, threadId=top["threadId"], isReply=True)
+                    for reply in replies
+                )
+            if max_results and len(comments) >= max_results:
+                return True
+        return False
+
+    reached = False
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        while True:
+            try:
+                # 构建请求，获取顶层评论
+                request = youtube.commentThreads().list(
+                    part="snippet",
+                    videoId=video_id,
+                    maxResults=100,  # 单次最多100条
+                    pageToken=next_page_token,
+                    textFormat="plainText",
+                    order="time"  # 需要时可改为"relevance"
+                )
+                response = execute_request(request)
+
+                # 提取顶层评论
+                for item in response.get("items", []):
+                    top_comment = item["snippet"]["topLevelComment"]
+                    top_comment_snippet = top_comment["snippet"]
+                    top = {
+                        "text": top_comment_snippet["textDisplay"],
+                        "publishedAt": top_comment_snippet["publishedAt"],
+                        "likes": top_comment_snippet["likeCount"],
+                        "threadId": item["id"],
+                        "isReply": False
+                    }
+
+                    # 如果有回复，则提交到线程池进行多次分页获取
+                    future = None
+                    total_replies = item["snippet"].get("totalReplyCount", 0)
+                    if total_replies > 0:
+                        parent_id = top_comment["id"]
+                        future = executor.submit(_get_all_replies, api_key, parent_id, None)
+                    pending.append((top, future))
+
+                # 合并已就绪的部分；已获取的顶层评论足以填满 max_results 时，
+                # 等待回复返回再决定是否翻页，避免多拉页面
+                enough = max_results and len(comments) + len(pending) >= max_results
+                reached = drain(block=bool(enough))
+                if reached:
+                    break
+
+                # 检查下一页
+                next_page_token = response.get("nextPageToken")
+                if not next_page_token:
+                    break
 
-            # 提取顶层评论
+            except Exception as e:
+                print(f"获取评论页面失败（重试后仍失败，结果不完整）: {e}")
+                complete = False
+                break
+
+        if not reached:
+            drain(block=True)
+    finally:
+        # 截断后剩余的回复任务不再需要
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    # 如果指定了最大获取数且超出，则截断返回
+    if max_results and len(comments) >= max_results:
+        comments = comments[:max_results]
+        print(f"成功获取指定数量 {len(comments)} 条评论(含回复)")
+        return comments, complete
+
+    print(f"成功获取 {len(comments)} 条评论(含回复)")
+    return comments, complete
+
+def refresh_comment_store(api_key, video_id, full_scan=None, reply_workers=None):
+    """
+    把视频评论增量同步到本地评论库：
+    - 首次抓取（或从未成功完成全量扫描）时完整抓取
+    - 之后按时间倒序翻页，遇到已存储的线程即停止翻页，只抓新评论
+    - 已存储线程的回复数没变时直接复用已存回复，只对变化的线程重新拉取回复
+    - full_scan=True（或距上次全量扫描超过 FULL_SCAN_INTERVAL）时翻完全部线程页，
+      以发现旧线程上的新回复；线程页每页 100 条，成本远低于重新拉取全部回复
+    每页的回复就绪后即写入评论库，内存中只保留仍在等待回复的几页。
+    某条线程的回复重试后仍不完整时，记下的回复数置为 -1，下次同步时会重新拉取。
+    返回 {"pages": 抓取页数, "threads": 写入线程数, "complete": 是否翻完且回复完整}
+    """
+    store = get_comment_store()
+    state = store.get_state(video_id)
+    baseline = state is not None and state["last_full_scan"] is not None
+    if full_scan is None:
+        full_scan = not baseline or time.time() - state["last_full_scan"] > FULL_SCAN_INTERVAL
+    known_counts = store.get_reply_counts(video_id)
+
+    youtube = get_youtube_client(api_key)
+    workers = max(1, int(reply_workers or REPLY_FETCH_WORKERS))
+    # 尚未落盘的页：每页为一组线程，replies 可能是回复任务
+    pending_pages = deque()
+    written = 0
+    replies_complete = True
+
+    def flush(block):
+        nonlocal written, replies_complete
+        while pending_pages:
+            page = pending_pages[0]
+            if not block and any(
+                thread["replies"] is not None
+                and not isinstance(thread["replies"], list)
+                and not thread["replies"].done()
+                for thread in page
+            ):
+                return
+            pending_pages.popleft()
+            for thread in page:
+                if thread["replies"] is None:
+                    # 回复数未变化，沿用已存储的回复
+                    thread["replies"] = store.get_replies(video_id, thread["thread_id"])
+                elif not isinstance(thread["replies"], list):
+                    thread["replies"], ok = thread["replies"].result()
+                    if not ok:
+                        replies_complete = False
+                        thread["reply_count"] = -1
+            store.upsert_threads(video_id, page)
+            written += len(page)
+
+    complete = False
+    next_page_token = None
+    pages = 0
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        while True:
+            try:
+                request = youtube.commentThreads().list(
+                    part="snippet",
+                    videoId=video_id,
+                    maxResults=100,
+                    pageToken=next_page_token,
+                    textFormat="plainText",
+                    order="time"
+                )
+                response = execute_request(request)
+            except Exception as e:
+                print(f"获取评论页面失败（重试后仍失败，结果不完整）: {e}")
+                break
+            pages += 1
+
+            page = []
+            reached_known = False
             for item in response.get("items", []):
+                thread_id = item["id"]
                 top_comment = item["snippet"]["topLevelComment"]
                 top_comment_snippet = top_comment["snippet"]
-                comments.append({
-                    "text": top_comment_snippet["textDisplay"],
-                    "publishedAt": top_comment_snippet["publishedAt"],
-                    "likes": top_comment_snippet["likeCount"]
+                reply_count = item["snippet"].get("totalReplyCount", 0)
+                if thread_id in known_counts:
+                    reached_known = True
+                if reply_count == 0:
+                    replies = []
+                elif known_counts.get(thread_id) == reply_count:
+                    replies = None
+                else:
+                    replies = executor.submit(_get_all_replies, api_key, top_comment["id"], None)
+                page.append({
+                    "thread_id": thread_id,
+                    "top": {
+                        "text": top_comment_snippet["textDisplay"],
+                        "publishedAt": top_comment_snippet["publishedAt"],
+                        "likes": top_comment_snippet["likeCount"]
+                    },
+                    "reply_count": reply_count,
+                    "replies": replies
                 })
+            pending_pages.append(page)
+            flush(block=False)
 
-                # 如果有回复，则调用单独函数进行多次分页获取
-                total_replies = item["snippet"].get("totalReplyCount", 0)
-                if total_replies > 0:
-                    parent_id = top_comment["id"]
-                    all_replies = _get_all_replies(api_key, parent_id, None)
-                    comments.extend(all_replies)
-
-                # 如果指定了最大获取数且超出，则截断返回
-                if max_results and len(comments) >= max_results:
-                    comments = comments[:max_results]
-                    print(f"成功获取指定数量 {len(comments)} 条评论(含回复)")
-                    return comments
-
-            # 检查下一页
             next_page_token = response.get("nextPageToken")
             if not next_page_token:
+                complete = True
+                break
+            # 已翻到上次抓取过的线程：更早的线程都已存储，无需继续翻页
+            if reached_known and baseline and not full_scan:
+                complete = True
                 break
 
-        except Exception as e:
-            print(f"获取评论页面失败: {e}")
-            break
+        flush(block=True)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
-    print(f"成功获取 {len(comments)} 条评论(含回复)")
-    return comments
+    # 只有完整翻完全部线程页且回复完整才算一次成功的全量扫描；中途失败时下次重新全量扫描
+    complete = complete and replies_complete
+    store.finish_crawl(video_id, full_scan=full_scan and complete, complete=complete)
+    print(f"增量抓取 {pages} 页、写入 {written} 个线程" + ("" if complete else "（不完整）"))
+    return {"pages": pages, "threads": written, "complete": complete}
 
 def extract_video_id(url):
     """
@@ -116,18 +484,58 @@ def extract_video_id(url):
         return video_id_match.group(1)
     return None
 
+def extract_playlist_id(url):
+    """
+    从播放列表 URL 中提取播放列表ID（不含视频ID的纯播放列表链接）
+    """
+    if re.search(r'[?&]v=', url):
+        return None
+    playlist_match = re.search(r'[?&]list=([\w-]+)', url)
+    if playlist_match:
+        return playlist_match.group(1)
+    return None
+
+def resolve_video_ids(api_key, urls_text):
+    """
+    将输入解析为视频ID列表：支持换行/逗号/空格分隔的多个视频 URL，
+    以及播放列表 URL（展开为其中全部视频）。结果去重并保持输入顺序。
+    """
+    video_ids = []
+    for url in re.split(r'[\s,，]+', urls_text or ""):
+        if not url:
+            continue
+        playlist_id = extract_playlist_id(url)
+        if playlist_id:
+            video_ids.extend(get_playlist_video_ids(api_key, playlist_id))
+            continue
+        video_id = extract_video_id(url)
+        if video_id:
+            video_ids.append(video_id)
+    return list(dict.fromkeys(video_ids))
+
+def iter_comment_blocks(comments):
+    """
+    逐条产出评论的格式化文本块（用于按评论边界分段，或流式写出报告）
+    """
+    for idx, comment in enumerate(comments, 1):
+        # 合并过的重复评论注明条数，点赞数为组内之和
+        repeated = f"重复条数: {comment.count}\n" if comment.count > 1 else ""
+        yield (
+            f"评论 {idx}:\n{comment.text}\n"
+            f"发布时间: {comment.published_at}\n"
+            f"点赞数: {comment.likes}\n{repeated}\n"
+        )
+
+def format_comments_header(count, unique=None):
+    if unique is not None and unique < count:
+        return f"共获取到 {count} 条评论（合并重复后 {unique} 条）：\n\n"
+    return f"共获取到 {count} 条评论：\n\n"
+
 def format_comments(comments):
     """
-    格式化评论文本
+    格式化评论文本（一次拼接，线性时间）
     """
     if isinstance(comments, str):
         return comments
 
-    formatted_text = f"共获取到 {len(comments)} 条评论：\n\n"
-    for idx, comment in enumerate(comments, 1):
-        formatted_text += (
-            f"评论 {idx}:\n{comment['text']}\n"
-            f"发布时间: {comment['publishedAt']}\n"
-            f"点赞数: {comment['likes']}\n\n"
-        )
-    return formatted_text
\ No newline at end of file
+    return format_comments_header(len(comments)) + "".join(iter_comment_blocks(comments))
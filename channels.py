@@ -0,0 +1,96 @@
+from disk_cache import get_cache, make_key
+from youtube_client import get_youtube_client, execute_request
+
+# playlistItems().list 单页最多返回的条目数
+PLAYLIST_PAGE_SIZE = 50
+
+
+def get_uploads_playlist_id(api_key, channel):
+    """
+    解析频道的「上传的视频」播放列表 ID（channels().list，1 单位；结果长期缓存）。
+    channel 可以是频道 ID（UCxxxx）或 @handle；找不到频道时返回 None
+    """
+    channel = channel.strip()
+    cache = get_cache()
+    cache_key = make_key(channel)
+    playlist_id = cache.get("uploads_playlist", cache_key)
+    if playlist_id is not None:
+        return playlist_id
+
+    youtube = get_youtube_client(api_key)
+    if channel.startswith("@"):
+        request = youtube.channels().list(part="contentDetails", forHandle=channel)
+    else:
+        request = youtube.channels().list(part="contentDetails", id=channel)
+    items = execute_request(request).get("items", [])
+    if not items:
+        return None
+    playlist_id = items[0]["contentDetails"]["relatedPlaylists"]["uploads"]
+    cache.set("uploads_playlist", cache_key, playlist_id)
+    return playlist_id
+
+
+def iter_upload_pages(api_key, playlist_id, max_videos=None, published_after=None,
+                      published_before=None, since=None, backlog=None, result=None):
+    """
+    分页遍历上传播放列表（playlistItems().list，每页 50 个、1 单位），每取到一页就产出
+    该页中符合条件的 [(video_id, published_at)]，调用方可以边翻页边开始处理。
+
+    早于 published_after 或不晚于 since（上次运行记录的最新发布时间）的视频跳过；backlog=(after, before)
+    不为 None 时，since 之前发布时间在 (after, before) 内的视频（上次因数量上限未枚举到）照常产出，
+    只有不晚于 after 的才算早于截止时间。晚于 published_before 的视频跳过。
+    上传播放列表大致按发布时间从新到旧排列，但首映、定时发布或之后才公开的视频可能不在其发布时间
+    对应的位置，因此不在遇到第一个过早的视频时停止，而是一整页都早于截止时间才停止翻页。
+    时间均为 ISO 8601 字符串（如 "2024-01-31" 或 "2024-01-31T08:00:00Z"），按字符串比较。
+    max_videos 为产出视频总数上限，None 或 0 表示不限（翻到最后一页）。
+    result 为可选字典，结束时写入 limited：是否因达到 max_videos 而提前结束
+    """
+    if result is None:
+        result = {}
+    result["limited"] = False
+
+    def too_old(published_at):
+        if published_after and published_at < published_after:
+            return True
+        if since and published_at <= since:
+            return not backlog or published_at <= backlog[0]
+        return False
+
+    youtube = get_youtube_client(api_key)
+    produced = 0
+    next_page_token = None
+    while True:
+        response = execute_request(youtube.playlistItems().list(
+            part="contentDetails",
+            playlistId=playlist_id,
+            maxResults=PLAYLIST_PAGE_SIZE,
+            pageToken=next_page_token
+        ))
+        page = []
+        dated = 0
+        old = 0
+        for item in response.get("items", []):
+            details = item["contentDetails"]
+            # 私享/已删除的视频没有 videoPublishedAt
+            published_at = details.get("videoPublishedAt")
+            if not published_at:
+                continue
+            dated += 1
+            if too_old(published_at):
+                old += 1
+                continue
+            # 上次已枚举过的区间
+            if since and published_at <= since and published_at >= backlog[1]:
+                continue
+            if published_before and published_at[:len(published_before)] > published_before:
+                continue
+            page.append((details["videoId"], published_at))
+            if max_videos and produced + len(page) >= max_videos:
+                result["limited"] = True
+                break
+        if page:
+            produced += len(page)
+            yield page
+        next_page_token = response.get("nextPageToken")
+        if result["limited"] or (dated and old == dated) or not next_page_token:
+            return
@@ -1,14 +1,37 @@
-from openai import OpenAI
+import threading
+from collections import OrderedDict
+
+from llm import create_client, iter_stream_chat, UsageLedger
+from retrieval import build_retrieval_context
+from cache_utils import cached_get_transcript
+from chat_memory import fit_history, count_request_tokens, format_token_stats
+
+# 内存中最多保留的视频字幕数（对话期间每个视频只读取、解析一次）
+MAX_CACHED_TRANSCRIPTS = 16
 
 def chat_with_subtitles(
     user_message,
     history,
     subtitles_text,
     deepseek_api_key,
-    system_prompt
+    system_prompt,
+    video_id=None,
+    token_stats=None,
+    usage_ledger=None
 ):
     """
     与字幕进行对话的核心函数
+    以生成器方式流式返回对话历史，回答随生成逐步更新
+
+    字幕较长时不再每轮发送全文，而是检索与问题最相关的片段（带时间戳）；
+    video_id 用于取得该视频带时间轴的字幕片段（只在检索时读取，同一视频只读取一次）。
+    对话历史超出预算时，较早的对话滚动总结为摘要，只原样保留最近几轮；
+    若传入 token_stats 字典，会写入本次请求各部分的 token 数；
+    实际用量（含前缀缓存命中数）累计到 usage_ledger（可选）。
+
+    消息按「系统提示词 → 字幕全文 → 历史摘要 → 最近对话 → 当前问题」排列，
+    越稳定的内容越靠前，使多轮对话共享相同的请求前缀以命中 DeepSeek 前缀缓存；
+    检索模式下每轮不同的字幕片段放在最后一条用户消息中，不破坏前缀
     """
     if history is None:
         history = []
@@ -20,55 +43,121 @@ def chat_with_subtitles(
             "role": "assistant",
             "content": "请先在视频分析标签页分析视频以获取字幕内容"
         }
-        return history + [user_msg_dict, assistant_msg]
+        yield history + [user_msg_dict, assistant_msg]
+        return
 
     # 若对话提示词为空，就给个默认
     if not system_prompt:
         system_prompt = "你是一个专业的视频内容分析专家。你将基于视频字幕内容回答用户的问题。"
 
-    client = OpenAI(api_key=deepseek_api_key, base_url="https://api.deepseek.com")
+    client = create_client(deepseek_api_key)
 
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "system", "content": f"视频字幕内容如下：\n{subtitles_text}"}
-    ]
-    for msg in history:
-        messages.append({"role": msg["role"], "content": msg["content"]})
-    messages.append(user_msg_dict)
+    context = build_retrieval_context(
+        user_message,
+        subtitles_text,
+        transcript=lambda: _load_transcript(video_id),
+        video_id=video_id
+    )
+    if context is None:
+        subtitles_msg = f"视频字幕内容如下：\n{subtitles_text}"
+        question_msg = user_message
+    else:
+        subtitles_msg = ""
+        question_msg = (
+            f"以下是视频字幕中与当前问题最相关的片段（方括号内为时间戳）：\n{context}\n\n"
+            f"问题：{user_message}"
+        )
 
     try:
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=messages,
-            stream=False
-        ).choices[0].message.content
+        history_summary, recent = fit_history(client, history, ledger=usage_ledger)
 
-        assistant_msg = {"role": "assistant", "content": response}
-        return history + [user_msg_dict, assistant_msg]
+        messages = [{"role": "system", "content": system_prompt}]
+        if subtitles_msg:
+            messages.append({"role": "system", "content": subtitles_msg})
+        if history_summary:
+            messages.append({"role": "system", "content": f"较早的对话记录摘要：\n{history_summary}"})
+        messages.extend(recent)
+        messages.append({"role": "user", "content": question_msg})
+
+        if token_stats is not None:
+            token_stats.update(count_request_tokens(
+                system_prompt, subtitles_msg or context, history_summary, recent, user_message
+            ))
+
+        result = {}
+        for partial in iter_stream_chat(client, messages, result=result, ledger=usage_ledger):
+            assistant_msg = {"role": "assistant", "content": partial}
+            yield history + [user_msg_dict, assistant_msg]
+        if result.get("ttft") is not None:
+            print(f"字幕对话首字延迟 {result['ttft']:.2f}s，总耗时 {result['elapsed']:.2f}s")
 
     except Exception as e:
         assistant_msg = {
             "role": "assistant",
             "content": f"与DeepSeek API对话时出错: {str(e)}"
         }
-        return history + [user_msg_dict, assistant_msg]
+        yield history + [user_msg_dict, assistant_msg]
+
+_transcripts = OrderedDict()
+_transcripts_lock = threading.Lock()
+
+
+def _load_transcript(video_id):
+    """
+    读取视频带时间轴的字幕（分析时已缓存），按视频保留在内存中，后续轮次不再重复读取；
+    取不到时返回 None（不记住，下一轮再试）
+    """
+    if not video_id:
+        return None
+    with _transcripts_lock:
+        transcript = _transcripts.get(video_id)
+        if transcript is not None:
+            _transcripts.move_to_end(video_id)
+            return transcript
+    try:
+        transcript = cached_get_transcript(video_id)
+    except Exception as e:
+        print(f"读取字幕失败: {e}")
+        return None
+    if transcript is not None:
+        with _transcripts_lock:
+            _transcripts[video_id] = transcript
+            while len(_transcripts) > MAX_CACHED_TRANSCRIPTS:
+                _transcripts.popitem(last=False)
+    return transcript
 
 def user_input(
     user_message,
     history,
     subtitles_text,
     api_key,
-    system_prompt
+    system_prompt,
+    video_id=None,
+    usage_totals=None
 ):
     """
-    用于Chatbot前端事件触发
+    用于Chatbot前端事件触发，流式更新对话内容
+    返回 (对话历史, 本次请求 token 统计及本会话累计用量, 本会话累计用量字典)
     """
+    if usage_totals is None:
+        usage_totals = {}
+    ledger = UsageLedger(totals=usage_totals)
+
     if not user_message:
-        if history is None:
-            return []
-        return history
-    
-    updated_history = chat_with_subtitles(
-        user_message, history, subtitles_text, api_key, system_prompt
-    )
-    return updated_history
\ No newline at end of file
+        yield (history if history is not None else []), ledger.format("本会话 DeepSeek 用量"), usage_totals
+        return
+
+    token_stats = {}
+    for updated_history in chat_with_subtitles(
+        user_message,
+        history,
+        subtitles_text,
+        api_key,
+        system_prompt,
+        video_id,
+        token_stats,
+        ledger
+    ):
+        stats_md = format_token_stats(token_stats)
+        session_md = ledger.format("本会话 DeepSeek 用量")
+        yield updated_history, "\n\n".join(part for part in (stats_md, session_md) if part), usage_totals
\ No newline at end of file
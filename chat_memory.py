@@ -0,0 +1,124 @@
+from llm import cached_stream_chat
+from tokens import estimate_tokens
+
+# 原样保留的最近对话的 token 预算
+HISTORY_TOKEN_BUDGET = 6000
+# 较早的对话每攒满这么多条消息才滚动进摘要一次，使摘要在多轮之间保持不变
+ROLL_BLOCK_MESSAGES = 6
+# 单条消息最多保留的 token 数（超长的消息截断后再保留或总结）
+MAX_MESSAGE_TOKENS = HISTORY_TOKEN_BUDGET // 2
+TRUNCATED_MARK = "…（已截断）"
+
+SUMMARY_SYSTEM_PROMPT = "你负责维护一段对话的简要记录，供后续回答参考。"
+SUMMARY_INSTRUCTION = (
+    "已有的对话记录：\n{summary}\n\n"
+    "新增的对话：\n{turns}\n\n"
+    "请把新增对话合并进记录，保留用户关心的问题、已给出的关键结论和事实，输出更新后的记录，不超过 500 字。"
+)
+
+
+def _message_text(msg):
+    content = msg.get("content")
+    return content if isinstance(content, str) else ""
+
+
+def _truncate(text, max_tokens=MAX_MESSAGE_TOKENS):
+    """
+    超过 max_tokens 的文本只保留开头部分（二分查找满足预算的最大长度）
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) + estimate_tokens(TRUNCATED_MARK) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low] + TRUNCATED_MARK
+
+
+def _format_turns(messages):
+    names = {"user": "用户", "assistant": "助手"}
+    return "\n".join(
+        f"{names.get(msg['role'], msg['role'])}：{_message_text(msg)}" for msg in messages
+    )
+
+
+def _rolling_summary(client, messages, ledger=None):
+    """
+    按固定大小的块逐段滚动总结较早的对话；每一步都经过模型输出缓存，
+    之前已总结过的块直接命中缓存，只有新滚入的块需要调用模型
+    """
+    summary = "（无）"
+    for start in range(0, len(messages), ROLL_BLOCK_MESSAGES):
+        block = messages[start:start + ROLL_BLOCK_MESSAGES]
+        result = cached_stream_chat(
+            client,
+            [
+                {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                {
+                    "role": "user",
+                    "content": SUMMARY_INSTRUCTION.format(summary=summary, turns=_format_turns(block))
+                }
+            ],
+            ledger=ledger
+        )
+        summary = result["content"]
+    return summary
+
+
+def fit_history(client, history, budget=HISTORY_TOKEN_BUDGET, ledger=None):
+    """
+    在 token 预算内整理对话历史：
+    - 超过 MAX_MESSAGE_TOKENS 的单条消息先截断
+    - 从最近一条往前原样保留，直到用完 budget
+    - 更早的消息滚动总结为一段摘要；总结范围向上对齐到 ROLL_BLOCK_MESSAGES 的整数倍
+      （对齐后会把全部消息都总结掉时不对齐），原样保留的部分始终不超过 budget
+    返回 (摘要或None, 原样保留的消息列表)
+    """
+    messages = [
+        {"role": msg["role"], "content": _truncate(_message_text(msg), min(budget, MAX_MESSAGE_TOKENS))}
+        for msg in history
+        if msg.get("role") in ("user", "assistant")
+    ]
+    used = 0
+    keep_from = len(messages)
+    while keep_from > 0:
+        tokens = estimate_tokens(messages[keep_from - 1]["content"])
+        if used + tokens > budget:
+            break
+        used += tokens
+        keep_from -= 1
+
+    # 向上对齐到块边界：对齐多出来的几条也一并总结，保留的消息只会更少
+    roll_until = -(-keep_from // ROLL_BLOCK_MESSAGES) * ROLL_BLOCK_MESSAGES
+    if roll_until >= len(messages):
+        roll_until = keep_from
+    if roll_until == 0:
+        return None, messages
+    return _rolling_summary(client, messages[:roll_until], ledger), messages[roll_until:]
+
+
+def count_request_tokens(system_prompt, context, summary, recent, question):
+    """
+    统计一次请求中各部分的 token 数
+    """
+    stats = {
+        "系统提示词": estimate_tokens(system_prompt),
+        "字幕上下文": estimate_tokens(context),
+        "历史摘要": estimate_tokens(summary or ""),
+        "最近对话": sum(estimate_tokens(msg["content"]) for msg in recent),
+        "当前问题": estimate_tokens(question)
+    }
+    stats["合计"] = sum(stats.values())
+    return stats
+
+
+def format_token_stats(stats):
+    """
+    将 token 统计渲染为一行 Markdown
+    """
+    if not stats:
+        return ""
+    return "本次请求约 " + "，".join(f"{name} {count}" for name, count in stats.items()) + " tokens"
@@ -0,0 +1,199 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+from analysis import create_channel_job, run_batch_job
+from archive import get_archive, lookup_history, render_markdown
+from batch_runner import DEFAULT_MAX_PARALLEL_VIDEOS
+from concurrency import configure_limits
+from jobs import STATUS_LABELS, format_stages, get_job_manifest
+from quota import configure_quota
+from search import SEARCH_LIMIT, format_search_results, get_search_index, reindex_archive
+from store import load_prompts
+
+# 与 app.py 共用的 API Key 文件
+KEYS_FILE = "api_keys.json"
+
+COMMENTS_OPTIONS = ("不获取评论", "只获取前100条", "获取全部评论", "按预算抽样评论")
+
+
+def load_api_keys(args):
+    """
+    依次从命令行参数、环境变量（YOUTUBE_API_KEY / DEEPSEEK_API_KEY）、api_keys.json 读取 API Key
+    """
+    saved = {}
+    if os.path.exists(KEYS_FILE):
+        try:
+            with open(KEYS_FILE, "r") as f:
+                saved = json.load(f)
+        except Exception:
+            pass
+    youtube_key = args.youtube_key or os.environ.get("YOUTUBE_API_KEY") or saved.get("youtube", "")
+    deepseek_key = args.deepseek_key or os.environ.get("DEEPSEEK_API_KEY") or saved.get("deepseek", "")
+    if not youtube_key or not deepseek_key:
+        sys.exit("缺少 API Key：请通过 --youtube-key/--deepseek-key、环境变量或 api_keys.json 提供")
+    return youtube_key, deepseek_key
+
+
+def run_job(job_id, args, youtube_key, deepseek_key):
+    """
+    运行任务并逐行打印各视频的状态变化；Ctrl+C 中断后可用 resume 继续
+    """
+    def on_state(index, video_id, state):
+        print(f"[{index + 1}] {video_id} {state}", flush=True)
+
+    print(f"任务 {job_id}")
+    try:
+        last = None
+        for last in run_batch_job(
+            job_id,
+            youtube_key,
+            deepseek_key,
+            args.parallel,
+            on_state=on_state
+        ):
+            pass
+    except KeyboardInterrupt:
+        print(f"\n已中断。运行 python cli.py resume {job_id} 继续（已完成的视频与阶段会跳过）")
+        sys.exit(130)
+    if last is not None:
+        progress, info, result = last
+        print(progress if progress and not result else f"{info}\n{result}")
+
+
+def cmd_run(args):
+    youtube_key, deepseek_key = load_api_keys(args)
+    configure_limits(youtube=args.youtube_concurrency, llm=args.llm_concurrency)
+    configure_quota(args.daily_quota)
+    subtitle_prompt, comments_prompt, _ = load_prompts()
+
+    job_id = None
+    for progress, job_id in create_channel_job(
+        youtube_key,
+        args.channel,
+        args.max_videos,
+        subtitle_prompt,
+        comments_prompt,
+        args.comments_option,
+        args.refresh,
+        args.published_after,
+        args.published_before,
+        args.only_new,
+        not args.no_markdown
+    ):
+        if progress:
+            print(progress)
+    if job_id is None:
+        sys.exit(1)
+    run_job(job_id, args, youtube_key, deepseek_key)
+
+
+def cmd_resume(args):
+    if get_job_manifest().get_job(args.job_id) is None:
+        sys.exit(f"未找到任务 {args.job_id}")
+    youtube_key, deepseek_key = load_api_keys(args)
+    configure_limits(youtube=args.youtube_concurrency, llm=args.llm_concurrency)
+    configure_quota(args.daily_quota)
+    run_job(args.job_id, args, youtube_key, deepseek_key)
+
+
+def cmd_status(args):
+    manifest = get_job_manifest()
+    if not args.job_id:
+        jobs = manifest.list_jobs()
+        if not jobs:
+            print("暂无批量任务")
+        for job_id, source, status, created_at, total, done in jobs:
+            created = time.strftime("%Y-%m-%d %H:%M", time.localtime(created_at))
+            print(f"{job_id}  {created}  {source}  {status}  {done}/{total}")
+        return
+
+    job = manifest.get_job(args.job_id)
+    if job is None:
+        sys.exit(f"未找到任务 {args.job_id}")
+    comments_option = job["params"]["comments_option"]
+    print(f"任务 {job['job_id']}（{job['source']}，{comments_option}）：{job['status']}")
+    for i, video in enumerate(manifest.videos(args.job_id), 1):
+        line = f"{i}. {video['video_id']} {STATUS_LABELS.get(video['status'], video['status'])}  "
+        line += format_stages(video, comments_option)
+        if video["error"]:
+            line += f"  （{video['error']}）"
+        print(line)
+
+
+def cmd_history(args):
+    print(lookup_history(args.query))
+
+
+def cmd_show(args):
+    run = get_archive().get_run(args.run_id)
+    if run is None:
+        sys.exit(f"未找到记录 {args.run_id}")
+    print(render_markdown(run), end="")
+
+
+def cmd_search(args):
+    hits = get_search_index().search(" ".join(args.query), limit=args.limit)
+    print(format_search_results(hits))
+
+
+def cmd_reindex(args):
+    print(f"已重建全文索引：{reindex_archive()} 个视频")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="YouTube 内容分析器命令行：批量分析频道视频，支持中断后续跑")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_run_options(p):
+        p.add_argument("--youtube-key", help="YouTube API Key（默认读取环境变量或 api_keys.json）")
+        p.add_argument("--deepseek-key", help="DeepSeek API Key（默认读取环境变量或 api_keys.json）")
+        p.add_argument("--parallel", type=int, default=DEFAULT_MAX_PARALLEL_VIDEOS, help="同时分析的视频数")
+        p.add_argument("--youtube-concurrency", type=int, help="YouTube 并发请求数")
+        p.add_argument("--llm-concurrency", type=int, help="DeepSeek 并发调用数")
+        p.add_argument("--daily-quota", type=int, help="YouTube 每日配额（单位），默认 10000")
+
+    run = subparsers.add_parser("run", help="新建频道任务并运行（边翻页枚举上传列表边分析）")
+    run.add_argument("--channel", required=True, help="频道 ID（如 UCxxxxxxx）或 @handle")
+    run.add_argument("--max-videos", type=int, default=5, help="获取最近视频数量，0 表示全部")
+    run.add_argument("--published-after", help="只处理该日期及之后发布的视频（YYYY-MM-DD）")
+    run.add_argument("--published-before", help="只处理该日期及之前发布的视频（YYYY-MM-DD）")
+    run.add_argument("--only-new", action="store_true", help="只处理该频道上次运行之后发布的视频")
+    run.add_argument("--comments-option", choices=COMMENTS_OPTIONS, default="不获取评论", help="评论获取方式")
+    run.add_argument("--refresh", action="store_true", help="忽略缓存，重新生成摘要")
+    run.add_argument("--no-markdown", action="store_true", help="只存档，不在 analysis_results 下写出 MD 文件")
+    add_run_options(run)
+    run.set_defaults(func=cmd_run)
+
+    resume = subparsers.add_parser("resume", help="续跑任务，跳过已完成的视频与阶段")
+    resume.add_argument("job_id")
+    add_run_options(resume)
+    resume.set_defaults(func=cmd_resume)
+
+    status = subparsers.add_parser("status", help="列出最近的任务，或查看某个任务各视频的阶段")
+    status.add_argument("job_id", nargs="?")
+    status.set_defaults(func=cmd_status)
+
+    history = subparsers.add_parser("history", help="按视频链接/视频ID/频道ID查询以往的分析记录")
+    history.add_argument("query", nargs="?", default="")
+    history.set_defaults(func=cmd_history)
+
+    show = subparsers.add_parser("show", help="以 Markdown 输出一次以往的分析")
+    show.add_argument("run_id", type=int)
+    show.set_defaults(func=cmd_show)
+
+    search = subparsers.add_parser("search", help="在全部存档的字幕与总结中全文搜索")
+    search.add_argument("query", nargs="+")
+    search.add_argument("--limit", type=int, default=SEARCH_LIMIT, help="最多返回的命中数")
+    search.set_defaults(func=cmd_search)
+
+    reindex = subparsers.add_parser("reindex", help="用存档重建全文索引")
+    reindex.set_defaults(func=cmd_reindex)
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    args.func(args)
@@ -0,0 +1,310 @@
+import heapq
+import re
+from array import array
+
+import numpy as np
+
+# 点赞最高的评论列出的条数
+TOP_LIKED_COUNT = 10
+# 列表中每条评论最多显示的字符数
+TOP_LIKED_TEXT_CHARS = 80
+# 评论长度分布的分箱（字符数）
+LENGTH_BINS = (0, 20, 50, 100, 300)
+# 发布日期不超过这么多天时按天统计，否则按月统计
+DAILY_HISTOGRAM_MAX_DAYS = 31
+# 发布时间字符串攒够这么多条后批量解析为秒数
+TIME_PARSE_BATCH = 1024
+# 无法解析的发布时间（即 NumPy 的 NaT）
+NAT_SECONDS = np.iinfo(np.int64).min
+
+LANGUAGE_LABELS = ("中文", "日文", "韩文", "英文等拉丁字母", "其他（表情/符号等）")
+
+_KANA_RE = re.compile(r"[\u3040-\u30ff]")
+_HANGUL_RE = re.compile(r"[\uac00-\ud7af]")
+_HAN_RE = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff]")
+_LATIN_RE = re.compile(r"[A-Za-z\u00c0-\u024f]")
+
+
+def detect_language(text):
+    """
+    按文字类型粗略判断评论语言，返回 LANGUAGE_LABELS 的下标
+    """
+    if _KANA_RE.search(text):
+        return 1
+    if _HANGUL_RE.search(text):
+        return 2
+    if _HAN_RE.search(text):
+        return 0
+    if _LATIN_RE.search(text):
+        return 3
+    return 4
+
+
+def published_seconds(values):
+    """
+    把一批 ISO 8601 发布时间字符串向量化解析为 UTC 秒数（int64 数组），无法解析的为 NAT_SECONDS
+    """
+    # 去掉时区后缀 "Z"，NumPy 不再支持解析带时区的时间
+    values = [value[:19] for value in values]
+    try:
+        return np.array(values, dtype="datetime64[s]").astype(np.int64)
+    except ValueError:
+        return np.array([_parse_seconds(value) for value in values], dtype=np.int64)
+
+
+def _parse_seconds(value):
+    try:
+        return np.datetime64(value, "s").astype(np.int64)
+    except ValueError:
+        return NAT_SECONDS
+
+
+class TimeColumn:
+    """
+    逐条追加发布时间字符串，按批解析后以 UTC 秒数存入 array("q")（每条 8 字节），
+    不为每条评论保留一个字符串
+    """
+
+    def __init__(self):
+        self.seconds = array("q")
+        self._pending = []
+
+    def __len__(self):
+        return len(self.seconds) + len(self._pending)
+
+    def append(self, published_at):
+        self._pending.append(published_at)
+        if len(self._pending) >= TIME_PARSE_BATCH:
+            self._flush()
+
+    def _flush(self):
+        if self._pending:
+            self.seconds.frombytes(published_seconds(self._pending).tobytes())
+            self._pending = []
+
+    def to_numpy(self):
+        self._flush()
+        return np.frombuffer(self.seconds, dtype=np.int64)
+
+
+class CommentStatsCollector:
+    """
+    在评论流经时逐条记录紧凑的列数据（点赞、长度、是否回复、语言、发布时间），
+    结束后用 NumPy 向量化计算统计量。用法：
+
+        collector = CommentStatsCollector()
+        comments = collector.observe(comments)  # 透传评论
+        ...                                     # 后续步骤消费 comments
+        stats = collector.compute()
+    """
+
+    def __init__(self):
+        self.likes = array("q")
+        self.lengths = array("q")
+        self.replies = bytearray()
+        self.languages = bytearray()
+        self.published = TimeColumn()
+        self.reply_threads = set()
+        self._top = []
+        self._seen = 0
+
+    def observe(self, comments):
+        for comment in comments:
+            self.add(comment)
+            yield comment
+
+    def add(self, comment):
+        self.likes.append(comment.likes)
+        self.lengths.append(len(comment.text))
+        self.replies.append(1 if comment.is_reply else 0)
+        self.languages.append(detect_language(comment.text))
+        self.published.append(comment.published_at)
+        if comment.is_reply and comment.thread_id:
+            self.reply_threads.add(comment.thread_id)
+
+        self._seen += 1
+        entry = (comment.likes, -self._seen, comment.text[:TOP_LIKED_TEXT_CHARS])
+        if len(self._top) < TOP_LIKED_COUNT:
+            heapq.heappush(self._top, entry)
+        elif entry > self._top[0]:
+            heapq.heapreplace(self._top, entry)
+
+    def compute(self):
+        """
+        计算统计结果；没有评论时返回 None
+        """
+        total = len(self.likes)
+        if not total:
+            return None
+
+        likes = np.frombuffer(self.likes, dtype=np.int64)
+        lengths = np.frombuffer(self.lengths, dtype=np.int64)
+        replies = np.frombuffer(bytes(self.replies), dtype=np.uint8)
+        languages = np.frombuffer(bytes(self.languages), dtype=np.uint8)
+
+        reply_count = int(replies.sum())
+        top_level = total - reply_count
+        likes_sorted = np.sort(likes)[::-1]
+        like_sum = int(likes_sorted.sum())
+
+        def like_share(fraction):
+            n = max(1, int(np.ceil(total * fraction)))
+            return float(likes_sorted[:n].sum() / like_sum) if like_sum else 0.0
+
+        edges = list(LENGTH_BINS) + [max(int(lengths.max()), LENGTH_BINS[-1]) + 1]
+        length_counts = np.histogram(lengths, bins=edges)[0]
+
+        stats = {
+            "total": total,
+            "top_level": top_level,
+            "replies": reply_count,
+            "reply_ratio": reply_count / total,
+            "threads_with_replies": len(self.reply_threads),
+            "likes": {
+                "sum": like_sum,
+                "mean": float(likes.mean()),
+                "median": float(np.median(likes)),
+                "p90": float(np.percentile(likes, 90)),
+                "max": int(likes_sorted[0]),
+                "zero_share": float((likes == 0).mean()),
+                "top1_share": like_share(0.01),
+                "top10_share": like_share(0.1)
+            },
+            "length": {
+                "mean": float(lengths.mean()),
+                "median": float(np.median(lengths)),
+                "bins": [
+                    (_length_label(i), int(count)) for i, count in enumerate(length_counts)
+                ]
+            },
+            "languages": [
+                (LANGUAGE_LABELS[i], int(count))
+                for i, count in enumerate(np.bincount(languages, minlength=len(LANGUAGE_LABELS)))
+                if count
+            ],
+            "time": _time_stats(self.published.to_numpy()),
+            "top_liked": [
+                (likes_value, text) for likes_value, _, text in sorted(self._top, reverse=True)
+            ]
+        }
+        return stats
+
+
+def _length_label(index):
+    if index + 1 < len(LENGTH_BINS):
+        return f"{LENGTH_BINS[index]}-{LENGTH_BINS[index + 1] - 1} 字"
+    return f"{LENGTH_BINS[-1]} 字以上"
+
+
+def _time_stats(seconds):
+    """
+    发布时间分布（seconds 为 UTC 秒数数组）：按天（跨度较长时按月）的评论数，以及按小时（UTC）的评论数
+    """
+    times = seconds[seconds != NAT_SECONDS].astype("datetime64[s]")
+    if not len(times):
+        return None
+
+    days = times.astype("datetime64[D]")
+    first, last = days.min(), days.max()
+    unit = "D" if (last - first).astype(int) < DAILY_HISTOGRAM_MAX_DAYS else "M"
+    buckets, counts = np.unique(times.astype(f"datetime64[{unit}]"), return_counts=True)
+    hours = (times.astype("datetime64[h]") - days).astype(int)
+    return {
+        "first": str(times.min()),
+        "last": str(times.max()),
+        "unit": "日" if unit == "D" else "月",
+        "histogram": [(str(bucket), int(count)) for bucket, count in zip(buckets, counts)],
+        "hours": [int(count) for count in np.bincount(hours, minlength=24)]
+    }
+
+
+def _percent(value):
+    return f"{value:.1%}"
+
+
+def _peak_hours(hours, n=3):
+    order = sorted(range(24), key=lambda h: hours[h], reverse=True)
+    return "、".join(f"{h} 时（{hours[h]} 条）" for h in order[:n] if hours[h])
+
+
+def format_comment_stats(stats):
+    """
+    将统计结果渲染为 Markdown 报告章节
+    """
+    if not stats:
+        return ""
+    likes = stats["likes"]
+    length = stats["length"]
+    lines = [
+        "## 评论统计",
+        "",
+        f"- 评论总数：{stats['total']}（顶层评论 {stats['top_level']}，回复 {stats['replies']}，"
+        f"回复占比 {_percent(stats['reply_ratio'])}；有回复的线程 {stats['threads_with_replies']} 个）",
+        f"- 点赞：合计 {likes['sum']}，平均 {likes['mean']:.1f}，中位数 {likes['median']:g}，"
+        f"P90 {likes['p90']:g}，最高 {likes['max']}；零赞评论占 {_percent(likes['zero_share'])}；"
+        f"点赞最多的 1% / 10% 评论获得 {_percent(likes['top1_share'])} / {_percent(likes['top10_share'])} 的点赞",
+        f"- 长度：平均 {length['mean']:.0f} 字，中位数 {length['median']:g} 字",
+        "",
+        "| 长度 | 评论数 |",
+        "| --- | --- |"
+    ]
+    lines.extend(f"| {label} | {count} |" for label, count in length["bins"])
+    lines += ["", "| 语言 | 评论数 | 占比 |", "| --- | --- | --- |"]
+    lines.extend(
+        f"| {label} | {count} | {_percent(count / stats['total'])} |"
+        for label, count in stats["languages"]
+    )
+
+    time_stats = stats["time"]
+    if time_stats:
+        lines += [
+            "",
+            f"- 发布时间：{time_stats['first']} 至 {time_stats['last']}（UTC）",
+            f"- 评论最多的时段（UTC）：{_peak_hours(time_stats['hours'])}",
+            "",
+            f"| 日期（按{time_stats['unit']}） | 评论数 |",
+            "| --- | --- |"
+        ]
+        lines.extend(f"| {bucket} | {count} |" for bucket, count in time_stats["histogram"])
+
+    if stats["top_liked"]:
+        lines += ["", "点赞最高的评论：", ""]
+        lines.extend(
+            f"{i}. （{likes_value} 赞）{_one_line(text)}"
+            for i, (likes_value, text) in enumerate(stats["top_liked"], 1)
+        )
+    return "\n".join(lines) + "\n"
+
+
+def format_stats_for_prompt(stats):
+    """
+    供 DeepSeek 使用的精简统计块：数量、互动、时间与语言分布均为本地精确统计
+    """
+    if not stats:
+        return ""
+    likes = stats["likes"]
+    parts = [
+        "以下是对全部评论的本地精确统计，涉及数量、点赞、时间和语言分布时请直接引用，无需从评论正文估算：",
+        f"评论 {stats['total']} 条（顶层 {stats['top_level']}，回复 {stats['replies']}，回复占比 {_percent(stats['reply_ratio'])}）",
+        f"点赞合计 {likes['sum']}，平均 {likes['mean']:.1f}，中位数 {likes['median']:g}，最高 {likes['max']}，"
+        f"零赞占 {_percent(likes['zero_share'])}，前 10% 评论获得 {_percent(likes['top10_share'])} 的点赞",
+        f"平均长度 {stats['length']['mean']:.0f} 字",
+        "语言：" + "，".join(
+            f"{label} {_percent(count / stats['total'])}" for label, count in stats["languages"]
+        )
+    ]
+    time_stats = stats["time"]
+    if time_stats:
+        parts.append(
+            f"发布时间 {time_stats['first'][:10]} 至 {time_stats['last'][:10]}，"
+            f"高峰时段（UTC）{_peak_hours(time_stats['hours'])}"
+        )
+    if stats["top_liked"]:
+        parts.append("点赞最高的评论：" + "；".join(
+            f"（{likes_value} 赞）{_one_line(text)}" for likes_value, text in stats["top_liked"][:5]
+        ))
+    return "\n".join(parts)
+
+
+def _one_line(text):
+    return " ".join(text.split())
@@ -0,0 +1,214 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from disk_cache import CACHE_DIR
+
+COMMENT_STORE_FILE = os.path.join(CACHE_DIR, "comments.sqlite3")
+
+
+class Comment:
+    """
+    单条评论的紧凑表示（__slots__，不带实例字典），用于在内存中处理大量评论。
+    count 为合并重复评论后代表的条数（见 dedup.find_duplicates），此时 likes 为组内点赞数之和
+    """
+
+    __slots__ = ("text", "published_at", "likes", "thread_id", "is_reply", "count")
+
+    def __init__(self, text, published_at, likes, thread_id=None, is_reply=False, count=1):
+        self.text = text
+        self.published_at = published_at
+        self.likes = likes
+        self.thread_id = thread_id
+        self.is_reply = is_reply
+        self.count = count
+
+    @classmethod
+    def from_dict(cls, data, thread_id=None, is_reply=None):
+        return cls(
+            data["text"],
+            data["publishedAt"],
+            data["likes"],
+            data.get("threadId", thread_id),
+            data.get("isReply", bool(is_reply))
+        )
+
+    def to_dict(self):
+        return {
+            "text": self.text,
+            "publishedAt": self.published_at,
+            "likes": self.likes,
+            "threadId": self.thread_id,
+            "isReply": self.is_reply
+        }
+
+
+class CommentStore:
+    """
+    按视频持久化已抓取的评论线程（顶层评论 + 全部回复），用于增量刷新：
+    - threads 表：每个评论线程一行，记录回复数以便判断是否需要重新拉取回复
+    - videos 表：记录该视频是否完整抓取过、最新评论时间（高水位）和上次全量扫描时间
+    """
+
+    def __init__(self, path=COMMENT_STORE_FILE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # 每页提交一次；WAL 下 NORMAL 同步足以保证一致性，避免每页都 fsync
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS threads (
+                video_id TEXT NOT NULL,
+                thread_id TEXT NOT NULL,
+                text TEXT NOT NULL,
+                published_at TEXT NOT NULL,
+                likes INTEGER NOT NULL,
+                reply_count INTEGER NOT NULL,
+                replies TEXT NOT NULL,
+                PRIMARY KEY (video_id, thread_id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_threads_published
+                ON threads (video_id, published_at);
+            CREATE TABLE IF NOT EXISTS videos (
+                video_id TEXT PRIMARY KEY,
+                newest_published_at TEXT,
+                last_full_scan REAL,
+                updated_at REAL NOT NULL
+            );
+            """
+        )
+        self._conn.commit()
+
+    def get_state(self, video_id):
+        """
+        返回 {"newest_published_at", "last_full_scan", "updated_at"}；从未抓取过时返回 None。
+        last_full_scan 为空表示还没有成功完成过一次全量扫描，此时已存数据不能作为增量的基准
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT newest_published_at, last_full_scan, updated_at FROM videos WHERE video_id = ?",
+                (video_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"newest_published_at": row[0], "last_full_scan": row[1], "updated_at": row[2]}
+
+    def get_reply_counts(self, video_id):
+        """
+        返回 {thread_id: 已存储的回复数}
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT thread_id, reply_count FROM threads WHERE video_id = ?", (video_id,)
+            ).fetchall()
+        return dict(rows)
+
+    def get_replies(self, video_id, thread_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT replies FROM threads WHERE video_id = ? AND thread_id = ?",
+                (video_id, thread_id)
+            ).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def upsert_threads(self, video_id, threads):
+        """
+        写入一批抓取到的线程：threads 为 [{"thread_id", "top", "reply_count", "replies"}]，
+        已存在的线程会被更新（点赞数、回复等可能变化）。抓取时每页调用一次，数据随翻页落盘
+        """
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO threads "
+                "(video_id, thread_id, text, published_at, likes, reply_count, replies) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        video_id,
+                        thread["thread_id"],
+                        thread["top"]["text"],
+                        thread["top"]["publishedAt"],
+                        thread["top"]["likes"],
+                        thread["reply_count"],
+                        json.dumps(thread["replies"], ensure_ascii=False)
+                    )
+                    for thread in threads
+                ]
+            )
+            self._conn.commit()
+
+    def finish_crawl(self, video_id, full_scan=False, complete=True):
+        """
+        一次抓取结束后更新高水位；full_scan=True 表示本次完整扫描了全部线程页，会记录扫描时间。
+        complete=False 表示本次抓取中途失败，已存数据中间可能有缺口：清除全量扫描时间，
+        下次同步时重新翻完全部线程页（回复数未变的线程直接复用已存回复）
+        """
+        now = time.time()
+        with self._lock:
+            newest = self._conn.execute(
+                "SELECT MAX(published_at) FROM threads WHERE video_id = ?", (video_id,)
+            ).fetchone()[0]
+            old = self._conn.execute(
+                "SELECT last_full_scan FROM videos WHERE video_id = ?", (video_id,)
+            ).fetchone()
+            if not complete:
+                last_full_scan = None
+            else:
+                last_full_scan = now if full_scan else (old[0] if old else None)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO videos (video_id, newest_published_at, last_full_scan, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                (video_id, newest, last_full_scan, now)
+            )
+            self._conn.commit()
+
+    def count_comments(self, video_id):
+        """
+        返回已存储的评论总数（顶层评论 + 回复）
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(json_array_length(replies)), 0) "
+                "FROM threads WHERE video_id = ?",
+                (video_id,)
+            ).fetchone()
+        return row[0] + row[1]
+
+    def iter_comments(self, video_id):
+        """
+        按时间从新到旧逐个产出 Comment（每条顶层评论后紧跟其回复），与直接抓取时的顺序一致。
+        使用独立的只读连接逐行读取，不会一次性把全部评论载入内存
+        """
+        conn = sqlite3.connect(self.path)
+        try:
+            cursor = conn.execute(
+                "SELECT thread_id, text, published_at, likes, replies FROM threads "
+                "WHERE video_id = ? ORDER BY published_at DESC, thread_id",
+                (video_id,)
+            )
+            for thread_id, text, published_at, likes, replies in cursor:
+                yield Comment(text, published_at, likes, thread_id, False)
+                for reply in json.loads(replies):
+                    yield Comment.from_dict(reply, thread_id, True)
+        finally:
+            conn.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_comment_store():
+    """
+    获取全局共享的评论存储（首次调用时创建）
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = CommentStore()
+    return _store
@@ -0,0 +1,54 @@
+import threading
+from contextlib import contextmanager
+
+# 默认并发上限：同时进行的 YouTube 请求数 / DeepSeek 调用数
+DEFAULT_LIMITS = {
+    "youtube": 8,
+    "llm": 4,
+}
+
+_limits = dict(DEFAULT_LIMITS)
+_semaphores = {name: threading.BoundedSemaphore(limit) for name, limit in _limits.items()}
+_lock = threading.Lock()
+
+
+def configure_limits(youtube=None, llm=None):
+    """
+    调整全局并发上限；已占用旧信号量的调用结束后自然释放，不受影响
+    """
+    with _lock:
+        for name, limit in (("youtube", youtube), ("llm", llm)):
+            if limit is None:
+                continue
+            limit = max(1, int(limit))
+            if limit != _limits[name]:
+                _limits[name] = limit
+                _semaphores[name] = threading.BoundedSemaphore(limit)
+
+
+def get_limits():
+    return dict(_limits)
+
+
+@contextmanager
+def _slot(name):
+    semaphore = _semaphores[name]
+    semaphore.acquire()
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+def youtube_slot():
+    """
+    占用一个 YouTube 请求名额（用于 with 语句）
+    """
+    return _slot("youtube")
+
+
+def llm_slot():
+    """
+    占用一个 DeepSeek 调用名额（用于 with 语句）
+    """
+    return _slot("llm")
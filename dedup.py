@@ -0,0 +1,176 @@
+import hashlib
+import re
+import unicodedata
+import zlib
+from array import array
+
+import numpy as np
+
+from text_utils import tokenize
+
+# MinHash 签名的哈希函数个数与 LSH 每带的行数：8 带 × 每带 4 行，
+# 相似度 0.8 的两条评论至少在一带完全相同而成为候选的概率约 98%
+SIGNATURE_BINS = 32
+BAND_ROWS = 4
+# 估计的 Jaccard 相似度达到该值才视为近似重复
+NEAR_DUPLICATE_THRESHOLD = 0.8
+# 分词后少于这么多项的短评论只做精确去重，避免把意思不同的短句误合并
+MIN_SHINGLES = 3
+# 最多跟踪这么多组（精确去重的文本摘要 + 近似去重的签名与分桶），之后出现的新评论只与已跟踪的组比较、
+# 自身不再加入跟踪，内存占用有上限
+MAX_TRACKED_GROUPS = 50000
+
+# MinHash 的 SIGNATURE_BINS 个哈希函数：h_i(x) = (a_i * crc32(x) + b_i) mod p，参数用固定种子生成，
+# 同一段文本在任何进程中得到相同的签名（不受 Python hash() 随机化影响），去重结果可复现
+_PRIME = (1 << 31) - 1
+_rng = np.random.RandomState(20240101)
+_HASH_A = _rng.randint(1, _PRIME, SIGNATURE_BINS).astype(np.uint64)
+_HASH_B = _rng.randint(0, _PRIME, SIGNATURE_BINS).astype(np.uint64)
+del _rng
+
+_PUNCT_RE = re.compile(r"[\s!-/:-@\[-`{-~\u2000-\u206f\u3000-\u303f\uff01-\uff0f\uff1a-\uff20]+")
+_REPEAT_RE = re.compile(r"(\D)\1{2,}")
+
+
+def normalize(text):
+    """
+    归一化评论文本用于精确去重：全半角统一、转小写、标点和连续空白统一为一个空格，
+    连续重复 3 次以上的非数字字符（哈哈哈哈、😂😂😂）压缩为 2 个
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    stripped = _PUNCT_RE.sub(" ", text).strip()
+    # 纯标点评论（如 "!!!"）保留原样，不与空串合并
+    return _REPEAT_RE.sub(r"\1\1", stripped or text.strip())
+
+
+def minhash(shingles):
+    """
+    计算一组分词的 MinHash 签名：每个哈希函数取所有分词哈希值的最小值，
+    返回 SIGNATURE_BINS 个 uint32 拼成的 bytes（紧凑、可直接切片作为分桶键）
+    """
+    base = np.fromiter(
+        [zlib.crc32(s.encode("utf-8")) for s in set(shingles)], dtype=np.uint64
+    )
+    values = (base[:, None] * _HASH_A + _HASH_B) % _PRIME
+    return values.min(axis=0).astype(np.uint32).tobytes()
+
+
+def estimate_similarity(a, b):
+    """
+    由两个签名估计 Jaccard 相似度：取值相同的哈希函数所占比例
+    """
+    return float(np.count_nonzero(np.frombuffer(a, np.uint32) == np.frombuffer(b, np.uint32))) / SIGNATURE_BINS
+
+
+def _bands(signature):
+    """
+    LSH 分带：每带 BAND_ROWS 个哈希值，带序号与取值一起作为分桶键
+    """
+    width = BAND_ROWS * 4
+    for band, start in enumerate(range(0, len(signature), width)):
+        yield bytes((band,)) + signature[start:start + width]
+
+
+def _text_key(normalized):
+    """
+    归一化文本的 8 字节摘要，用于精确去重（不保留评论原文）
+    """
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest()
+
+
+class DuplicatePlan:
+    """
+    第一遍扫描评论得到的去重结果，只含紧凑的列数据：
+    - representative：每条评论一个字节，1 表示它是所在组的代表（组内最先出现的一条）
+    - counts / likes：按组（即代表出现的顺序）记录组内条数与点赞数之和
+    """
+
+    __slots__ = ("representative", "counts", "likes")
+
+    def __init__(self):
+        self.representative = bytearray()
+        self.counts = array("q")
+        self.likes = array("q")
+
+    @property
+    def groups(self):
+        return len(self.counts)
+
+
+def find_duplicates(comments, threshold=NEAR_DUPLICATE_THRESHOLD, max_groups=MAX_TRACKED_GROUPS):
+    """
+    第一遍：逐条扫描评论，找出完全相同（归一化后）和近似重复的评论，返回 DuplicatePlan。
+    只保存文本摘要、签名与分桶，不保存评论本身；跟踪的组数不超过 max_groups
+    （精确去重的文本摘要另含近似重复评论的摘要，至多 2 * max_groups 条）。
+
+    近似重复通过 MinHash 签名的 LSH 分桶查找候选，每条评论只与同桶的代表比较
+    （每带最多一个），耗时随评论数线性增长
+    """
+    plan = DuplicatePlan()
+    exact = {}
+    buckets = {}
+    signatures = []
+
+    for comment in comments:
+        normalized = normalize(comment.text)
+        key = _text_key(normalized)
+        group = exact.get(key)
+
+        signature = None
+        if group is None:
+            shingles = tokenize(normalized)
+            if len(shingles) >= MIN_SHINGLES:
+                signature = minhash(shingles)
+                for band in _bands(signature):
+                    candidate = buckets.get(band)
+                    if candidate is not None and estimate_similarity(
+                        signature, signatures[candidate]
+                    ) >= threshold:
+                        group = candidate
+                        break
+            if group is not None and len(exact) < max_groups * 2:
+                exact[key] = group
+
+        if group is not None:
+            plan.representative.append(0)
+            plan.counts[group] += comment.count
+            plan.likes[group] += comment.likes
+            continue
+
+        group = plan.groups
+        plan.representative.append(1)
+        plan.counts.append(comment.count)
+        plan.likes.append(comment.likes)
+        if len(signatures) < max_groups:
+            exact[key] = group
+            signatures.append(signature)
+            if signature is not None:
+                for band in _bands(signature):
+                    buckets.setdefault(band, group)
+
+    return plan
+
+
+def iter_representatives(comments, plan):
+    """
+    第二遍：再次按相同顺序遍历评论，只产出各组代表，其 count 为组内条数、likes 为组内点赞数之和
+    """
+    group = 0
+    for index, comment in enumerate(comments):
+        if index < len(plan.representative) and not plan.representative[index]:
+            continue
+        if group < plan.groups:
+            comment.count = plan.counts[group]
+            comment.likes = plan.likes[group]
+        group += 1
+        yield comment
+
+
+def collapse_duplicates(comments, threshold=NEAR_DUPLICATE_THRESHOLD):
+    """
+    合并完全相同（归一化后）和近似重复的评论：每组保留最先出现的一条作为代表，
+    其 count 记录组内条数，likes 为组内点赞数之和。返回代表评论的列表，顺序与首次出现一致。
+    comments 需可重复迭代（列表，或每次迭代重新读取的评论来源）；
+    评论很多时应直接使用 find_duplicates + iter_representatives，逐条处理代表而不生成列表
+    """
+    return list(iter_representatives(comments, find_duplicates(comments, threshold)))
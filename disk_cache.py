@@ -0,0 +1,245 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# 取得当前脚本所在文件夹的绝对路径
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(BASE_DIR, "cache")
+CACHE_FILE = os.path.join(CACHE_DIR, "cache.sqlite3")
+
+# 各类数据的缓存有效期（秒），None 表示永不过期
+DEFAULT_TTLS = {
+    "video_info": 6 * 3600,
+    "comments": 3600,
+    "transcript": 30 * 24 * 3600,
+    # 频道的上传播放列表 ID 不会变化
+    "uploads_playlist": None,
+}
+
+# 缓存总大小上限，超出后按最近最少使用(LRU)淘汰
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# 超过该大小的数据压缩后再存储
+COMPRESS_THRESHOLD = 4096
+
+_FLAG_COMPRESSED = 1
+_FLAG_RAW_BYTES = 2
+
+# 统计展示用的数据类型名称
+KIND_LABELS = {
+    "video_info": "视频信息",
+    "transcript": "字幕",
+    "comments": "评论",
+    "uploads_playlist": "上传列表",
+    "llm": "摘要"
+}
+
+
+class DiskCache:
+    """
+    基于 SQLite 的持久化缓存：
+    - 以 (kind, key) 为主键，kind 区分数据类型并决定默认有效期
+    - 总大小超过 max_bytes 时按最近访问时间淘汰
+    - 较大的数据用 zlib 压缩
+    - 按 kind 统计命中/未命中次数
+    """
+
+    def __init__(self, path=CACHE_FILE, max_bytes=DEFAULT_MAX_BYTES, ttls=None):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value BLOB NOT NULL,
+                flags INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (kind, key)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (accessed_at)"
+        )
+        self._conn.commit()
+        row = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+        self._total_bytes = row[0]
+        self._hits = {}
+        self._misses = {}
+
+    @staticmethod
+    def _encode(value):
+        flags = 0
+        if isinstance(value, bytes):
+            data = value
+            flags |= _FLAG_RAW_BYTES
+        else:
+            data = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        if len(data) > COMPRESS_THRESHOLD:
+            data = zlib.compress(data, 6)
+            flags |= _FLAG_COMPRESSED
+        return data, flags
+
+    @staticmethod
+    def _decode(data, flags):
+        if flags & _FLAG_COMPRESSED:
+            data = zlib.decompress(data)
+        if flags & _FLAG_RAW_BYTES:
+            return bytes(data)
+        return json.loads(data.decode("utf-8"))
+
+    def get(self, kind, key):
+        """
+        读取缓存，不存在或已过期时返回 None
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, flags, size, expires_at FROM entries WHERE kind = ? AND key = ?",
+                (kind, key)
+            ).fetchone()
+            if row is None:
+                self._misses[kind] = self._misses.get(kind, 0) + 1
+                return None
+            value, flags, size, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self._conn.execute(
+                    "DELETE FROM entries WHERE kind = ? AND key = ?", (kind, key)
+                )
+                self._conn.commit()
+                self._total_bytes -= size
+                self._misses[kind] = self._misses.get(kind, 0) + 1
+                return None
+            self._conn.execute(
+                "UPDATE entries SET accessed_at = ? WHERE kind = ? AND key = ?",
+                (now, kind, key)
+            )
+            self._conn.commit()
+            self._hits[kind] = self._hits.get(kind, 0) + 1
+        return self._decode(value, flags)
+
+    def set(self, kind, key, value, ttl=None):
+        """
+        写入缓存；ttl 为空时使用该 kind 的默认有效期
+        """
+        data, flags = self._encode(value)
+        if ttl is None:
+            ttl = self.ttls.get(kind)
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT size FROM entries WHERE kind = ? AND key = ?", (kind, key)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries "
+                "(kind, key, value, flags, size, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (kind, key, sqlite3.Binary(data), flags, len(data), expires_at, now)
+            )
+            self._total_bytes += len(data) - (old[0] if old else 0)
+            self._evict_locked(now)
+            self._conn.commit()
+
+    def delete(self, kind, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size FROM entries WHERE kind = ? AND key = ?", (kind, key)
+            ).fetchone()
+            if row is None:
+                return
+            self._conn.execute("DELETE FROM entries WHERE kind = ? AND key = ?", (kind, key))
+            self._conn.commit()
+            self._total_bytes -= row[0]
+
+    def _evict_locked(self, now):
+        if self._total_bytes <= self.max_bytes:
+            return
+        # 先清掉已过期的条目
+        self._conn.execute(
+            "DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+        )
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()[0]
+        # 仍超出则按最近访问时间淘汰，腾出 10% 余量，避免每次写入都触发淘汰
+        target = int(self.max_bytes * 0.9)
+        if self._total_bytes <= self.max_bytes:
+            return
+        cursor = self._conn.execute(
+            "SELECT kind, key, size FROM entries ORDER BY accessed_at ASC"
+        )
+        victims = []
+        for kind, key, size in cursor:
+            if self._total_bytes <= target:
+                break
+            victims.append((kind, key))
+            self._total_bytes -= size
+        self._conn.executemany("DELETE FROM entries WHERE kind = ? AND key = ?", victims)
+
+    def stats(self):
+        """
+        返回各 kind 的命中/未命中次数以及当前缓存大小
+        """
+        with self._lock:
+            kinds = set(self._hits) | set(self._misses)
+            return {
+                "total_bytes": self._total_bytes,
+                "kinds": {
+                    kind: {
+                        "hits": self._hits.get(kind, 0),
+                        "misses": self._misses.get(kind, 0)
+                    }
+                    for kind in sorted(kinds)
+                }
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    获取全局共享的缓存实例（首次调用时创建）
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = DiskCache()
+    return _cache
+
+
+def format_cache_stats():
+    """
+    将本进程磁盘缓存各类数据的命中情况与缓存大小渲染为一行 Markdown；尚无读取时返回空字符串
+    """
+    stats = get_cache().stats()
+    parts = []
+    for kind, counts in stats["kinds"].items():
+        total = counts["hits"] + counts["misses"]
+        if total:
+            parts.append(f"{KIND_LABELS.get(kind, kind)} {counts['hits']}/{total}")
+    if not parts:
+        return ""
+    return f"磁盘缓存命中：{'，'.join(parts)}（缓存大小 {stats['total_bytes'] / 1e6:.1f}MB）"
+
+
+def make_key(*parts):
+    """
+    将多个参数拼成缓存键
+    """
+    return json.dumps(parts, ensure_ascii=False, separators=(",", ":"))
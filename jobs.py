@@ -0,0 +1,391 @@
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+import zlib
+
+from disk_cache import CACHE_DIR
+
+JOB_FILE = os.path.join(CACHE_DIR, "jobs.sqlite3")
+
+# 单个视频的处理阶段（按先后顺序）及其显示名称
+STAGES = ("metadata", "transcript", "comments", "subtitle_summary", "comments_summary", "file")
+STAGE_LABELS = {
+    "metadata": "视频信息",
+    "transcript": "字幕",
+    "comments": "评论",
+    "subtitle_summary": "字幕摘要",
+    "comments_summary": "评论摘要",
+    "file": "保存结果"
+}
+# 不获取评论时不需要的阶段
+COMMENT_STAGES = ("comments", "comments_summary")
+
+# 视频状态：pending 未开始，running 进行中（进程退出时可能停留在该状态），
+# done 全部阶段完成，partial 已写出报告但有阶段失败，failed 失败，deferred 因配额不足推迟
+STATUS_LABELS = {
+    "pending": "等待中",
+    "running": "进行中",
+    "done": "已完成",
+    "partial": "部分完成",
+    "failed": "失败",
+    "deferred": "已推迟"
+}
+
+
+def required_stages(comments_option):
+    """
+    该评论获取方式下一个视频需要完成的阶段
+    """
+    if comments_option == "不获取评论":
+        return tuple(stage for stage in STAGES if stage not in COMMENT_STAGES)
+    return STAGES
+
+
+def _new_job_id():
+    return time.strftime("%Y%m%d-%H%M%S") + "-" + secrets.token_hex(2)
+
+
+class JobManifest:
+    """
+    批量任务清单：持久化每个任务的参数、视频列表，以及每个视频各阶段的完成情况，
+    进程退出或浏览器关闭后可以据此续跑，跳过已完成的视频与阶段
+    - jobs 表：每个任务一行（来源、参数 JSON、状态）
+    - job_videos 表：每个任务的每个视频一行（顺序、状态、已完成阶段 JSON、错误、MD 路径）
+    - stage_outputs 表：各阶段的产出（视频信息、评论、摘要等，JSON 经 zlib 压缩），
+      续跑时直接沿用，不依赖有有效期的缓存（评论 1 小时、视频信息 6 小时）
+    - channel_cursors 表：每个频道已枚举到的最新视频发布时间，用于「只处理上次运行之后的新视频」
+    - channel_backlogs 表：某次枚举因数量上限提前结束时，游标之前仍未枚举的发布时间区间
+      (after, before)，之后的运行先补上这一段
+    """
+
+    def __init__(self, path=JOB_FILE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                params TEXT NOT NULL,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS job_videos (
+                job_id TEXT NOT NULL,
+                video_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                stages TEXT NOT NULL,
+                error TEXT,
+                md_path TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (job_id, video_id)
+            );
+            CREATE TABLE IF NOT EXISTS stage_outputs (
+                job_id TEXT NOT NULL,
+                video_id TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (job_id, video_id, stage)
+            );
+            CREATE TABLE IF NOT EXISTS channel_cursors (
+                channel_id TEXT PRIMARY KEY,
+                newest_published_at TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS channel_backlogs (
+                channel_id TEXT PRIMARY KEY,
+                after_published_at TEXT NOT NULL,
+                before_published_at TEXT NOT NULL
+            );
+            """
+        )
+        self._conn.commit()
+
+    def create_job(self, source, params, video_ids=()):
+        """
+        新建任务并记录其视频列表（可为空，之后用 add_videos 追加），返回任务 ID
+        """
+        job_id = _new_job_id()
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, source, params, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'running', ?, ?)",
+                (job_id, source, json.dumps(params, ensure_ascii=False), now, now)
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO job_videos "
+                "(job_id, video_id, position, status, stages, updated_at) "
+                "VALUES (?, ?, ?, 'pending', '{}', ?)",
+                [(job_id, video_id, i, now) for i, video_id in enumerate(video_ids)]
+            )
+            self._conn.commit()
+        return job_id
+
+    def add_videos(self, job_id, video_ids):
+        """
+        向任务末尾追加视频（已在任务中的跳过），返回实际新增的视频 ID 列表
+        """
+        now = time.time()
+        added = []
+        with self._lock:
+            position = self._conn.execute(
+                "SELECT COALESCE(MAX(position) + 1, 0) FROM job_videos WHERE job_id = ?",
+                (job_id,)
+            ).fetchone()[0]
+            for video_id in video_ids:
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO job_videos "
+                    "(job_id, video_id, position, status, stages, updated_at) "
+                    "VALUES (?, ?, ?, 'pending', '{}', ?)",
+                    (job_id, video_id, position, now)
+                )
+                if cursor.rowcount:
+                    added.append(video_id)
+                    position += 1
+            self._conn.commit()
+        return added
+
+    def update_params(self, job_id, **changes):
+        """
+        更新任务参数中的若干项（如频道视频是否已枚举完）
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT params FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            params = json.loads(row[0])
+            params.update(changes)
+            self._conn.execute(
+                "UPDATE jobs SET params = ?, updated_at = ? WHERE job_id = ?",
+                (json.dumps(params, ensure_ascii=False), time.time(), job_id)
+            )
+            self._conn.commit()
+
+    def get_channel_cursor(self, channel_id):
+        """
+        返回 (newest, backlog)：newest 为该频道已枚举到的最新视频发布时间（没有记录时为 None），
+        不晚于 newest 的视频都已枚举过，但 backlog=(after, before) 不为 None 时，
+        发布时间在开区间 (after, before) 内的视频尚未枚举（after 为 "" 表示没有下限）
+        """
+        with self._lock:
+            return self._channel_cursor(channel_id)
+
+    def _channel_cursor(self, channel_id):
+        row = self._conn.execute(
+            "SELECT newest_published_at FROM channel_cursors WHERE channel_id = ?",
+            (channel_id,)
+        ).fetchone()
+        backlog = self._conn.execute(
+            "SELECT after_published_at, before_published_at FROM channel_backlogs WHERE channel_id = ?",
+            (channel_id,)
+        ).fetchone()
+        return (row[0] if row else None), (tuple(backlog) if backlog else None)
+
+    def record_channel_enumeration(self, channel_id, newest, lower=None):
+        """
+        一次从列表顶部开始的枚举正常结束后更新频道游标：newest 为本次枚举到的最新发布时间，
+        lower 为本次覆盖范围的下限（因数量上限提前结束时为已处理的最旧发布时间，按 published_after
+        截止时为该日期），None 表示已翻到游标处或列表末尾。
+        游标只前进不后退；lower 之前尚未枚举的部分记为 backlog（与原有 backlog 合并为一段，
+        合并时可能包含少量已枚举过的视频，宁可重复也不遗漏）
+        """
+        with self._lock:
+            cursor, backlog = self._channel_cursor(channel_id)
+            if not (cursor or newest or lower):
+                # 频道没有任何带发布时间的视频
+                return
+            floor = backlog[0] if backlog else cursor
+            if cursor is None:
+                backlog = ("", lower) if lower else None
+            elif lower is None or lower <= floor:
+                backlog = None
+            elif backlog and lower < backlog[1]:
+                backlog = (backlog[0], lower)
+            elif lower > cursor:
+                backlog = (floor, lower)
+            # 其余情况：本次在已枚举过的区间内截止，原有 backlog 不变
+            newest = max(value for value in (cursor, newest, lower) if value)
+            self._conn.execute(
+                "INSERT INTO channel_cursors (channel_id, newest_published_at, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (channel_id) DO UPDATE SET "
+                "newest_published_at = excluded.newest_published_at, updated_at = excluded.updated_at",
+                (channel_id, newest, time.time())
+            )
+            if backlog:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO channel_backlogs (channel_id, after_published_at, before_published_at) "
+                    "VALUES (?, ?, ?)",
+                    (channel_id, *backlog)
+                )
+            else:
+                self._conn.execute("DELETE FROM channel_backlogs WHERE channel_id = ?", (channel_id,))
+            self._conn.commit()
+
+    def get_job(self, job_id):
+        """
+        返回任务信息字典；不存在时返回 None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, source, params, status, created_at, updated_at FROM jobs WHERE job_id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row[0],
+            "source": row[1],
+            "params": json.loads(row[2]),
+            "status": row[3],
+            "created_at": row[4],
+            "updated_at": row[5]
+        }
+
+    def list_jobs(self, limit=20):
+        """
+        最近的任务：[(任务 ID, 来源, 状态, 创建时间, 视频数, 已完成数)]
+        """
+        with self._lock:
+            return self._conn.execute(
+                """
+                SELECT j.job_id, j.source, j.status, j.created_at,
+                       COUNT(v.video_id), COALESCE(SUM(v.status = 'done'), 0)
+                FROM jobs j LEFT JOIN job_videos v ON v.job_id = j.job_id
+                GROUP BY j.job_id
+                ORDER BY j.created_at DESC
+                LIMIT ?
+                """,
+                (limit,)
+            ).fetchall()
+
+    def videos(self, job_id):
+        """
+        按顺序返回任务中的视频：[{video_id, status, stages, error, md_path}]，
+        stages 为 {阶段: 完成时间}
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT video_id, status, stages, error, md_path FROM job_videos "
+                "WHERE job_id = ? ORDER BY position",
+                (job_id,)
+            ).fetchall()
+        return [
+            {
+                "video_id": video_id,
+                "status": status,
+                "stages": json.loads(stages),
+                "error": error,
+                "md_path": md_path
+            }
+            for video_id, status, stages, error, md_path in rows
+        ]
+
+    def mark_stage(self, job_id, video_id, stage, detail=None):
+        """
+        记录某个视频完成了一个阶段；file 阶段的 detail 为写出的 MD 路径，
+        其他阶段的 detail 为该阶段的产出（可 JSON 序列化），保存后续跑时由 stage_outputs 取回
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT stages FROM job_videos WHERE job_id = ? AND video_id = ?",
+                (job_id, video_id)
+            ).fetchone()
+            if row is None:
+                return
+            stages = json.loads(row[0])
+            stages[stage] = time.time()
+            self._conn.execute(
+                "UPDATE job_videos SET stages = ?, updated_at = ?, "
+                "md_path = CASE WHEN ? = 'file' THEN ? ELSE md_path END "
+                "WHERE job_id = ? AND video_id = ?",
+                (json.dumps(stages), time.time(), stage, detail if stage == "file" else None, job_id, video_id)
+            )
+            if stage != "file" and detail is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO stage_outputs (job_id, video_id, stage, data) VALUES (?, ?, ?, ?)",
+                    (job_id, video_id, stage, zlib.compress(json.dumps(detail, ensure_ascii=False).encode("utf-8"), 6))
+                )
+            self._conn.commit()
+
+    def stage_outputs(self, job_id, video_id):
+        """
+        某个视频已保存的各阶段产出：{阶段: detail}
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT stage, data FROM stage_outputs WHERE job_id = ? AND video_id = ?",
+                (job_id, video_id)
+            ).fetchall()
+        return {stage: json.loads(zlib.decompress(data).decode("utf-8")) for stage, data in rows}
+
+    def set_status(self, job_id, video_id, status, error=None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE job_videos SET status = ?, error = ?, updated_at = ? "
+                "WHERE job_id = ? AND video_id = ?",
+                (status, error, time.time(), job_id, video_id)
+            )
+            self._conn.commit()
+
+    def finish_job(self, job_id, complete=True):
+        """
+        一轮运行结束：全部视频完成（且 complete，即视频列表已枚举完）则任务标记为 done，
+        否则为 incomplete（可续跑）
+        """
+        with self._lock:
+            pending = self._conn.execute(
+                "SELECT COUNT(*) FROM job_videos WHERE job_id = ? AND status != 'done'",
+                (job_id,)
+            ).fetchone()[0]
+            status = "incomplete" if pending or not complete else "done"
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE job_id = ?",
+                (status, time.time(), job_id)
+            )
+            self._conn.commit()
+        return status
+
+
+def is_video_complete(video, comments_option):
+    """
+    视频是否可以在续跑时跳过：所需阶段都已完成（结果已存档），且写出过的 MD 文件仍然存在
+    """
+    if video["status"] != "done":
+        return False
+    if any(stage not in video["stages"] for stage in required_stages(comments_option)):
+        return False
+    return not video["md_path"] or os.path.exists(video["md_path"])
+
+
+def format_stages(video, comments_option):
+    """
+    渲染一个视频的阶段完成情况，如 "视频信息 ✓ 字幕 ✓ 字幕摘要 ✗ MD 文件 ✗"
+    """
+    return " ".join(
+        f"{STAGE_LABELS[stage]} {'✓' if stage in video['stages'] else '✗'}"
+        for stage in required_stages(comments_option)
+    )
+
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+
+def get_job_manifest():
+    """
+    获取全局共享的任务清单（首次调用时创建）
+    """
+    global _manifest
+    if _manifest is None:
+        with _manifest_lock:
+            if _manifest is None:
+                _manifest = JobManifest()
+    return _manifest
@@ -0,0 +1,276 @@
+import hashlib
+import json
+import threading
+import time
+
+from openai import APIConnectionError, OpenAI
+
+from concurrency import llm_slot
+from disk_cache import format_cache_stats, get_cache
+from resilience import MAX_ATTEMPTS, backoff_delay, get_breaker, is_retryable
+from tokens import estimate_tokens
+
+DEEPSEEK_BASE_URL = "https://api.deepseek.com"
+DEFAULT_MODEL = "deepseek-chat"
+
+# 流式输出时回调前端的最小间隔（秒），避免每个 token 都刷新界面
+STREAM_UPDATE_INTERVAL = 0.1
+
+# 模型输出缓存的有效期（秒）
+LLM_CACHE_TTL = 30 * 24 * 3600
+
+_cache_stats = {
+    "hits": 0,
+    "misses": 0,
+    "prompt_tokens_saved": 0,
+    "completion_tokens_saved": 0
+}
+_cache_stats_lock = threading.Lock()
+
+# 从响应 usage 中记录的字段；prompt_cache_hit/miss_tokens 为 DeepSeek 前缀缓存的命中/未命中 token 数
+USAGE_FIELDS = (
+    "prompt_tokens",
+    "completion_tokens",
+    "prompt_cache_hit_tokens",
+    "prompt_cache_miss_tokens"
+)
+
+
+class UsageLedger:
+    """
+    累计 DeepSeek 响应中的 usage 字段，可在多个线程间共享。
+    totals 可传入外部字典（例如 Gradio 会话状态），累计结果直接写回该字典
+    """
+
+    def __init__(self, totals=None):
+        self.totals = totals if totals is not None else {}
+        for field in ("requests",) + USAGE_FIELDS:
+            self.totals.setdefault(field, 0)
+        self._lock = threading.Lock()
+
+    def add(self, usage):
+        with self._lock:
+            self.totals["requests"] += 1
+            for field in USAGE_FIELDS:
+                self.totals[field] += usage.get(field, 0)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.totals)
+
+    def format(self, label="DeepSeek 用量"):
+        """
+        渲染为一行 Markdown 文本
+        """
+        totals = self.snapshot()
+        if not totals["requests"]:
+            return ""
+        hit = totals["prompt_cache_hit_tokens"]
+        miss = totals["prompt_cache_miss_tokens"]
+        hit_rate = f"{hit / (hit + miss):.0%}" if hit + miss else "-"
+        return (
+            f"{label}：请求 {totals['requests']} 次，"
+            f"输入 {totals['prompt_tokens']} tokens"
+            f"（前缀缓存命中 {hit} / 未命中 {miss}，命中率 {hit_rate}），"
+            f"输出 {totals['completion_tokens']} tokens"
+        )
+
+
+# 本进程内全部 DeepSeek 调用的累计用量
+SESSION_USAGE = UsageLedger()
+
+
+def _usage_to_dict(usage):
+    if usage is None:
+        return None
+    return {field: getattr(usage, field, None) or 0 for field in USAGE_FIELDS}
+
+
+def create_client(api_key):
+    # 重试由 iter_stream_chat 统一处理（带熔断），关闭 SDK 自带的重试以免叠加
+    return OpenAI(api_key=api_key, base_url=DEEPSEEK_BASE_URL, max_retries=0)
+
+
+def iter_stream_chat(client, messages, model=DEFAULT_MODEL, result=None, ledger=None):
+    """
+    以流式方式调用 DeepSeek 的生成器：每隔 STREAM_UPDATE_INTERVAL 产出一次已生成的全部文本，
+    结束时一定再产出一次完整文本。
+    若传入 result 字典，结束后写入 content / ttft(首个 token 延迟) / elapsed(总耗时) / usage /
+    finish_reason（正常结束为 "stop"，因长度截断为 "length"，流中没有给出时为 None）。
+    usage 会累计到 SESSION_USAGE，若传入 ledger 也累计到 ledger。
+    限流、服务端错误和连接错误按指数退避重试（流中途断开时从头重新生成，产出的文本随之重置），
+    并经过 "deepseek" 熔断器；鉴权失败、余额不足等错误直接抛出
+    """
+    if result is None:
+        result = {}
+    breaker = get_breaker("deepseek")
+    with llm_slot():
+        start = time.perf_counter()
+        for attempt in range(MAX_ATTEMPTS):
+            breaker.before_call()
+            ttft = None
+            parts = []
+            last_update = 0.0
+            usage = None
+            finish_reason = None
+            try:
+                stream = client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    stream=True,
+                    stream_options={"include_usage": True}
+                )
+                for chunk in stream:
+                    # 开启 include_usage 后，最后一个数据块携带整次请求的 usage 且 choices 为空
+                    if getattr(chunk, "usage", None) is not None:
+                        usage = _usage_to_dict(chunk.usage)
+                    if not chunk.choices:
+                        continue
+                    if chunk.choices[0].finish_reason:
+                        finish_reason = chunk.choices[0].finish_reason
+                    delta = chunk.choices[0].delta.content
+                    if not delta:
+                        continue
+                    now = time.perf_counter()
+                    if ttft is None:
+                        ttft = now - start
+                    parts.append(delta)
+                    if now - last_update >= STREAM_UPDATE_INTERVAL:
+                        last_update = now
+                        yield "".join(parts)
+            except Exception as e:
+                if not is_retryable(e, (APIConnectionError,)):
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                if attempt + 1 >= MAX_ATTEMPTS:
+                    raise
+                delay = backoff_delay(attempt, e)
+                print(f"DeepSeek 请求失败（{e}），{delay:.1f}s 后第 {attempt + 1} 次重试")
+                time.sleep(delay)
+                continue
+            breaker.record_success()
+            break
+        content = "".join(parts)
+        result["content"] = content
+        result["ttft"] = ttft
+        result["elapsed"] = time.perf_counter() - start
+        result["usage"] = usage
+        result["finish_reason"] = finish_reason
+    if usage is not None:
+        SESSION_USAGE.add(usage)
+        if ledger is not None:
+            ledger.add(usage)
+    yield content
+
+
+def stream_chat(client, messages, on_delta=None, model=DEFAULT_MODEL, ledger=None):
+    """
+    以流式方式调用 DeepSeek，边生成边通过 on_delta(已生成的全部文本) 回调。
+    返回 {"content": 完整文本, "ttft": 首个 token 延迟(秒), "elapsed": 总耗时(秒), "usage": 用量或None,
+          "finish_reason": 结束原因}
+    """
+    result = {}
+    for partial in iter_stream_chat(client, messages, model=model, result=result, ledger=ledger):
+        if on_delta is not None:
+            on_delta(partial)
+    return result
+
+
+def llm_cache_key(model, messages):
+    """
+    按 (模型, 全部消息) 的内容哈希生成缓存键；系统提示词与输入文本都包含在 messages 中
+    """
+    payload = json.dumps(
+        [model, [[m["role"], m["content"]] for m in messages]],
+        ensure_ascii=False,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def cached_stream_chat(
+    client,
+    messages,
+    on_delta=None,
+    model=DEFAULT_MODEL,
+    refresh=False,
+    ledger=None
+):
+    """
+    带内容寻址缓存的 stream_chat：相同模型、提示词和输入直接返回上次结果。
+    refresh=True 时跳过缓存重新生成，并用新结果覆盖缓存。
+    只缓存正常结束（finish_reason 为 "stop"）且内容非空的结果，空回复或被截断的回复下次重新生成。
+    返回的结果字典额外包含 cached（是否命中缓存）
+    """
+    cache = get_cache()
+    key = llm_cache_key(model, messages)
+    if not refresh:
+        entry = cache.get("llm", key)
+        if entry is not None:
+            with _cache_stats_lock:
+                _cache_stats["hits"] += 1
+                _cache_stats["prompt_tokens_saved"] += entry["prompt_tokens"]
+                _cache_stats["completion_tokens_saved"] += entry["completion_tokens"]
+            if on_delta is not None:
+                on_delta(entry["content"])
+            return {
+                "content": entry["content"],
+                "ttft": None,
+                "elapsed": 0.0,
+                "usage": None,
+                "cached": True
+            }
+
+    with _cache_stats_lock:
+        _cache_stats["misses"] += 1
+    result = stream_chat(client, messages, on_delta=on_delta, model=model, ledger=ledger)
+    result["cached"] = False
+    if not result["content"].strip() or result["finish_reason"] != "stop":
+        print(f"DeepSeek 回复为空或未正常结束（finish_reason={result['finish_reason']}），不写入缓存")
+        return result
+    usage = result.get("usage")
+    if usage is not None:
+        prompt_tokens = usage["prompt_tokens"]
+        completion_tokens = usage["completion_tokens"]
+    else:
+        prompt_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+        completion_tokens = estimate_tokens(result["content"])
+    cache.set(
+        "llm",
+        key,
+        {
+            "content": result["content"],
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens
+        },
+        ttl=LLM_CACHE_TTL
+    )
+    return result
+
+
+def get_llm_cache_stats():
+    with _cache_stats_lock:
+        return dict(_cache_stats)
+
+
+def format_llm_cache_stats():
+    """
+    将模型输出缓存统计、磁盘缓存命中情况与本进程累计用量渲染为 Markdown
+    """
+    lines = []
+    stats = get_llm_cache_stats()
+    total = stats["hits"] + stats["misses"]
+    if total:
+        lines.append(
+            f"摘要缓存：命中 {stats['hits']}/{total} 次，"
+            f"约节省输入 {stats['prompt_tokens_saved']} tokens、"
+            f"输出 {stats['completion_tokens_saved']} tokens"
+        )
+    disk_stats = format_cache_stats()
+    if disk_stats:
+        lines.append(disk_stats)
+    session_usage = SESSION_USAGE.format("本次运行累计 DeepSeek 用量")
+    if session_usage:
+        lines.append(session_usage)
+    return "\n\n".join(lines)
@@ -0,0 +1,222 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from disk_cache import CACHE_DIR
+
+QUOTA_FILE = os.path.join(CACHE_DIR, "quota.sqlite3")
+
+# YouTube Data API v3 各方法每次调用消耗的配额单位（未列出的按 1 计）
+QUOTA_COSTS = {
+    "search.list": 100,
+    "videos.list": 1,
+    "commentThreads.list": 1,
+    "comments.list": 1,
+    "playlistItems.list": 1,
+    "playlists.list": 1,
+    "channels.list": 1,
+}
+DEFAULT_COST = 1
+# 默认每日配额（Google Cloud 项目的默认值）
+DEFAULT_DAILY_QUOTA = 10000
+# 预留的配额：剩余不足时不再开始新的视频，留给进行中的视频收尾
+QUOTA_RESERVE = 200
+# 客户端限速（令牌桶）：每个 API Key 每秒平均请求数与允许的突发请求数
+RATE_PER_SECOND = 50
+RATE_BURST = 100
+
+# 配额在太平洋时间午夜重置；没有时区数据库时按 UTC-8 近似
+try:
+    from zoneinfo import ZoneInfo
+    _QUOTA_TZ = ZoneInfo("America/Los_Angeles")
+except Exception:
+    _QUOTA_TZ = timezone(timedelta(hours=-8))
+
+
+class QuotaExceeded(Exception):
+    """
+    当日配额将要或已经用尽：调用方应推迟剩余工作，而不是继续请求
+    """
+
+
+def quota_day():
+    """
+    当前配额日（太平洋时间的日期）
+    """
+    return datetime.now(_QUOTA_TZ).strftime("%Y-%m-%d")
+
+
+def method_cost(method_id):
+    """
+    method_id 形如 "youtube.search.list"
+    """
+    name = method_id[len("youtube."):] if method_id.startswith("youtube.") else method_id
+    return QUOTA_COSTS.get(name, DEFAULT_COST)
+
+
+def _key_id(api_key):
+    # 不在磁盘上保存原始 Key
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+
+
+class TokenBucket:
+    """
+    令牌桶限速：平均每秒 rate 个令牌，最多积攒 capacity 个；令牌不足时阻塞等待
+    """
+
+    def __init__(self, rate=RATE_PER_SECOND, capacity=RATE_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, n=1):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= n:
+                    self._tokens -= n
+                    return
+                wait = (n - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class QuotaLedger:
+    """
+    按 API Key 和配额日持久化记录 YouTube 配额用量（按方法分别计数），
+    调用前先记账：超出当日配额的调用直接抛出 QuotaExceeded，不再发给 YouTube
+    """
+
+    def __init__(self, path=QUOTA_FILE, daily_quota=DEFAULT_DAILY_QUOTA):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.daily_quota = daily_quota
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS usage (
+                key_id TEXT NOT NULL,
+                day TEXT NOT NULL,
+                method TEXT NOT NULL,
+                calls INTEGER NOT NULL,
+                units INTEGER NOT NULL,
+                PRIMARY KEY (key_id, day, method)
+            )
+            """
+        )
+        self._conn.commit()
+
+    def used(self, api_key, day=None):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COALESCE(SUM(units), 0) FROM usage WHERE key_id = ? AND day = ?",
+                (_key_id(api_key), day or quota_day())
+            ).fetchone()
+        return row[0]
+
+    def remaining(self, api_key):
+        return max(0, self.daily_quota - self.used(api_key))
+
+    def charge(self, api_key, method_id):
+        """
+        记一次调用的用量；超出当日配额时抛出 QuotaExceeded（不记账）
+        """
+        cost = method_cost(method_id)
+        key_id = _key_id(api_key)
+        day = quota_day()
+        with self._lock:
+            used = self._conn.execute(
+                "SELECT COALESCE(SUM(units), 0) FROM usage WHERE key_id = ? AND day = ?",
+                (key_id, day)
+            ).fetchone()[0]
+            if used + cost > self.daily_quota:
+                raise QuotaExceeded(
+                    f"YouTube 今日配额不足：已用 {used}/{self.daily_quota}，"
+                    f"{method_id} 需要 {cost} 单位，配额将在太平洋时间午夜重置"
+                )
+            self._conn.execute(
+                "INSERT INTO usage (key_id, day, method, calls, units) VALUES (?, ?, ?, 1, ?) "
+                "ON CONFLICT (key_id, day, method) DO UPDATE SET "
+                "calls = calls + 1, units = units + excluded.units",
+                (key_id, day, method_id, cost)
+            )
+            self._conn.commit()
+
+    def mark_exhausted(self, api_key):
+        """
+        YouTube 返回配额用尽时，把当日用量补记到上限，避免继续发出注定失败的请求
+        """
+        missing = self.daily_quota - self.used(api_key)
+        if missing <= 0:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO usage (key_id, day, method, calls, units) VALUES (?, ?, 'quotaExceeded', 0, ?) "
+                "ON CONFLICT (key_id, day, method) DO UPDATE SET units = units + excluded.units",
+                (_key_id(api_key), quota_day(), missing)
+            )
+            self._conn.commit()
+
+    def breakdown(self, api_key, day=None):
+        """
+        返回 [(方法, 调用次数, 单位)]，按单位从多到少
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT method, calls, units FROM usage WHERE key_id = ? AND day = ? ORDER BY units DESC",
+                (_key_id(api_key), day or quota_day())
+            ).fetchall()
+
+    def format(self, api_key):
+        """
+        渲染当日配额用量为一行 Markdown
+        """
+        used = self.used(api_key)
+        details = "，".join(
+            f"{method.replace('youtube.', '')} {calls} 次/{units} 单位"
+            for method, calls, units in self.breakdown(api_key)
+        )
+        line = f"YouTube 配额（{quota_day()}，太平洋时间）：已用 {used}/{self.daily_quota} 单位"
+        return f"{line}（{details}）" if details else line
+
+
+_ledger = None
+_buckets = {}
+_lock = threading.Lock()
+
+
+def get_quota_ledger():
+    """
+    获取全局共享的配额账本（首次调用时创建）
+    """
+    global _ledger
+    if _ledger is None:
+        with _lock:
+            if _ledger is None:
+                _ledger = QuotaLedger()
+    return _ledger
+
+
+def configure_quota(daily_quota=None):
+    """
+    调整每日配额上限（在 Google Cloud 控制台申请了更高配额时使用）
+    """
+    if daily_quota:
+        get_quota_ledger().daily_quota = max(1, int(daily_quota))
+
+
+def get_rate_limiter(api_key):
+    """
+    每个 API Key 一个令牌桶
+    """
+    bucket = _buckets.get(api_key)
+    if bucket is None:
+        with _lock:
+            bucket = _buckets.setdefault(api_key, TokenBucket())
+    return bucket
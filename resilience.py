@@ -0,0 +1,157 @@
+import random
+import threading
+import time
+
+# 重试次数与退避参数：第 n 次重试前等待 [0, min(MAX_DELAY, BASE_DELAY * 2^n)] 之间的随机时长
+MAX_ATTEMPTS = 5
+BASE_DELAY = 1.0
+MAX_DELAY = 30.0
+# 熔断：连续失败这么多次后熔断，RESET_TIMEOUT 秒后放行一次试探请求
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30.0
+
+# 可重试的 HTTP 状态码：限流与服务端错误
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+# 403 中属于限流（可重试）的原因；quotaExceeded 表示当日配额用尽，重试无用
+RETRYABLE_403_REASONS = (b"rateLimitExceeded", b"userRateLimitExceeded")
+
+
+class CircuitOpen(Exception):
+    """
+    上游连续失败已熔断：在冷却期内直接失败，不再发出请求
+    """
+
+
+class CircuitBreaker:
+    """
+    每个上游服务一个熔断器：连续 failure_threshold 次可重试错误后进入熔断，
+    reset_timeout 秒后进入半开状态放行一次请求，成功则恢复，失败则继续熔断
+    """
+
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._probing:
+                raise CircuitOpen(f"{self.name} 连续请求失败，已暂停调用，请稍后再试")
+            self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    """
+    获取上游服务对应的熔断器（"youtube"、"deepseek" 等）
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def _status_of(error):
+    # openai 的异常带 status_code；googleapiclient 的 HttpError 带 resp.status
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "resp", None), "status", None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error, retry_on=()):
+    """
+    判断错误是否值得重试：限流、服务端错误、网络错误可重试；
+    参数错误、鉴权失败、配额用尽等重试也不会成功
+    """
+    if isinstance(error, CircuitOpen):
+        return False
+    status = _status_of(error)
+    if status is not None:
+        if status == 403:
+            content = getattr(error, "content", b"") or b""
+            return any(reason in content for reason in RETRYABLE_403_REASONS)
+        return status in RETRYABLE_STATUS
+    return isinstance(error, (OSError,) + tuple(retry_on))
+
+
+def retry_after(error):
+    """
+    读取响应中的 Retry-After（秒），没有时返回 None
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is None:
+        headers = getattr(error, "resp", None)
+    try:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        return float(value) if value else None
+    except Exception:
+        return None
+
+
+def backoff_delay(attempt, error=None):
+    """
+    第 attempt 次重试（从 0 开始）前等待的时长：指数退避加全抖动，服务端给了 Retry-After 时以其为下限
+    """
+    delay = random.uniform(0, min(MAX_DELAY, BASE_DELAY * (2 ** attempt)))
+    hinted = retry_after(error) if error is not None else None
+    if hinted is not None:
+        delay = max(delay, min(hinted, MAX_DELAY))
+    return delay
+
+
+def call_with_retry(fn, upstream, retry_on=(), attempts=MAX_ATTEMPTS, on_retry=None):
+    """
+    调用 fn()，遇到可重试错误时按指数退避重试，最多 attempts 次；
+    经过 upstream 对应的熔断器，熔断期间直接抛出 CircuitOpen。
+    on_retry(attempt, error, delay) 在每次重试前调用（可选）
+    """
+    breaker = get_breaker(upstream)
+    for attempt in range(attempts):
+        breaker.before_call()
+        try:
+            value = fn()
+        except Exception as e:
+            if not is_retryable(e, retry_on):
+                # 请求本身有误，不代表上游不可用
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            if attempt + 1 >= attempts:
+                raise
+            delay = backoff_delay(attempt, e)
+            if on_retry is not None:
+                on_retry(attempt + 1, e, delay)
+            else:
+                print(f"{upstream} 请求失败（{e}），{delay:.1f}s 后第 {attempt + 1} 次重试")
+            time.sleep(delay)
+        else:
+            breaker.record_success()
+            return value
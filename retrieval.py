@@ -0,0 +1,141 @@
+import math
+import threading
+from collections import Counter, OrderedDict
+
+from text_utils import format_timestamp, split_sentences, tokenize
+from tokens import estimate_tokens
+
+# 字幕不超过该 token 数时直接发送全文，不做检索
+FULL_CONTEXT_TOKENS = 8000
+# 每个检索片段的大致 token 数
+CHUNK_TOKENS = 400
+# 每次提问发送的片段数
+TOP_K = 6
+# 内存中最多缓存的视频索引数
+MAX_CACHED_INDEXES = 16
+
+# BM25 参数
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+
+def chunk_segments(transcript, max_tokens=CHUNK_TOKENS):
+    """
+    将带时间轴的字幕（transcript.Transcript）按时间顺序合并为检索块，保留每块的起止时间
+    """
+    return [
+        {"text": text, "start": start, "end": end}
+        for start, end, text in transcript.paragraphs(max_tokens)
+    ]
+
+
+def chunk_text(text, max_tokens=CHUNK_TOKENS):
+    """
+    没有时间轴信息时，按句子边界把纯文本切成检索块
+    """
+    chunks = []
+    current = []
+    tokens = 0
+    for sentence in split_sentences(text, max_tokens):
+        sentence_tokens = estimate_tokens(sentence)
+        if current and tokens + sentence_tokens > max_tokens:
+            chunks.append({"text": "".join(current).strip(), "start": None, "end": None})
+            current = []
+            tokens = 0
+        current.append(sentence)
+        tokens += sentence_tokens
+    if current:
+        chunks.append({"text": "".join(current).strip(), "start": None, "end": None})
+    return chunks
+
+
+class BM25Index:
+    """
+    基于 BM25 的内存词法索引
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.doc_lengths = []
+        self.postings = {}
+        for doc_id, chunk in enumerate(chunks):
+            counts = Counter(tokenize(chunk["text"]))
+            self.doc_lengths.append(sum(counts.values()))
+            for term, freq in counts.items():
+                self.postings.setdefault(term, []).append((doc_id, freq))
+        self.avg_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if chunks else 0.0
+
+    def search(self, query, top_k=TOP_K):
+        """
+        返回按相关度排序的 (块序号, score) 列表
+        """
+        n = len(self.chunks)
+        if not n:
+            return []
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, freq in postings:
+                norm = 1 - BM25_B + BM25_B * self.doc_lengths[doc_id] / self.avg_length
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * freq * (BM25_K1 + 1) / (freq + BM25_K1 * norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return ranked
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_index(cache_key, build_chunks):
+    """
+    按视频缓存检索索引；未命中时调用 build_chunks() 构建
+    """
+    with _indexes_lock:
+        index = _indexes.get(cache_key)
+        if index is not None:
+            _indexes.move_to_end(cache_key)
+            return index
+    index = BM25Index(build_chunks())
+    with _indexes_lock:
+        _indexes[cache_key] = index
+        while len(_indexes) > MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def build_retrieval_context(question, subtitles_text, transcript=None, video_id=None, top_k=TOP_K):
+    """
+    为一次提问构造字幕上下文：
+    - 字幕较短时返回 None，调用方应直接使用全文
+    - 否则返回与问题最相关的 top_k 个片段（按时间顺序，带时间戳）
+    transcript 为该视频带时间轴的字幕（transcript.Transcript），且与 subtitles_text 一致时才使用其时间轴；
+    也可以是返回字幕的无参函数，只在需要检索时才调用（字幕较短时不必读取）
+    """
+    if estimate_tokens(subtitles_text) <= FULL_CONTEXT_TOKENS:
+        return None
+
+    if callable(transcript):
+        transcript = transcript()
+
+    if transcript and transcript.text == subtitles_text:
+        index = get_index(("segments", video_id, len(subtitles_text)), lambda: chunk_segments(transcript))
+    else:
+        index = get_index(("text", hash(subtitles_text)), lambda: chunk_text(subtitles_text))
+
+    hits = index.search(question, top_k)
+    if not hits:
+        # 没有任何词命中时，退回到开头的若干片段
+        hits = [(doc_id, 0.0) for doc_id in range(min(top_k, len(index.chunks)))]
+
+    parts = []
+    for doc_id in sorted(doc_id for doc_id, _ in hits):
+        chunk = index.chunks[doc_id]
+        if chunk["start"] is not None:
+            parts.append(f"[{format_timestamp(chunk['start'])} - {format_timestamp(chunk['end'])}]\n{chunk['text']}")
+        else:
+            parts.append(chunk["text"])
+    return "\n\n".join(parts)
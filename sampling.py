@@ -0,0 +1,184 @@
+import heapq
+from array import array
+
+import numpy as np
+
+from comment_stats import TimeColumn
+from tokens import estimate_tokens
+
+# 抽样评论的默认 token 预算：控制在一次总结调用以内（小于 summarize.CHUNK_TOKEN_BUDGET）
+SAMPLE_TOKEN_BUDGET = 20000
+# 每条评论除正文外的格式化开销（序号、发布时间、点赞数等行）
+BLOCK_OVERHEAD_TOKENS = 20
+# 点赞分层：按点赞数排名，前 10% 为高赞，其后 30% 为中赞，其余为低赞
+LIKE_TIER_CUTS = (0.1, 0.4)
+# 时间分层：按发布时间排名三等分
+RECENCY_TIERS = 3
+
+THREAD_LABELS = ("顶层评论", "回复")
+LIKE_LABELS = ("高赞", "中赞", "低赞")
+RECENCY_LABELS = ("最新", "较早", "最早")
+
+
+def comment_cost(comment):
+    """
+    估算一条评论格式化后占用的 token 数
+    """
+    return estimate_tokens(comment.text) + BLOCK_OVERHEAD_TOKENS
+
+
+def _rank_tiers(values, cuts):
+    """
+    按 values 从大到小排名（相同值保持原顺序），依 cuts（累计比例）分层，返回与 values 对齐的层号数组
+    """
+    n = len(values)
+    # 倒序数组上的稳定升序排序再翻转，得到相同值保持原顺序的降序
+    order = n - 1 - np.argsort(values[::-1], kind="stable")[::-1]
+    ranks = np.empty(n, dtype=np.int64)
+    ranks[order] = np.arange(n)
+    bounds = [int(n * cut) for cut in cuts]
+    return np.searchsorted(bounds, ranks, side="right").astype(np.uint8)
+
+
+def stratify(comments, limit=None):
+    """
+    按 (顶层/回复, 点赞层, 时间层) 把评论分层，comments 需可重复迭代（列表或 CommentSource）：
+    第一遍只记录点赞数与发布时间两列紧凑数组，据此算出各评论的排名层；
+    第二遍逐条归层，每层只保留按点赞数从高到低、同点赞时按时间从新到旧排在前 limit 条的候选（None 为不限），
+    并累计各层的条数、代表的评论数与点赞数。
+    返回 (strata, totals)：strata 为 {层: [(下标, 评论), ...]}（按上述顺序），
+    totals 为 {层: (条数, 代表的评论数, 点赞数)}
+    """
+    likes = array("q")
+    published = TimeColumn()
+    for comment in comments:
+        likes.append(comment.likes)
+        published.append(comment.published_at)
+    likes = np.frombuffer(likes, dtype=np.int64)
+    seconds = published.to_numpy()
+    like_tiers = _rank_tiers(likes, LIKE_TIER_CUTS)
+    recency_tiers = _rank_tiers(seconds, [i / RECENCY_TIERS for i in range(1, RECENCY_TIERS)])
+
+    heaps = {}
+    totals = {}
+    for i, comment in enumerate(comments):
+        if i >= len(likes):
+            # 两遍之间评论来源有新增：只处理第一遍已排名的部分
+            break
+        key = (int(bool(comment.is_reply)), int(like_tiers[i]), int(recency_tiers[i]))
+        members, weight, like_sum = totals.get(key, (0, 0, 0))
+        totals[key] = (members + 1, weight + comment.count, like_sum + comment.likes)
+        heap = heaps.setdefault(key, [])
+        entry = (int(likes[i]), int(seconds[i]), -i, comment)
+        if limit is None or len(heap) < limit:
+            heapq.heappush(heap, entry)
+        elif entry[:3] > heap[0][:3]:
+            heapq.heapreplace(heap, entry)
+    strata = {
+        key: [(-neg_index, comment) for _, _, neg_index, comment in sorted(heap, key=lambda e: e[:3], reverse=True)]
+        for key, heap in heaps.items()
+    }
+    return strata, totals
+
+
+def sample_comments(comments, budget=SAMPLE_TOKEN_BUDGET):
+    """
+    在 token 预算内分层抽样评论：
+    - 各层先按其代表的评论数（含合并的重复评论）占比分得预算，层内优先取高赞评论
+    - 分完后剩余的预算在各层之间轮流补充，直到没有评论能放下
+    comments 需可重复迭代（列表，或每次迭代重新读取的 CommentSource）；内存中只保留两列紧凑数组
+    和各层的候选评论：每条评论至少占 BLOCK_OVERHEAD_TOKENS，一层最多入选 budget // BLOCK_OVERHEAD_TOKENS 条，
+    每层只保留这么多条候选，与评论总数无关（层内放不下而被跳过的长评论很多时，可能少补充几条）
+    返回 (按原顺序排列的入选评论, 覆盖率统计)
+    """
+    strata, totals = stratify(comments, limit=budget // BLOCK_OVERHEAD_TOKENS)
+    total_count = sum(members for members, _, _ in totals.values())
+    total_weight = sum(weight for _, weight, _ in totals.values())
+    chosen = {}
+    used = 0
+    cursors = {key: 0 for key in strata}
+    stratum_used = {key: 0 for key in strata}
+    stratum_selected = {key: 0 for key in strata}
+
+    def take(key, quota):
+        """
+        从该层按顺序取评论，直到层内用量达到 quota；放不下的长评论跳过。取到一条返回 True
+        """
+        nonlocal used
+        members = strata[key]
+        if budget - used <= BLOCK_OVERHEAD_TOKENS:
+            return False
+        while cursors[key] < len(members):
+            i, comment = members[cursors[key]]
+            cost = comment_cost(comment)
+            if used + cost > budget:
+                cursors[key] += 1
+                continue
+            if stratum_used[key] + cost > quota:
+                return False
+            cursors[key] += 1
+            chosen[i] = comment
+            used += cost
+            stratum_used[key] += cost
+            stratum_selected[key] += 1
+            return True
+        return False
+
+    # 第一轮：按占比分配预算；每层至少尝试放入一条，保证小层也有代表
+    for key in sorted(strata):
+        quota = max(budget * totals[key][1] / (total_weight or 1), 1)
+        if not take(key, budget):
+            continue
+        while take(key, quota):
+            pass
+
+    # 第二轮：剩余预算在各层之间轮流补充
+    active = sorted(strata)
+    while active:
+        active = [key for key in active if take(key, budget)]
+
+    selected = [chosen[i] for i in sorted(chosen)]
+    coverage = {
+        "budget": budget,
+        "tokens": used,
+        "selected": len(selected),
+        "total": total_count,
+        "represented": sum(c.count for c in selected),
+        "represented_total": total_weight,
+        "likes": sum(c.likes for c in selected),
+        "likes_total": sum(like_sum for _, _, like_sum in totals.values()),
+        "strata": [
+            {
+                "label": f"{THREAD_LABELS[key[0]]}/{LIKE_LABELS[key[1]]}/{RECENCY_LABELS[key[2]]}",
+                "selected": stratum_selected[key],
+                "total": totals[key][0]
+            }
+            for key in sorted(strata)
+        ]
+    }
+    return selected, coverage
+
+
+def format_coverage(coverage):
+    """
+    将抽样覆盖率渲染为 Markdown（总体覆盖率 + 各层入选数）
+    """
+    def percent(part, whole):
+        return f"{part / whole:.1%}" if whole else "-"
+
+    lines = [
+        f"按约 {coverage['budget']} tokens 预算分层抽样：入选 {coverage['selected']} / {coverage['total']} 条"
+        f"（{percent(coverage['selected'], coverage['total'])}），"
+        f"代表原始评论 {coverage['represented']} / {coverage['represented_total']} 条"
+        f"（{percent(coverage['represented'], coverage['represented_total'])}），"
+        f"覆盖点赞 {percent(coverage['likes'], coverage['likes_total'])}，"
+        f"约 {coverage['tokens']} tokens",
+        "",
+        "| 分层 | 入选 / 总数 |",
+        "| --- | --- |"
+    ]
+    lines.extend(
+        f"| {stratum['label']} | {stratum['selected']} / {stratum['total']} |"
+        for stratum in coverage["strata"]
+    )
+    return "\n".join(lines) + "\n\n"
@@ -0,0 +1,266 @@
+import os
+import re
+import sqlite3
+import threading
+
+from archive import ARCHIVE_FILE, get_archive
+from retrieval import chunk_segments, chunk_text
+from text_utils import CJK_RUN_RE, format_timestamp
+
+# 字幕按约这么多 token 切成检索块（比对话检索的块小，片段与时间点更精确）
+SEARCH_CHUNK_TOKENS = 60
+# 默认返回的命中数与每个视频最多展示的片段数
+SEARCH_LIMIT = 30
+HITS_PER_VIDEO = 3
+# 片段长度（字符）与命中词前保留的上下文长度
+SNIPPET_CHARS = 120
+SNIPPET_LEAD = 40
+
+KIND_LABELS = {
+    "transcript": "字幕",
+    "subtitle_summary": "字幕总结",
+    "comments_summary": "评论总结"
+}
+
+
+def segment(text):
+    """
+    为 FTS5 预分词：中日韩文字切成相邻二字并以空格分隔，每段连续文字的最后一个字再单独保留一次
+    （单字查询用前缀匹配即可命中任意位置）；其余文字交给 unicode61 分词器按单词切分
+    """
+    def split_run(match):
+        run = match.group(0)
+        if len(run) == 1:
+            return f" {run} "
+        return " " + " ".join(run[i:i + 2] for i in range(len(run) - 1)) + f" {run[-1]} "
+
+    return CJK_RUN_RE.sub(split_run, text)
+
+
+def build_match_query(query):
+    """
+    把用户输入转换为 FTS5 查询：按空白拆成多个词（全部命中才算匹配），
+    中日韩词转成二字短语（单字用前缀匹配），其余词加引号避免被当作 FTS5 语法
+    返回 (FTS5 查询, 用于高亮的中日韩词与单词列表)；没有有效词时返回 (None, [])
+    """
+    clauses = []
+    terms = []
+    for term in query.split():
+        for part in re.split(r"(" + CJK_RUN_RE.pattern + r")", term):
+            if not part:
+                continue
+            if CJK_RUN_RE.fullmatch(part):
+                terms.append(part)
+                if len(part) == 1:
+                    clauses.append(f'"{part}"*')
+                else:
+                    clauses.append('"' + " ".join(part[i:i + 2] for i in range(len(part) - 1)) + '"')
+            else:
+                words = re.findall(r"\w+", part)
+                if words:
+                    terms.extend(words)
+                    clauses.append('"' + " ".join(words) + '"')
+    if not clauses:
+        return None, []
+    return " ".join(clauses), terms
+
+
+def make_snippet(text, terms, max_chars=SNIPPET_CHARS):
+    """
+    截取第一个命中词附近的一段文字，并把其中的命中词加粗
+    """
+    pattern = re.compile("|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+    text = " ".join(text.split())
+    match = pattern.search(text)
+    start = max(0, match.start() - SNIPPET_LEAD) if match else 0
+    end = min(len(text), start + max_chars)
+    start = max(0, min(start, end - max_chars))
+    window = pattern.sub(lambda m: f"**{m.group(0)}**", text[start:end])
+    return ("…" if start > 0 else "") + window + ("…" if end < len(text) else "")
+
+
+def video_link(video_id, start=None):
+    """
+    视频链接；给出 start（秒）时带上跳转到该时间点的参数
+    """
+    url = f"https://www.youtube.com/watch?v={video_id}"
+    return url if start is None else f"{url}&t={int(start)}s"
+
+
+class SearchIndex:
+    """
+    已存档分析的全文索引（与存档位于同一个 SQLite 文件）：
+    - search_docs 表：检索单元的原文与出处（视频、存档记录、类型、字幕时间点）
+    - search_fts 表：FTS5 索引，rowid 对应 search_docs.doc_id，内容为 segment() 预分词后的文本
+    每个视频只索引最新一次分析，结果按 BM25 排序
+    """
+
+    def __init__(self, path=ARCHIVE_FILE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS search_docs (
+                doc_id INTEGER PRIMARY KEY,
+                video_id TEXT NOT NULL,
+                run_id INTEGER,
+                title TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                start REAL,
+                text TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_search_docs_video ON search_docs (video_id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(
+                body, tokenize = 'unicode61 remove_diacritics 2'
+            );
+            """
+        )
+        self._conn.commit()
+
+    def index_video(self, video_id, title, run_id=None, transcript=None, transcript_text="",
+                    subtitle_summary="", comments_summary=""):
+        """
+        （重新）索引一个视频：替换该视频之前的索引内容。
+        有带时间轴的字幕 transcript（transcript.Transcript）时按时间切块并记录每块起始时间，
+        否则按句子切分纯文本 transcript_text
+        """
+        if transcript:
+            chunks = chunk_segments(transcript, SEARCH_CHUNK_TOKENS)
+        else:
+            chunks = chunk_text(transcript_text, SEARCH_CHUNK_TOKENS) if transcript_text else []
+        docs = [("transcript", chunk["start"], chunk["text"]) for chunk in chunks if chunk["text"]]
+        for kind, text in (("subtitle_summary", subtitle_summary), ("comments_summary", comments_summary)):
+            if text:
+                docs.append((kind, None, text))
+
+        with self._lock:
+            self._delete_video(video_id)
+            for kind, start, text in docs:
+                cursor = self._conn.execute(
+                    "INSERT INTO search_docs (video_id, run_id, title, kind, start, text) VALUES (?, ?, ?, ?, ?, ?)",
+                    (video_id, run_id, title, kind, start, text)
+                )
+                self._conn.execute(
+                    "INSERT INTO search_fts (rowid, body) VALUES (?, ?)",
+                    (cursor.lastrowid, segment(text))
+                )
+            self._conn.commit()
+        return len(docs)
+
+    def _delete_video(self, video_id):
+        doc_ids = [
+            (row[0],) for row in self._conn.execute(
+                "SELECT doc_id FROM search_docs WHERE video_id = ?", (video_id,)
+            )
+        ]
+        if doc_ids:
+            self._conn.executemany("DELETE FROM search_fts WHERE rowid = ?", doc_ids)
+            self._conn.execute("DELETE FROM search_docs WHERE video_id = ?", (video_id,))
+
+    def search(self, query, limit=SEARCH_LIMIT, kinds=None):
+        """
+        全文检索，返回按相关度排序的命中列表：
+        [{video_id, run_id, title, kind, start, snippet, url}]；kinds 可限定检索单元类型
+        """
+        match, terms = build_match_query(query or "")
+        if match is None:
+            return []
+        sql = (
+            "SELECT d.video_id, d.run_id, d.title, d.kind, d.start, d.text "
+            "FROM search_fts f JOIN search_docs d ON d.doc_id = f.rowid "
+            "WHERE search_fts MATCH ?"
+        )
+        args = [match]
+        if kinds:
+            sql += f" AND d.kind IN ({', '.join('?' * len(kinds))})"
+            args.extend(kinds)
+        sql += " ORDER BY bm25(search_fts) LIMIT ?"
+        args.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        return [
+            {
+                "video_id": video_id,
+                "run_id": run_id,
+                "title": title,
+                "kind": kind,
+                "start": start,
+                "snippet": make_snippet(text, terms),
+                "url": video_link(video_id, start)
+            }
+            for video_id, run_id, title, kind, start, text in rows
+        ]
+
+    def count_documents(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM search_docs").fetchone()[0]
+
+
+def format_search_results(hits, per_video=HITS_PER_VIDEO):
+    """
+    将命中结果按视频分组渲染为 Markdown：视频按其最佳命中的排名排列，每个视频最多列出 per_video 个片段，
+    字幕片段带跳转到对应时间点的链接
+    """
+    if not hits:
+        return "没有找到相关内容"
+    groups = {}
+    for hit in hits:
+        groups.setdefault(hit["video_id"], []).append(hit)
+    lines = [f"共 {len(groups)} 个视频命中："]
+    for video_id, video_hits in groups.items():
+        first = video_hits[0]
+        record = f"（记录编号 {first['run_id']}）" if first["run_id"] else ""
+        lines += ["", f"### [{first['title']}]({video_link(video_id)}){record}", ""]
+        for hit in video_hits[:per_video]:
+            label = KIND_LABELS.get(hit["kind"], hit["kind"])
+            if hit["start"] is not None:
+                label = f"[{label} {format_timestamp(hit['start'])}]({hit['url']})"
+            lines.append(f"- {label}：{hit['snippet']}")
+    return "\n".join(lines)
+
+
+def reindex_archive():
+    """
+    用存档中每个视频最新一次分析重建全文索引（用于启用搜索前已存档的结果；较早的存档没有字幕时间轴，
+    这些视频的字幕按句子切块、不带跳转时间点），返回索引的视频数
+    """
+    archive = get_archive()
+    index = get_search_index()
+    video_ids = archive.list_video_ids()
+    for video_id in video_ids:
+        run = archive.latest_run(video_id)
+        index.index_video(
+            video_id,
+            run["title"],
+            run_id=run["run_id"],
+            transcript=run["timeline"],
+            transcript_text=run["transcript"],
+            subtitle_summary=run["subtitle_summary"],
+            comments_summary=run["comments_summary"]
+        )
+    return len(video_ids)
+
+
+def search_archive(query):
+    """
+    供界面调用：检索全部存档并返回 Markdown 结果
+    """
+    return format_search_results(get_search_index().search(query))
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_search_index():
+    """
+    获取全局共享的全文索引（首次调用时创建）
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = SearchIndex()
+    return _index
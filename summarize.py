@@ -0,0 +1,191 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from llm import DEFAULT_MODEL, cached_stream_chat
+from tokens import estimate_tokens
+
+# 单次请求中待总结内容的 token 预算（deepseek-chat 上下文 64K，需为提示词和输出留出空间）
+CHUNK_TOKEN_BUDGET = 24000
+# 分段摘要阶段同时进行的请求数（另受全局 DeepSeek 并发上限约束）
+MAP_WORKERS = 4
+# 最多合并层数，防止摘要无法继续压缩时无限循环
+MAX_REDUCE_LEVELS = 6
+
+# 提示词中固定不变的部分放在前面、随分段变化的编号放在内容之后，
+# 使同一提示词下的各次请求共享尽可能长的相同前缀，便于命中 DeepSeek 前缀缓存
+MAP_INSTRUCTION = (
+    "以下是完整内容中的一部分。请只提取这一部分的要点、关键事实、数据和代表性观点，"
+    "保留必要细节，供之后与其他部分合并总结：\n\n{content}\n\n（第 {index}/{total} 部分）"
+)
+REDUCE_PARTIAL_INSTRUCTION = (
+    "以下是同一内容若干部分的分段要点。请合并去重，"
+    "保留关键事实、数据和代表性观点，供之后继续合并：\n\n{content}\n\n（第 {index}/{total} 组）"
+)
+REDUCE_FINAL_INSTRUCTION = "以下是完整内容按顺序分段提取的要点，请据此进行总结：\n\n{content}"
+
+def pack_units(units, max_tokens=CHUNK_TOKEN_BUDGET, separator=""):
+    """
+    将按边界切好的单元（句子/评论）依次装箱，每箱不超过 max_tokens
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+    for unit in units:
+        tokens = estimate_tokens(unit)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(separator.join(current))
+            current = []
+            current_tokens = 0
+        current.append(unit)
+        current_tokens += tokens
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
+
+
+def _summarize_chunk(client, system_prompt, user_content, model, refresh, ledger):
+    """
+    非流式的中间摘要；经由模型输出缓存，重跑时只需重算有变化的分段
+    """
+    result = cached_stream_chat(
+        client,
+        [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_content}
+        ],
+        model=model,
+        refresh=refresh,
+        ledger=ledger
+    )
+    return result["content"]
+
+
+def _map_parallel(
+    client,
+    system_prompt,
+    instruction,
+    chunks,
+    model,
+    on_progress,
+    label,
+    refresh,
+    ledger
+):
+    total = len(chunks)
+    done = [0]
+    lock = threading.Lock()
+
+    def work(args):
+        index, chunk = args
+        summary = _summarize_chunk(
+            client,
+            system_prompt,
+            instruction.format(index=index, total=total, content=chunk),
+            model,
+            refresh,
+            ledger
+        )
+        with lock:
+            done[0] += 1
+            finished = done[0]
+        if on_progress is not None:
+            on_progress(f"{label} {finished}/{total}")
+        return summary
+
+    executor = ThreadPoolExecutor(max_workers=MAP_WORKERS)
+    try:
+        return list(executor.map(work, enumerate(chunks, 1)))
+    finally:
+        # 某段失败（或 on_progress 抛出异常中止）时，尚未开始的分段不再请求
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _with_context(context, content):
+    return f"{context}\n\n{content}" if context else content
+
+
+def map_reduce_summarize(
+    client,
+    system_prompt,
+    units,
+    instruction,
+    on_delta=None,
+    on_progress=None,
+    max_tokens=CHUNK_TOKEN_BUDGET,
+    model=DEFAULT_MODEL,
+    refresh=False,
+    ledger=None,
+    context=None
+):
+    """
+    对可能超出上下文的内容做分段总结：
+    - units 为已按句子/评论边界切好的文本单元
+    - 内容不超预算时直接用 instruction（含 {content}）整体总结一次
+    - 否则各分段并行提取要点(map)，再逐层合并(reduce)直到能放入一次请求，
+      最后一次合并使用用户的提示词并流式输出
+    - 所有请求都经过模型输出缓存，refresh=True 时跳过缓存重新生成
+    - 实际发出的请求用量累计到 ledger（可选）
+    - context 为附加资料（如本地统计），放在生成最终总结的那次请求中、待总结内容之前
+    返回与 cached_stream_chat 相同的结果字典，额外包含 chunks（分段数）
+    """
+    chunks = pack_units(units, max_tokens)
+    if len(chunks) <= 1:
+        content = chunks[0] if chunks else ""
+        result = cached_stream_chat(
+            client,
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": _with_context(context, instruction.format(content=content))}
+            ],
+            on_delta=on_delta,
+            model=model,
+            refresh=refresh,
+            ledger=ledger
+        )
+        result["chunks"] = 1
+        return result
+
+    chunk_count = len(chunks)
+    summaries = _map_parallel(
+        client, system_prompt, MAP_INSTRUCTION, chunks, model, on_progress, "正在分段摘要", refresh, ledger
+    )
+    separator = "\n\n"
+    level = 1
+    while True:
+        groups = pack_units(
+            [f"【第 {i} 部分】\n{summary}{separator}" for i, summary in enumerate(summaries, 1)],
+            max_tokens
+        )
+        if len(groups) <= 1:
+            break
+        if level >= MAX_REDUCE_LEVELS:
+            print(f"分段摘要合并 {level} 层后仍超出预算，仅使用第一组要点")
+            break
+        level += 1
+        summaries = _map_parallel(
+            client,
+            system_prompt,
+            REDUCE_PARTIAL_INSTRUCTION,
+            groups,
+            model,
+            on_progress,
+            f"正在合并摘要(第 {level} 层)",
+            refresh,
+            ledger
+        )
+
+    if on_progress is not None:
+        on_progress(f"已完成 {chunk_count} 段摘要，正在生成最终总结")
+    result = cached_stream_chat(
+        client,
+        [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": _with_context(context, REDUCE_FINAL_INSTRUCTION.format(content=groups[0]))}
+        ],
+        on_delta=on_delta,
+        model=model,
+        refresh=refresh,
+        ledger=ledger
+    )
+    result["chunks"] = chunk_count
+    return result
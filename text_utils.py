@@ -0,0 +1,55 @@
+import re
+
+from tokens import estimate_tokens
+
+# 连续的中日韩文字（检索分词与全文索引都按它切出中日韩文字片段）
+CJK_RUN_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]+")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+# 句子边界：中英文句末标点与换行
+_SENTENCE_RE = re.compile(r"[^。！？!?.\n]*(?:[。！？!?.]+|\n+|$)")
+
+
+def split_sentences(text, max_tokens):
+    """
+    按句子边界切分文本；没有标点的超长片段（如自动字幕）按长度强制切分，
+    保证每段不超过 max_tokens
+    """
+    sentences = []
+    for match in _SENTENCE_RE.finditer(text):
+        sentence = match.group(0)
+        if not sentence:
+            continue
+        if estimate_tokens(sentence) <= max_tokens:
+            sentences.append(sentence)
+            continue
+        # 超长片段：按每字符 0.6 token 的上限估算，切成满足预算的小段
+        step = max(1, int(max_tokens / 0.6))
+        for start in range(0, len(sentence), step):
+            sentences.append(sentence[start:start + step])
+    return sentences
+
+
+def format_timestamp(seconds):
+    """
+    时间点文字：不足一小时为 "mm:ss"，否则为 "h:mm:ss"（摘要、导出、对话检索与全文搜索统一使用）
+    """
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes:02d}:{secs:02d}"
+
+
+def tokenize(text):
+    """
+    中日韩文字按相邻二字切分（单字片段保留单字），其他文字按单词切分并转小写
+    """
+    text = text.lower()
+    terms = _WORD_RE.findall(CJK_RUN_RE.sub(" ", text))
+    for run in CJK_RUN_RE.findall(text):
+        if len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
@@ -0,0 +1,202 @@
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+
+from text_utils import format_timestamp
+from tokens import estimate_tokens
+
+# 字幕总结时每个带时间戳的段落大致的 token 数（摘要可引用段落开头的时间戳）
+PARAGRAPH_TOKENS = 200
+
+# 序列化格式：魔数 + 片段数 + 字幕来源（0 人工、1 自动生成、2 未知），随后依次为起始时间(毫秒)、时长(毫秒)、
+# 文本字节长度三列 uint32 小端数组，最后是全部文本的 UTF-8 拼接；仍可读取不含来源字段的旧格式 TRS1
+_MAGIC = b"TRS2"
+_HEADER = struct.Struct("<4sIB")
+_MAGIC_V1 = b"TRS1"
+_HEADER_V1 = struct.Struct("<4sI")
+_GENERATED_FLAGS = {False: 0, True: 1, None: 2}
+
+
+def _column_bytes(values):
+    column = array("I", values)
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column.tobytes()
+
+
+def _read_column(data, offset, count):
+    column = array("I")
+    column.frombytes(data[offset:offset + count * column.itemsize])
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column, offset + count * column.itemsize
+
+
+class Transcript:
+    """
+    带时间轴的字幕：文本按片段存为列表，起始时间与时长存为 array("d") 列，
+    不再为每个片段保留一个 {"text", "start", "duration"} 字典。
+    - at(seconds)：二分查找某个时间点所在的片段（O(log n)）
+    - window(start, end) / 切片：取一段时间或一段片段，返回新的 Transcript
+    - to_bytes() / from_bytes()：紧凑的二进制序列化，用于磁盘缓存与存档
+    片段按起始时间排序（YouTube 字幕本身即按时间排列）
+    is_generated：是否为 YouTube 自动生成的字幕（None 表示未知，如旧版缓存）
+    """
+
+    __slots__ = ("texts", "starts", "durations", "is_generated", "_text")
+
+    def __init__(self, texts=None, starts=None, durations=None, is_generated=None):
+        self.texts = texts if texts is not None else []
+        self.starts = starts if starts is not None else array("d")
+        self.durations = durations if durations is not None else array("d")
+        self.is_generated = is_generated
+        self._text = None
+
+    @classmethod
+    def from_segments(cls, segments, is_generated=None):
+        """
+        由 [{"text", "start", "duration"}, ...]（youtube_transcript_api 的返回或旧版缓存）构造
+        """
+        transcript = cls(is_generated=is_generated)
+        for item in segments:
+            transcript.append(item["text"], item.get("start", 0.0), item.get("duration", 0.0))
+        return transcript
+
+    def append(self, text, start, duration):
+        self.texts.append(text)
+        self.starts.append(start)
+        self.durations.append(duration)
+        self._text = None
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __bool__(self):
+        return bool(self.texts)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return Transcript(self.texts[index], self.starts[index], self.durations[index], self.is_generated)
+        return {"text": self.texts[index], "start": self.starts[index], "duration": self.durations[index]}
+
+    def __iter__(self):
+        """
+        按顺序产出 (text, start, duration)
+        """
+        return zip(self.texts, self.starts, self.durations)
+
+    @property
+    def text(self):
+        """
+        全部字幕文本（片段以空格连接，与界面展示、存档的字幕内容一致），首次访问时生成
+        """
+        if self._text is None:
+            self._text = " ".join(self.texts)
+        return self._text
+
+    @property
+    def end(self):
+        """
+        最后一个片段的结束时间（秒）
+        """
+        if not self.texts:
+            return 0.0
+        return self.starts[-1] + self.durations[-1]
+
+    def at(self, seconds):
+        """
+        某个时间点所在（或之前最近）的片段下标；早于第一个片段时返回 0，空字幕返回 None
+        """
+        if not self.texts:
+            return None
+        return max(0, bisect_right(self.starts, seconds) - 1)
+
+    def window(self, start, end):
+        """
+        与时间段 [start, end) 有交集的片段（按起始时间近似：包含 start 所在的片段到 end 之前开始的最后一个片段）
+        """
+        if not self.texts or end <= start:
+            return Transcript(is_generated=self.is_generated)
+        first = self.at(start)
+        last = bisect_left(self.starts, end)
+        return self[first:last]
+
+    def paragraphs(self, max_tokens=PARAGRAPH_TOKENS):
+        """
+        按时间顺序把片段合并为段落，产出 (起始时间, 结束时间, 文本)，每段约 max_tokens
+        """
+        texts = []
+        tokens = 0
+        first = None
+        end = 0.0
+        for text, start, duration in self:
+            seg_tokens = estimate_tokens(text)
+            if texts and tokens + seg_tokens > max_tokens:
+                yield first, end, " ".join(texts)
+                texts = []
+                tokens = 0
+                first = None
+            if first is None:
+                first = start
+            texts.append(text)
+            tokens += seg_tokens
+            end = start + duration
+        if texts:
+            yield first, end, " ".join(texts)
+
+    def timed_units(self, max_tokens=PARAGRAPH_TOKENS):
+        """
+        供总结使用的文本单元：每个段落以 "[mm:ss] " 开头、换行结尾，摘要中可据此引用时间点
+        """
+        return [
+            f"[{format_timestamp(start)}] {text}\n"
+            for start, _, text in self.paragraphs(max_tokens)
+        ]
+
+    def to_bytes(self):
+        encoded = [text.encode("utf-8") for text in self.texts]
+        return b"".join([
+            _HEADER.pack(_MAGIC, len(encoded), _GENERATED_FLAGS[self.is_generated]),
+            _column_bytes(round(start * 1000) for start in self.starts),
+            _column_bytes(round(duration * 1000) for duration in self.durations),
+            _column_bytes(len(data) for data in encoded),
+            *encoded
+        ])
+
+    @classmethod
+    def from_bytes(cls, data):
+        if data[:len(_MAGIC_V1)] == _MAGIC_V1:
+            _, count = _HEADER_V1.unpack_from(data)
+            is_generated = None
+            offset = _HEADER_V1.size
+        else:
+            magic, count, flag = _HEADER.unpack_from(data)
+            if magic != _MAGIC:
+                raise ValueError("不是有效的字幕数据")
+            is_generated = {0: False, 1: True}.get(flag)
+            offset = _HEADER.size
+        starts, offset = _read_column(data, offset, count)
+        durations, offset = _read_column(data, offset, count)
+        lengths, offset = _read_column(data, offset, count)
+        texts = []
+        for length in lengths:
+            texts.append(data[offset:offset + length].decode("utf-8"))
+            offset += length
+        return cls(
+            texts,
+            array("d", (start / 1000 for start in starts)),
+            array("d", (duration / 1000 for duration in durations)),
+            is_generated
+        )
+
+
+def load_transcript(value):
+    """
+    把缓存或存档中读出的字幕还原为 Transcript：新格式为 to_bytes() 的字节，旧版缓存为片段字典列表
+    """
+    if value is None or isinstance(value, Transcript):
+        return value
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return Transcript.from_bytes(bytes(value))
+    return Transcript.from_segments(value)
@@ -0,0 +1,160 @@
+import re
+
+from tokens import estimate_tokens
+from transcript import Transcript
+
+# 相邻片段首尾重叠最多检查这么多个单元（中日韩文字一个字算一个单元，其他文字一个单词算一个单元），
+# 每个片段的比较次数有上限，整体耗时随字幕长度线性增长
+MAX_OVERLAP_UNITS = 32
+# 重叠至少这么多个单元才删除（整个片段都是重复内容时不受限制），避免误删正常的单字重复
+MIN_OVERLAP_UNITS = 2
+# 合并成句：遇到句末标点、与下一片段间隔超过 PAUSE_SECONDS，或累计约 SENTENCE_TOKENS 时断句
+PAUSE_SECONDS = 1.5
+SENTENCE_TOKENS = 60
+
+# 非语音标记：[Music]、[音乐]、[掌声] 等方括号内容，以及 ♪ 等音乐符号和 >> 说话人切换符号
+_MARKER_RE = re.compile(r"\[[^\[\]]{0,40}\]|[♪♫♬]+|>>+")
+# 无意义的语气词：英文按整词匹配，中文只去掉单独成词（前后不是汉字）的「呃」「嗯」
+_FILLER_RE = re.compile(
+    r"\b(?:um+|uh+|uhm+|erm+|hmm+|mhm+)\b[,，]?|(?<![\u4e00-\u9fff])[呃嗯]+(?![\u4e00-\u9fff])[,，]?",
+    re.IGNORECASE
+)
+_SPACE_RE = re.compile(r"\s+")
+_UNIT_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]|[^\s\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]+")
+_CJK_CHAR_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\u3000-\u303f\uff00-\uffef]")
+_SENTENCE_END_RE = re.compile(r"[。！？!?.…]['\"”’)）]*$")
+# 比较重叠时忽略的单词首尾标点
+_UNIT_STRIP = ".,!?;:'\"，。！？；：、…-"
+
+
+def strip_noise(text):
+    """
+    去掉非语音标记和语气词，合并空白
+    """
+    text = _MARKER_RE.sub(" ", text)
+    text = _FILLER_RE.sub(" ", text)
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def _units(text):
+    return _UNIT_RE.findall(text)
+
+
+def _unit_key(unit):
+    return unit.strip(_UNIT_STRIP).lower() or unit
+
+
+def _overlap(tail, keys):
+    """
+    tail（上一片段末尾的单元）的后缀与 keys（当前片段开头的单元）前缀最长的重合长度
+    """
+    limit = min(len(tail), len(keys), MAX_OVERLAP_UNITS)
+    for k in range(limit, 0, -1):
+        if tail[-k:] == keys[:k]:
+            if k >= MIN_OVERLAP_UNITS or k == len(keys):
+                return k
+            return 0
+    return 0
+
+
+def _join(left, right):
+    """
+    拼接两段文字：交界处两侧都是中日韩文字（或全角标点）时不加空格
+    """
+    if not left:
+        return right
+    if not right:
+        return left
+    if _CJK_CHAR_RE.match(left[-1]) and _CJK_CHAR_RE.match(right[0]):
+        return left + right
+    return left + " " + right
+
+
+class _Sentence:
+    __slots__ = ("parts", "start", "end", "tokens")
+
+    def __init__(self, start):
+        self.parts = []
+        self.start = start
+        self.end = start
+        self.tokens = 0
+
+    def text(self):
+        text = ""
+        for part in self.parts:
+            text = _join(text, part)
+        return text
+
+
+def clean_transcript(transcript):
+    """
+    清理自动生成字幕，减少发送给 DeepSeek 的 token：
+    1. 去掉 [Music] 等非语音标记与 um/uh/呃/嗯 等语气词
+    2. 去掉滚动字幕中相邻片段的首尾重叠（以及完全重复的片段）
+    3. 把零碎片段按句末标点、停顿和长度合并成句子大小的片段，保留每句的起止时间
+    每个片段只与上一片段末尾的至多 MAX_OVERLAP_UNITS 个单元比较，整体为线性时间。
+    返回 (清理后的 Transcript, 统计字典)
+    """
+    cleaned = Transcript(is_generated=transcript.is_generated)
+    stats = {
+        "segments_before": len(transcript),
+        "tokens_before": 0,
+        "overlaps": 0,
+        "dropped": 0
+    }
+    tail = []
+    sentence = None
+    last_end = None
+
+    def flush():
+        if sentence is not None and sentence.parts:
+            cleaned.append(sentence.text(), sentence.start, max(0.0, sentence.end - sentence.start))
+
+    for text, start, duration in transcript:
+        stats["tokens_before"] += estimate_tokens(text)
+        end = start + duration
+        units = _units(strip_noise(text))
+        keys = [_unit_key(unit) for unit in units]
+        overlap = _overlap(tail, keys)
+        if overlap:
+            stats["overlaps"] += 1
+            units = units[overlap:]
+            keys = keys[overlap:]
+        if not units:
+            # 整段都是标记、语气词或重复内容：只延长当前句子的结束时间
+            stats["dropped"] += 1
+            if sentence is not None:
+                sentence.end = max(sentence.end, end)
+            continue
+        tail = (tail + keys)[-MAX_OVERLAP_UNITS:]
+
+        if sentence is None or (last_end is not None and start - last_end > PAUSE_SECONDS):
+            flush()
+            sentence = _Sentence(start)
+        part = ""
+        for unit in units:
+            part = _join(part, unit)
+        sentence.parts.append(part)
+        sentence.tokens += estimate_tokens(part)
+        sentence.end = max(sentence.end, end)
+        last_end = end
+        if _SENTENCE_END_RE.search(part) or sentence.tokens >= SENTENCE_TOKENS:
+            flush()
+            sentence = None
+
+    flush()
+    stats["segments_after"] = len(cleaned)
+    stats["tokens_after"] = sum(estimate_tokens(text) for text in cleaned.texts)
+    return cleaned, stats
+
+
+def format_cleanup_stats(stats):
+    """
+    一行文字说明清理效果，如 "片段 1200 → 310，约 9000 → 6100 tokens（-32.2%）"
+    """
+    before = stats["tokens_before"]
+    saved = f"（-{1 - stats['tokens_after'] / before:.1%}）" if before else ""
+    return (
+        f"片段 {stats['segments_before']} → {stats['segments_after']}，"
+        f"约 {before} → {stats['tokens_after']} tokens{saved}"
+    )
@@ -0,0 +1,91 @@
+import threading
+from urllib.parse import parse_qs, urlparse
+
+import httplib2
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+
+from concurrency import youtube_slot
+from quota import QuotaExceeded, get_quota_ledger, get_rate_limiter
+from resilience import call_with_retry
+
+# 单次 HTTP 请求超时（秒）
+HTTP_TIMEOUT = 30
+
+_clients = {}
+_clients_lock = threading.Lock()
+_local = threading.local()
+
+
+def get_youtube_client(api_key):
+    """
+    获取该 API Key 对应的 YouTube 客户端，每个 Key 只构建一次。
+    使用库内置的静态 discovery 文档，不会发起 discovery 请求。
+    客户端只负责构造请求，可在多个线程间共享；
+    真正发送请求请用 execute_request，它会使用当前线程自己的连接。
+    """
+    client = _clients.get(api_key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(api_key)
+            if client is None:
+                client = build(
+                    "youtube",
+                    "v3",
+                    developerKey=api_key,
+                    static_discovery=True,
+                    cache_discovery=False
+                )
+                _clients[api_key] = client
+    return client
+
+
+def _thread_http():
+    """
+    httplib2.Http 不是线程安全的，每个线程各持有一个并复用其 keep-alive 连接
+    """
+    http = getattr(_local, "http", None)
+    if http is None:
+        http = httplib2.Http(timeout=HTTP_TIMEOUT)
+        _local.http = http
+    return http
+
+
+def _request_api_key(request):
+    """
+    developerKey 会以 key 参数附在请求 URI 上，据此区分各 Key 的配额与限速
+    """
+    query = parse_qs(urlparse(getattr(request, "uri", "") or "").query)
+    return query.get("key", [""])[0]
+
+
+def _is_quota_error(error):
+    return error.resp.status == 403 and b"quotaExceeded" in (error.content or b"")
+
+
+def execute_request(request):
+    """
+    在当前线程的长连接上执行 googleapiclient 构造好的请求：
+    - 先经过该 Key 的令牌桶限速，再在配额账本中按方法记账（超出当日配额时抛出 QuotaExceeded）
+    - 受全局 YouTube 并发上限约束
+    - 限流（429/403 rateLimitExceeded）、服务端错误和网络错误按指数退避重试同一请求
+      （翻页请求带着原 pageToken 重试，从失败的那一页继续），并经过 "youtube" 熔断器
+    - YouTube 返回配额用尽时同步账本，并以 QuotaExceeded 抛出，不再重试
+    """
+    api_key = _request_api_key(request)
+    method_id = getattr(request, "methodId", "") or ""
+    ledger = get_quota_ledger()
+
+    def attempt():
+        get_rate_limiter(api_key).acquire()
+        ledger.charge(api_key, method_id)
+        with youtube_slot():
+            try:
+                return request.execute(http=_thread_http())
+            except HttpError as e:
+                if _is_quota_error(e):
+                    ledger.mark_exhausted(api_key)
+                    raise QuotaExceeded("YouTube 返回今日配额已用尽，配额将在太平洋时间午夜重置") from e
+                raise
+
+    return call_with_retry(attempt, "youtube", retry_on=(httplib2.HttpLib2Error,))